@@ -0,0 +1,31 @@
+import {Component} from "@angular/core";
+import {
+    ComponentLifecycleEventEmitter,
+    TupleDataObserverService,
+    TupleSelector
+} from "@synerty/vortexjs";
+import {LdapServerStateTuple} from "@peek/peek_core_user/_private";
+
+@Component({
+    selector: 'pl-user-ldap-servers',
+    templateUrl: './ldap-servers.component.html'
+})
+export class LdapServersComponent extends ComponentLifecycleEventEmitter {
+
+    items: LdapServerStateTuple[] = [];
+
+    constructor(private tupleDataObserver: TupleDataObserverService) {
+        super();
+
+        // Setup a subscription for the data
+        const ts = new TupleSelector(LdapServerStateTuple.tupleName, {});
+        tupleDataObserver.subscribeToTupleSelector(ts)
+            .takeUntil(this.onDestroyEvent)
+            .subscribe((tuples: LdapServerStateTuple[]) => {
+                this.items = tuples;
+            });
+
+    }
+
+
+}
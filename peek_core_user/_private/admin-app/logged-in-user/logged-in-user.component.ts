@@ -7,7 +7,10 @@ import {
     TupleSelector
 } from "@synerty/vortexjs";
 import {UserLogoutAction, UserLogoutResponseTuple} from "@peek/peek_core_user/tuples";
-import {LoggedInUserStatusTuple} from "@peek/peek_core_user/_private";
+import {
+    LoggedInUserStatusDeltaTuple,
+    LoggedInUserStatusTuple
+} from "@peek/peek_core_user/_private";
 
 @Component({
     selector: 'pl-user-manage-logged-in-user',
@@ -17,19 +20,104 @@ export class ManageLoggedInUserComponent extends ComponentLifecycleEventEmitter
 
     items: LoggedInUserStatusTuple[] = [];
 
+    private itemsByDeviceToken: { [deviceToken: string]: LoggedInUserStatusTuple } = {};
+
+    // The seq of the last snapshot or delta applied, null until the snapshot arrives
+    private seq: number | null = null;
+
+    // Are we loading the deltas we missed
+    private catchingUp = false;
+
+    private snapshotTs = new TupleSelector(LoggedInUserStatusDeltaTuple.tupleName,
+        {"snapshot": true});
+
     constructor(private balloonMsg: Ng2BalloonMsgService,
                 private actionService: TupleActionPushService,
                 private tupleDataObserver: TupleDataObserverService) {
         super();
 
-        // Setup a subscription for the data
-        const ts = new TupleSelector(LoggedInUserStatusTuple.tupleName, {});
-        tupleDataObserver.subscribeToTupleSelector(ts)
+        // Load all the rows once, then apply the changes as they arrive
+        tupleDataObserver.subscribeToTupleSelector(this.snapshotTs)
+            .takeUntil(this.onDestroyEvent)
+            .subscribe((tuples: LoggedInUserStatusDeltaTuple[]) => {
+                if (tuples.length != 0)
+                    this.applySnapshot(tuples[0]);
+            });
+
+        const deltaTs = new TupleSelector(LoggedInUserStatusDeltaTuple.tupleName, {});
+        tupleDataObserver.subscribeToTupleSelector(deltaTs)
             .takeUntil(this.onDestroyEvent)
-            .subscribe((tuples: LoggedInUserStatusTuple[]) => {
-                this.items = tuples;
+            .subscribe((tuples: LoggedInUserStatusDeltaTuple[]) => {
+                if (tuples.length != 0)
+                    this.applyDelta(tuples[0]);
+            });
+
+    }
+
+    private applySnapshot(snapshot: LoggedInUserStatusDeltaTuple): void {
+        this.itemsByDeviceToken = {};
+        for (let item of snapshot.upserts)
+            this.itemsByDeviceToken[item.deviceToken] = item;
+
+        this.seq = snapshot.seq;
+        this.updateItems();
+    }
+
+    private applyDelta(delta: LoggedInUserStatusDeltaTuple): void {
+        // Ignore the deltas until we have a snapshot, and the ones we already have
+        if (this.seq == null || this.catchingUp || delta.seq <= this.seq)
+            return;
+
+        // We've missed some deltas, load them, or a snapshot if they're gone
+        if (delta.seq != this.seq + 1) {
+            this.catchUp();
+            return;
+        }
+
+        this.applyChanges(delta);
+        this.updateItems();
+    }
+
+    private catchUp(): void {
+        this.catchingUp = true;
+
+        const sinceTs = new TupleSelector(LoggedInUserStatusDeltaTuple.tupleName,
+            {"sinceSeq": this.seq});
+
+        this.tupleDataObserver.pollForTuples(sinceTs)
+            .then((tuples: LoggedInUserStatusDeltaTuple[]) => {
+                this.catchingUp = false;
+
+                if (tuples.length != 0 && tuples[0].isSnapshot) {
+                    this.applySnapshot(tuples[0]);
+                    return;
+                }
+
+                for (let delta of tuples) {
+                    if (delta.seq == this.seq + 1)
+                        this.applyChanges(delta);
+                }
+                this.updateItems();
+            })
+            .catch(e => {
+                this.catchingUp = false;
+                this.balloonMsg.showError(e);
             });
+    }
+
+    private applyChanges(delta: LoggedInUserStatusDeltaTuple): void {
+        for (let item of delta.upserts)
+            this.itemsByDeviceToken[item.deviceToken] = item;
+
+        for (let deviceToken of delta.removedDeviceTokens)
+            delete this.itemsByDeviceToken[deviceToken];
+
+        this.seq = delta.seq;
+    }
 
+    private updateItems(): void {
+        this.items = Object.keys(this.itemsByDeviceToken)
+            .map(deviceToken => this.itemsByDeviceToken[deviceToken]);
     }
 
     logoutUser(item: LoggedInUserStatusTuple) {
@@ -0,0 +1,48 @@
+import {Component} from "@angular/core";
+import {
+    ComponentLifecycleEventEmitter,
+    TupleDataObserverService,
+    TupleSelector
+} from "@synerty/vortexjs";
+import {
+    LoginStageLatencyTuple,
+    LoginWorkQueueStatusTuple
+} from "@peek/peek_core_user/_private";
+
+@Component({
+    selector: 'pl-user-login-latency',
+    templateUrl: './login-latency.component.html'
+})
+export class LoginLatencyComponent extends ComponentLifecycleEventEmitter {
+
+    items: LoginStageLatencyTuple[] = [];
+    queueStatus: LoginWorkQueueStatusTuple | null = null;
+
+    constructor(private tupleDataObserver: TupleDataObserverService) {
+        super();
+
+        // Setup a subscription for the data
+        const ts = new TupleSelector(LoginStageLatencyTuple.tupleName, {});
+        tupleDataObserver.subscribeToTupleSelector(ts)
+            .takeUntil(this.onDestroyEvent)
+            .subscribe((tuples: LoginStageLatencyTuple[]) => {
+                this.items = tuples;
+            });
+
+        const queueTs = new TupleSelector(LoginWorkQueueStatusTuple.tupleName, {});
+        tupleDataObserver.subscribeToTupleSelector(queueTs)
+            .takeUntil(this.onDestroyEvent)
+            .subscribe((tuples: LoginWorkQueueStatusTuple[]) => {
+                this.queueStatus = tuples.length ? tuples[0] : null;
+            });
+
+    }
+
+    bucketTitle(item: LoginStageLatencyTuple, index: number): string {
+        if (index < item.bucketUpperMs.length)
+            return `<= ${item.bucketUpperMs[index]}ms`;
+        return `> ${item.bucketUpperMs[item.bucketUpperMs.length - 1]}ms`;
+    }
+
+
+}
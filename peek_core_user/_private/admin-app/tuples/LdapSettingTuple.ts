@@ -20,6 +20,13 @@ export class LdapSettingTuple extends Tuple {
     desktopEnabled: boolean;
     mobileEnabled: boolean;
 
+    syncEnabled: boolean;
+    syncUserName: string;
+
+    // Write only, the server never sends this back, leave it empty to keep
+    // the password that's already saved
+    syncPassword: string;
+
     constructor() {
         super(LdapSettingTuple.tupleName)
     }
@@ -28,6 +28,8 @@ import {
 } from "@peek/peek_core_user/_private";
 import {AngularFontAwesomeModule} from "angular-font-awesome";
 import {ManageLoggedInUserComponent} from "./logged-in-user/logged-in-user.component";
+import {LoginLatencyComponent} from "./login-latency/login-latency.component";
+import {LdapServersComponent} from "./ldap-servers/ldap-servers.component";
 import {NzSwitchModule} from 'ng-zorro-antd/switch';
 import {EditLdapSettingComponent} from "./edit-ldap-setting-table/edit.component";
 
@@ -82,10 +84,12 @@ export const pluginRoutes: Routes = [
     declarations: [
         UserComponent,
         ManageLoggedInUserComponent,
+        LoginLatencyComponent,
         EditInternalUserComponent,
         EditInternalGroupComponent,
         EditSettingComponent,
-        EditLdapSettingComponent]
+        EditLdapSettingComponent,
+        LdapServersComponent]
 })
 export class UserModule {
 
@@ -0,0 +1,68 @@
+import logging
+import time
+from datetime import datetime
+from typing import List, Optional
+
+import pytz
+from rx.subjects import Subject
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred
+from twisted.internet.task import deferLater
+
+logger = logging.getLogger(__name__)
+
+
+class FakeDeviceDetail:
+    """ Fake Device Detail
+
+    The fields of the peek_core_device DeviceDetailTuple that this plugin reads.
+
+    """
+
+    def __init__(self, deviceToken: str, description: str):
+        self.deviceToken = deviceToken
+        self.description = description
+        self.deviceType = "benchmark"
+        self.isOnline = True
+        self.lastOnline = datetime.now(pytz.utc)
+
+
+class FakeDeviceApi:
+    """ Fake Device API
+
+    A stand-in for the peek_core_device DeviceApiABC, it implements only the
+    methods that this plugin calls.
+
+    Every device token is enrolled, its description is derived from the token.
+    Each call costs `callDelaySecs`, to simulate the round trip to the device plugin.
+
+    """
+
+    def __init__(self, callDelaySecs: float = 0.0):
+        self._callDelaySecs = callDelaySecs
+        self._onlineStatusSubject = Subject()
+        self.callCount = 0
+
+    @staticmethod
+    def _description(deviceToken: str) -> str:
+        return "Benchmark Device %s" % deviceToken
+
+    def _delayed(self, result) -> Deferred:
+        self.callCount += 1
+        return deferLater(reactor, self._callDelaySecs, lambda: result)
+
+    def deviceDetails(self, deviceTokens: List[str]) -> Deferred:
+        return self._delayed([FakeDeviceDetail(t, self._description(t))
+                              for t in deviceTokens])
+
+    def deviceDescription(self, deviceToken: str) -> Deferred:
+        return self._delayed(self._description(deviceToken))
+
+    def deviceDescriptionBlocking(self, deviceToken: str) -> Optional[str]:
+        # This is called from a thread, so a plain sleep is fine.
+        self.callCount += 1
+        time.sleep(self._callDelaySecs)
+        return self._description(deviceToken)
+
+    def deviceOnlineStatus(self) -> Subject:
+        return self._onlineStatusSubject
@@ -0,0 +1,27 @@
+import logging
+
+from twisted.internet import reactor
+from twisted.internet.task import deferLater
+
+from peek_core_user._private.server.api.UserFieldHookApi import UserFieldHookApi
+
+logger = logging.getLogger(__name__)
+
+
+class FakeUserFieldHookApi(UserFieldHookApi):
+    """ Fake User Field Hook API
+
+    A UserFieldHookApi with one post login hook and one post logout hook registered,
+    each of them takes `hookDelaySecs`, to simulate the hooks of other plugins.
+
+    """
+
+    def __init__(self, hookDelaySecs: float = 0.0):
+        UserFieldHookApi.__init__(self)
+        self._hookDelaySecs = hookDelaySecs
+
+        self.addPostLoginHook(self._hook)
+        self.addPostLogoutHook(self._hook)
+
+    def _hook(self, response):
+        return deferLater(reactor, self._hookDelaySecs, lambda: None)
@@ -2,20 +2,39 @@ import logging
 
 from vortex.handler.TupleDataObservableHandler import TupleDataObservableHandler
 
-from peek_core_device.server.DeviceApiABC import DeviceApiABC
 from peek_plugin_base.PeekVortexUtil import peekAdminName
 from peek_core_user._private.PluginNames import userPluginFilt, \
     userPluginObservableName
+from peek_core_user._private.server.admin_tuple_providers.LdapServerStateTupleProvider import \
+    LdapServerStateTupleProvider
+from peek_core_user._private.server.admin_tuple_providers.LoggedInUserStatusDeltaTupleProvider import \
+    LoggedInUserStatusDeltaTupleProvider
 from peek_core_user._private.server.admin_tuple_providers.LoggedInUserStatusTupleProvider import \
     LoggedInUserStatusTupleProvider
+from peek_core_user._private.server.admin_tuple_providers.LoginStageLatencyTupleProvider import \
+    LoginStageLatencyTupleProvider
+from peek_core_user._private.server.admin_tuple_providers.LoginWorkQueueStatusTupleProvider import \
+    LoginWorkQueueStatusTupleProvider
+from peek_core_user._private.server.controller.LoggedInUserStatusController import \
+    LoggedInUserStatusController
+from peek_core_user._private.server.controller.LoginLatencyController import \
+    LoginLatencyController
+from peek_core_user._private.server.controller.LoginWorkQueue import LoginWorkQueue
 from peek_core_user._private.server.tuple_providers.GroupDetailTupleProvider import \
     GroupDetailTupleProvider
 from peek_core_user._private.server.tuple_providers.UserListItemTupleProvider import \
     UserListItemTupleProvider
 from peek_core_user._private.server.tuple_providers.UserLoggedInTupleProvider import \
     UserLoggedInTupleProvider
+from peek_core_user._private.tuples.LdapServerStateTuple import LdapServerStateTuple
+from peek_core_user._private.tuples.LoggedInUserStatusDeltaTuple import \
+    LoggedInUserStatusDeltaTuple
 from peek_core_user._private.tuples.LoggedInUserStatusTuple import \
     LoggedInUserStatusTuple
+from peek_core_user._private.tuples.LoginStageLatencyTuple import \
+    LoginStageLatencyTuple
+from peek_core_user._private.tuples.LoginWorkQueueStatusTuple import \
+    LoginWorkQueueStatusTuple
 from peek_core_user._private.tuples.UserLoggedInTuple import UserLoggedInTuple
 from peek_core_user.tuples.GroupDetailTuple import GroupDetailTuple
 from peek_core_user.tuples.UserListItemTuple import UserListItemTuple
@@ -23,14 +42,38 @@ from peek_core_user.tuples.UserListItemTuple import UserListItemTuple
 logger = logging.getLogger(__name__)
 
 
-def makeAdminTupleDataObservableHandler(dbSessionCreator, deviceApi: DeviceApiABC, ourApi):
+def makeAdminTupleDataObservableHandler(
+        dbSessionCreator, ourApi,
+        loggedInUserStatusController: LoggedInUserStatusController,
+        loginLatencyController: LoginLatencyController,
+        loginWorkQueue: LoginWorkQueue):
     observable = TupleDataObservableHandler(observableName=userPluginObservableName,
                                             additionalFilt=userPluginFilt,
                                             acceptOnlyFromVortex=peekAdminName)
 
     observable.addTupleProvider(
         LoggedInUserStatusTuple.tupleName(),
-        LoggedInUserStatusTupleProvider(dbSessionCreator, deviceApi)
+        LoggedInUserStatusTupleProvider(loggedInUserStatusController)
+    )
+
+    observable.addTupleProvider(
+        LoggedInUserStatusDeltaTuple.tupleName(),
+        LoggedInUserStatusDeltaTupleProvider(loggedInUserStatusController)
+    )
+
+    observable.addTupleProvider(
+        LoginStageLatencyTuple.tupleName(),
+        LoginStageLatencyTupleProvider(loginLatencyController)
+    )
+
+    observable.addTupleProvider(
+        LoginWorkQueueStatusTuple.tupleName(),
+        LoginWorkQueueStatusTupleProvider(loginWorkQueue)
+    )
+
+    observable.addTupleProvider(
+        LdapServerStateTuple.tupleName(),
+        LdapServerStateTupleProvider(dbSessionCreator)
     )
 
     observable.addTupleProvider(GroupDetailTuple.tupleName(),
@@ -20,14 +20,35 @@ from peek_core_user._private.server.ClientTupleActionProcessor import \
 from peek_core_user._private.server.ClientTupleDataObservable import \
     makeTupleDataObservableHandler
 from peek_core_user._private.server.admin_backend import makeAdminBackendHandlers
+from peek_core_user._private.server.auth_connectors.LdapConnectionPool import \
+    closeLdapConnectionPools
+from peek_core_user._private.server.auth_connectors.LdapReactorClient import \
+    closeLdapReactorConnectionPools, reactorClientSupported
+from peek_core_user._private.server.auth_connectors.PasswordHashEngine import \
+    passwordHashEngine
 from peek_core_user._private.server.api.UserApi import UserApi
+from peek_core_user._private.server.controller.DeviceDescriptionCache import \
+    DeviceDescriptionCache
 from peek_core_user._private.server.controller.ImportController import \
     ImportController
+from peek_core_user._private.server.controller.LdapDirectorySyncController import \
+    LdapDirectorySyncController
+from peek_core_user._private.server.controller.LdapServerStateController import \
+    LdapServerStateController
+from peek_core_user._private.server.controller.LoggedInUserStatusController import \
+    LoggedInUserStatusController
+from peek_core_user._private.server.controller.LoginLatencyController import \
+    LoginLatencyController
 from peek_core_user._private.server.controller.LoginLogoutController import \
     LoginLogoutController
+from peek_core_user._private.server.controller.LoginWorkQueue import LoginWorkQueue
 from peek_core_user._private.server.controller.MainController import MainController
-from peek_core_user._private.tuples.LoggedInUserStatusTuple import \
-    LoggedInUserStatusTuple
+from peek_core_user._private.server.controller.StaleSessionReaper import \
+    StaleSessionReaper
+from peek_core_user._private.storage.Setting import seedSettings, globalSettings, \
+    LOGIN_MAX_CONCURRENCY, LOGIN_MAX_QUEUE_DEPTH, LOGIN_MAX_QUEUE_WAIT_SECS, \
+    LOGGED_IN_STATUS_UPDATE_WINDOW_SECS, PASSWORD_HASH_PROCESSES, \
+    LDAP_USE_REACTOR_CLIENT
 from peek_core_user.server.UserApiABC import UserApiABC
 from peek_plugin_base.storage.DbConnection import DbConnection
 
@@ -108,6 +129,29 @@ class PluginServerEntryHook(PluginServerEntryHookABC,
         Place any custom initialiastion steps here.
 
         """
+        # ----------------
+        # Create the default settings, so the settings reads never have to write
+        dbSession = self.dbSessionCreator()
+        try:
+            seedSettings(dbSession)
+            settings = globalSettings(dbSession, [LOGIN_MAX_CONCURRENCY,
+                                                  LOGIN_MAX_QUEUE_DEPTH,
+                                                  LOGIN_MAX_QUEUE_WAIT_SECS,
+                                                  LOGGED_IN_STATUS_UPDATE_WINDOW_SECS,
+                                                  PASSWORD_HASH_PROCESSES,
+                                                  LDAP_USE_REACTOR_CLIENT])
+        finally:
+            dbSession.close()
+
+        if settings[LDAP_USE_REACTOR_CLIENT] and not reactorClientSupported():
+            logger.warning("LDAP Use Reactor Client is on, but python-ldap doesn't"
+                           " support OPT_CONNECT_ASYNC, the LDAP logins will use"
+                           " threads")
+
+        # ----------------
+        # Password Hash Engine, hash the passwords outside of the server process
+        passwordHashEngine.start(settings[PASSWORD_HASH_PROCESSES])
+
         # ----------------
         # Setup the APIs
         deviceApi: DeviceApiABC = self.platform.getOtherPluginApi("peek_core_device")
@@ -117,14 +161,45 @@ class PluginServerEntryHook(PluginServerEntryHookABC,
         importController = ImportController()
         self._handlers.append(importController)
 
+        # ----------------
+        # Device Description Cache
+        deviceDescriptionCache = DeviceDescriptionCache(deviceApi)
+        self._handlers.append(deviceDescriptionCache)
+
+        # ----------------
+        # Login Work Queue, the login, logout and admin auth thread pool
+        loginWorkQueue = LoginWorkQueue(
+            maxConcurrency=settings[LOGIN_MAX_CONCURRENCY],
+            maxQueueDepth=settings[LOGIN_MAX_QUEUE_DEPTH],
+            maxQueueWaitSecs=settings[LOGIN_MAX_QUEUE_WAIT_SECS]
+        )
+        self._handlers.append(loginWorkQueue)
+
+        # ----------------
+        # Login Latency Controller
+        loginLatencyController = LoginLatencyController()
+        self._handlers.append(loginLatencyController)
+
+        # ----------------
+        # Logged In User Status Controller, the admin apps view of the logged in users
+        loggedInUserStatusController = LoggedInUserStatusController(
+            self.dbSessionCreator, deviceApi,
+            settings[LOGGED_IN_STATUS_UPDATE_WINDOW_SECS]
+        )
+        self._handlers.append(loggedInUserStatusController)
+
         # ----------------
         # Login / Logout Controller
-        loginLogoutController = LoginLogoutController(deviceApi, self.dbSessionCreator)
+        loginLogoutController = LoginLogoutController(deviceApi, self.dbSessionCreator,
+                                                      deviceDescriptionCache,
+                                                      loginLatencyController,
+                                                      loginWorkQueue)
         self._handlers.append(importController)
 
         # ----------------
         # Login / Logout Controller
-        adminAuthController = AdminAuthController(self.dbSessionCreator)
+        adminAuthController = AdminAuthController(self.dbSessionCreator,
+                                                  loginWorkQueue)
         self._handlers.append(adminAuthController)
 
         # ----------------
@@ -150,23 +225,55 @@ class PluginServerEntryHook(PluginServerEntryHookABC,
         # ----------------
         # Admin Tuple Observable
         adminTupleObservable = makeAdminTupleDataObservableHandler(
-            self.dbSessionCreator, deviceApi, self._userApi
+            self.dbSessionCreator, self._userApi,
+            loggedInUserStatusController, loginLatencyController,
+            loginWorkQueue
         )
         self._handlers.append(clientTupleObservable)
 
         # ----------------
         # Setup controllers.
         loginLogoutController.setup(clientTupleObservable,
-                                    adminTupleObservable,
+                                    loggedInUserStatusController,
                                     self._userApi.fieldHookApi,
                                     self._userApi.infoApi)
         importController.setTupleObserver(clientTupleObservable)
+        loginLatencyController.setup(adminTupleObservable)
+        loginWorkQueue.setup(adminTupleObservable)
+        loggedInUserStatusController.setup(adminTupleObservable)
+
+        # ----------------
+        # LDAP Server State Controller, probes the LDAP servers logins are skipping
+        ldapServerStateController = LdapServerStateController(self.dbSessionCreator)
+        self._handlers.append(ldapServerStateController)
+        ldapServerStateController.setup(adminTupleObservable)
+
+        # ----------------
+        # LDAP Directory Sync Controller, copies the LDAP users into the directory
+        ldapDirectorySyncController = LdapDirectorySyncController(self.dbSessionCreator)
+        self._handlers.append(ldapDirectorySyncController)
+        ldapDirectorySyncController.setup(clientTupleObservable)
+
+        # ----------------
+        # Stale Session Reaper, logs out the devices that are long gone
+        staleSessionReaper = StaleSessionReaper(self.dbSessionCreator, deviceApi,
+                                                loginLogoutController,
+                                                loginWorkQueue)
+        self._handlers.append(staleSessionReaper)
+        staleSessionReaper.start()
 
         # Make the admin observable send an update when device online / offline
         # state changes occur
         deviceApi.deviceOnlineStatus().subscribe(
-            lambda _: adminTupleObservable.notifyOfTupleUpdateForTuple(
-                LoggedInUserStatusTuple.tupleType()
+            lambda deviceDetail: loggedInUserStatusController.deviceChanged(
+                deviceDetail.deviceToken
+            )
+        )
+
+        # Drop the cached description when a devices state changes
+        deviceApi.deviceOnlineStatus().subscribe(
+            lambda deviceDetail: deviceDescriptionCache.invalidate(
+                deviceDetail.deviceToken
             )
         )
 
@@ -188,6 +295,10 @@ class PluginServerEntryHook(PluginServerEntryHookABC,
 
         self._userApi.shutdown()
 
+        closeLdapConnectionPools()
+        closeLdapReactorConnectionPools()
+        passwordHashEngine.shutdown()
+
         logger.debug("stopped")
 
     def unload(self):
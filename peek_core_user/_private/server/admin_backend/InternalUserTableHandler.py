@@ -3,6 +3,8 @@ import logging
 from sqlalchemy.orm import subqueryload
 
 from peek_core_user._private.PluginNames import userPluginFilt
+from peek_core_user._private.server.auth_connectors.LdapCredentialCache import \
+    invalidateLdapCredentialCache
 from peek_core_user._private.storage.InternalGroupTuple import InternalGroupTuple
 from peek_core_user._private.storage.InternalUserTuple import InternalUserTuple
 from peek_core_user.tuples.UserListItemTuple import UserListItemTuple
@@ -59,6 +61,8 @@ class __ExtUpdateObservable(OrmCrudHandlerExtension):
         self._tupleDataObserver = tupleDataObserver
 
     def _afterCommit(self, tuple_, tuples, session, payloadFilt):
+        invalidateLdapCredentialCache([t.userName for t in tuples if t.userName])
+
         selector = {}
         # Copy any filter values into the selector
         selector["likeTitle"] = payloadFilt["likeTitle"]
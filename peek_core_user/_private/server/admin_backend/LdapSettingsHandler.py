@@ -1,8 +1,20 @@
 import logging
 
-from vortex.sqla_orm.OrmCrudHandler import OrmCrudHandler
+from vortex.sqla_orm.OrmCrudHandler import OrmCrudHandler, OrmCrudHandlerExtension
 
 from peek_core_user._private.PluginNames import userPluginFilt
+from peek_core_user._private.server.auth_connectors.LdapCircuitBreaker import \
+    ldapCircuitBreakers
+from peek_core_user._private.server.auth_connectors.LdapConnectionPool import \
+    closeLdapConnectionPools
+from peek_core_user._private.server.auth_connectors.LdapReactorClient import \
+    closeLdapReactorConnectionPools
+from peek_core_user._private.server.auth_connectors.LdapCredentialCache import \
+    invalidateLdapCredentialCache
+from peek_core_user._private.server.auth_connectors.LdapRouting import \
+    forgetLdapRoutes
+from peek_core_user._private.server.auth_connectors.LdapSearchPlan import \
+    forgetLdapSearchPlans
 from peek_core_user._private.storage.LdapSetting import LdapSetting
 
 logger = logging.getLogger(__name__)
@@ -12,14 +24,80 @@ filtKey = {"key": "admin.Edit.LdapSetting"}
 filtKey.update(userPluginFilt)
 
 
+def _withoutSyncPassword(ldapSetting: LdapSetting) -> LdapSetting:
+    """ Without Sync Password
+
+    The sync password is write only, the admin app never gets it back.
+    This returns a copy that isn't attached to the session, so blanking the
+    password isn't written to the database when the session commits.
+
+    """
+    return LdapSetting(**{
+        column.name: getattr(ldapSetting, column.name)
+        for column in LdapSetting.__table__.columns
+        if column.name != LdapSetting.syncPassword.key
+    })
+
+
+def _replaceWithoutSyncPassword(tuple_: LdapSetting, tuples: list) -> None:
+    # The handler sends this list, swap the tuple for its copy in place
+    index = [id(t) for t in tuples].index(id(tuple_))
+    tuples[index] = _withoutSyncPassword(tuple_)
+
+
 # This is the CRUD hander
 class __CrudHandler(OrmCrudHandler):
-    pass
+    def createDeclarative(self, session, payloadFilt):
+        # This is used for the create and delete responses
+        return [_withoutSyncPassword(ldapSetting)
+                for ldapSetting in super().createDeclarative(session, payloadFilt)]
+
+
+class __ExtUpdateObservable(OrmCrudHandlerExtension):
+    """ Update Observable ORM Crud Extension
+
+    This extension is called after events that will alter data,
+    it then drops the state kept for the LDAP settings.
+
+    It also keeps the sync password out of the tuples sent to the admin app.
+
+    """
+
+    def beforeUpdate(self, tuple_, tuples, session, payloadFilt):
+        # A blank sync password from the admin app means keep the existing one
+        if tuple_.id is not None and not tuple_.syncPassword:
+            tuple_.syncPassword = (
+                session.query(LdapSetting.syncPassword)
+                    .filter(LdapSetting.id == tuple_.id)
+                    .scalar()
+            )
+
+        return True
+
+    def afterRetrieve(self, tuple_, tuples, session, payloadFilt):
+        _replaceWithoutSyncPassword(tuple_, tuples)
+        return True
+
+    def _afterCommit(self, tuple_, tuples, session, payloadFilt):
+        invalidateLdapCredentialCache()
+        closeLdapConnectionPools()
+        closeLdapReactorConnectionPools()
+        forgetLdapRoutes()
+        forgetLdapSearchPlans()
+        ldapCircuitBreakers.forget()
+        return True
+
+    def afterUpdateCommit(self, tuple_, tuples, session, payloadFilt):
+        _replaceWithoutSyncPassword(tuple_, tuples)
+        return self._afterCommit(tuple_, tuples, session, payloadFilt)
+
+    afterDeleteCommit = _afterCommit
 
 
 # This method creates an instance of the handler class.
 def makeLdapSettingeHandler(tupleObservable, dbSessionCreator):
     handler = __CrudHandler(dbSessionCreator, LdapSetting,
                             filtKey, retreiveAll=True)
+    handler.addExtension(LdapSetting, __ExtUpdateObservable())
 
     return handler
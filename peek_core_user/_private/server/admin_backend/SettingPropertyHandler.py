@@ -5,7 +5,10 @@ from vortex.handler.TupleDataObservableHandler import TupleDataObservableHandler
 from vortex.sqla_orm.OrmCrudHandler import OrmCrudHandler, OrmCrudHandlerExtension
 
 from peek_core_user._private.PluginNames import userPluginFilt
-from peek_core_user._private.storage.Setting import SettingProperty, globalSetting
+from peek_core_user._private.server.auth_connectors.LdapCredentialCache import \
+    invalidateLdapCredentialCache
+from peek_core_user._private.storage.Setting import SettingProperty, globalSetting, \
+    invalidateSettingCache
 from peek_core_user._private.tuples.UserLoginUiSettingTuple import UserLoginUiSettingTuple
 
 logger = logging.getLogger(__name__)
@@ -41,6 +44,9 @@ class __ExtUpdateObservable(OrmCrudHandlerExtension):
         self._tupleDataObserver = tupleDataObserver
 
     def _afterCommit(self, tuple_, tuples, session, payloadFilt):
+        invalidateSettingCache()
+        invalidateLdapCredentialCache()
+
         self._tupleDataObserver.notifyOfTupleUpdate(
             TupleSelector(UserLoginUiSettingTuple.tupleName(), {})
         )
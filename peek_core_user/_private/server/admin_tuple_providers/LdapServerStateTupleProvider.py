@@ -0,0 +1,33 @@
+import logging
+
+from twisted.internet.defer import Deferred
+from vortex.DeferUtil import deferToThreadWrapWithLogger
+from vortex.Payload import Payload
+from vortex.TupleSelector import TupleSelector
+from vortex.handler.TupleDataObservableHandler import TuplesProviderABC
+
+from peek_core_user._private.server.auth_connectors.LdapCircuitBreaker import \
+    ldapCircuitBreakers
+from peek_core_user._private.storage.LdapSetting import LdapSetting
+
+logger = logging.getLogger(__name__)
+
+
+class LdapServerStateTupleProvider(TuplesProviderABC):
+    def __init__(self, dbSessionCreator):
+        self._dbSessionCreator = dbSessionCreator
+
+    @deferToThreadWrapWithLogger(logger)
+    def makeVortexMsg(self, filt: dict, tupleSelector: TupleSelector) -> Deferred:
+        ormSession = self._dbSessionCreator()
+        try:
+            tuples = [ldapCircuitBreakers.stateTuple(ldapSetting)
+                      for ldapSetting in ormSession.query(LdapSetting)
+                          .order_by(LdapSetting.ldapTitle)]
+
+        finally:
+            ormSession.close()
+
+        payloadEnvelope = Payload(filt=filt, tuples=tuples).makePayloadEnvelope()
+        vortexMsg = payloadEnvelope.toVortexMsg()
+        return vortexMsg
@@ -0,0 +1,33 @@
+import logging
+
+from twisted.internet.defer import Deferred, inlineCallbacks
+from vortex.Payload import Payload
+from vortex.TupleSelector import TupleSelector
+from vortex.handler.TupleDataObservableHandler import TuplesProviderABC
+
+from peek_core_user._private.server.controller.LoggedInUserStatusController import \
+    LoggedInUserStatusController
+
+logger = logging.getLogger(__name__)
+
+
+class LoggedInUserStatusDeltaTupleProvider(TuplesProviderABC):
+    def __init__(self, loggedInUserStatusController: LoggedInUserStatusController):
+        self._loggedInUserStatusController = loggedInUserStatusController
+
+    @inlineCallbacks
+    def makeVortexMsg(self, filt: dict, tupleSelector: TupleSelector) -> Deferred:
+        sinceSeq = tupleSelector.selector.get("sinceSeq")
+
+        if tupleSelector.selector.get("snapshot"):
+            tuples = [(yield self._loggedInUserStatusController.snapshotTuple())]
+        elif sinceSeq is not None:
+            tuples = yield self._loggedInUserStatusController \
+                .deltaTuplesSince(sinceSeq)
+        else:
+            tuples = [(yield self._loggedInUserStatusController.latestDeltaTuple())]
+
+        payloadEnvelope = yield Payload(filt=filt, tuples=tuples) \
+            .makePayloadEnvelopeDefer()
+        vortexMsg = yield payloadEnvelope.toVortexMsgDefer()
+        return vortexMsg
@@ -0,0 +1,25 @@
+import logging
+
+from twisted.internet.defer import Deferred
+from vortex.DeferUtil import deferToThreadWrapWithLogger
+from vortex.Payload import Payload
+from vortex.TupleSelector import TupleSelector
+from vortex.handler.TupleDataObservableHandler import TuplesProviderABC
+
+from peek_core_user._private.server.controller.LoginLatencyController import \
+    LoginLatencyController
+
+logger = logging.getLogger(__name__)
+
+
+class LoginStageLatencyTupleProvider(TuplesProviderABC):
+    def __init__(self, loginLatencyController: LoginLatencyController):
+        self._loginLatencyController = loginLatencyController
+
+    @deferToThreadWrapWithLogger(logger)
+    def makeVortexMsg(self, filt: dict, tupleSelector: TupleSelector) -> Deferred:
+        tuples = self._loginLatencyController.stageLatencyTuples()
+
+        payloadEnvelope = Payload(filt=filt, tuples=tuples).makePayloadEnvelope()
+        vortexMsg = payloadEnvelope.toVortexMsg()
+        return vortexMsg
@@ -0,0 +1,25 @@
+import logging
+
+from twisted.internet.defer import Deferred, inlineCallbacks
+from vortex.Payload import Payload
+from vortex.TupleSelector import TupleSelector
+from vortex.handler.TupleDataObservableHandler import TuplesProviderABC
+
+from peek_core_user._private.server.controller.LoginWorkQueue import LoginWorkQueue
+
+logger = logging.getLogger(__name__)
+
+
+class LoginWorkQueueStatusTupleProvider(TuplesProviderABC):
+    def __init__(self, loginWorkQueue: LoginWorkQueue):
+        self._loginWorkQueue = loginWorkQueue
+
+    @inlineCallbacks
+    def makeVortexMsg(self, filt: dict, tupleSelector: TupleSelector) -> Deferred:
+        # The queue is only used from the reactor thread, read it here
+        tuples = [self._loginWorkQueue.statusTuple()]
+
+        payloadEnvelope = yield Payload(filt=filt, tuples=tuples) \
+            .makePayloadEnvelopeDefer()
+        vortexMsg = yield payloadEnvelope.toVortexMsgDefer()
+        return vortexMsg
@@ -1,10 +1,14 @@
 import logging
+from typing import List, Optional
 
 from rx.subjects import Subject
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet import reactor
+from twisted.internet.defer import inlineCallbacks, maybeDeferred, DeferredList, \
+    FirstError, Deferred, DeferredSemaphore
 
 from peek_core_user.server.UserApiABC import UserPostLoginHookCallable, \
     UserPostLogoutHookCallable
+from peek_core_user.server.UserFieldHookApiABC import UserPostBulkLogoutHookCallable
 from peek_core_user.server.UserFieldHookApiABC import UserFieldHookApiABC
 from peek_core_user.tuples.login.UserLoginResponseTuple import UserLoginResponseTuple
 from peek_core_user.tuples.login.UserLogoutResponseTuple import UserLogoutResponseTuple
@@ -12,44 +16,129 @@ from peek_core_user.tuples.login.UserLogoutResponseTuple import UserLogoutRespon
 logger = logging.getLogger(__name__)
 
 
+class _Hook:
+    def __init__(self, callable, independent: bool, timeoutSecs: Optional[float],
+                 replaces=None):
+        self.callable = callable
+        self.independent = independent
+        self.timeoutSecs = timeoutSecs
+        self.replaces = replaces
+
+
 class UserFieldHookApi(UserFieldHookApiABC):
+    #: The number of logouts of a bulk logout to call the post logout hooks for at once
+    BULK_LOGOUT_HOOK_CONCURRENCY = 50
+
     def __init__(self):
 
-        self._postLoginHooks = []
+        self._postLoginHooks: List[_Hook] = []
         self._postLoginSubject = Subject()
 
-        self._postLogoutHooks = []
+        self._postLogoutHooks: List[_Hook] = []
         self._postLogoutSubject = Subject()
 
+        self._postBulkLogoutHooks: List[_Hook] = []
+
     def shutdown(self):
         pass
 
-    def addPostLoginHook(self, callable: UserPostLoginHookCallable) -> None:
-        self._postLoginHooks.append(callable)
+    def addPostLoginHook(self, callable: UserPostLoginHookCallable,
+                         independent: bool = False,
+                         timeoutSecs: Optional[float] = None) -> None:
+        self._postLoginHooks.append(_Hook(callable, independent, timeoutSecs))
 
     def removePostLoginHook(self, callable: UserPostLoginHookCallable) -> None:
-        self._postLoginHooks.remove(callable)
+        self._postLoginHooks.remove(self._findHook(self._postLoginHooks, callable))
 
     def postLoginObservable(self) -> Subject:
         return self._postLoginSubject
 
-    def addPostLogoutHook(self, callable: UserPostLogoutHookCallable) -> None:
-        self._postLogoutHooks.append(callable)
+    def addPostLogoutHook(self, callable: UserPostLogoutHookCallable,
+                          independent: bool = False,
+                          timeoutSecs: Optional[float] = None) -> None:
+        self._postLogoutHooks.append(_Hook(callable, independent, timeoutSecs))
 
     def removePostLogoutHook(self, callable: UserPostLogoutHookCallable) -> None:
-        self._postLogoutHooks.remove(callable)
+        self._postLogoutHooks.remove(self._findHook(self._postLogoutHooks, callable))
 
     def postLogoffObservable(self) -> Subject:
         return self._postLogoutSubject
 
+    def addPostBulkLogoutHook(self, callable: UserPostBulkLogoutHookCallable,
+                              postLogoutHook: Optional[
+                                  UserPostLogoutHookCallable] = None,
+                              independent: bool = False,
+                              timeoutSecs: Optional[float] = None) -> None:
+        self._postBulkLogoutHooks.append(
+            _Hook(callable, independent, timeoutSecs, replaces=postLogoutHook)
+        )
+
+    def removePostBulkLogoutHook(self,
+                                 callable: UserPostBulkLogoutHookCallable) -> None:
+        self._postBulkLogoutHooks.remove(
+            self._findHook(self._postBulkLogoutHooks, callable)
+        )
+
+    @staticmethod
+    def _findHook(hooks: List[_Hook], callable) -> _Hook:
+        for hook in hooks:
+            if hook.callable == callable:
+                return hook
+        raise ValueError("Hook %s is not registered" % callable)
+
+    @staticmethod
+    def _callHook(hook: _Hook, response) -> Deferred:
+        d = maybeDeferred(hook.callable, response)
+        if hook.timeoutSecs is not None:
+            d.addTimeout(hook.timeoutSecs, reactor)
+        return d
+
+    @inlineCallbacks
+    def _callHooks(self, hooks: List[_Hook], response):
+        """ Call Hooks
+
+        The independent hooks are started together, the others are then called one
+        at a time, in the order they were added.
+
+        The first failure of any hook is raised once the non independent
+        hooks are done.
+
+        """
+        hooks = list(hooks)
+
+        independentDs = [self._callHook(hook, response)
+                         for hook in hooks if hook.independent]
+
+        independentList = None
+        if independentDs:
+            independentList = DeferredList(independentDs,
+                                           fireOnOneErrback=True,
+                                           consumeErrors=True)
+
+        try:
+            for hook in hooks:
+                if not hook.independent:
+                    yield self._callHook(hook, response)
+
+        except Exception:
+            if independentList:
+                # We're already failing, ignore the independent hooks results
+                independentList.addErrback(lambda _: None)
+            raise
+
+        if independentList:
+            try:
+                yield independentList
+            except FirstError as e:
+                e.subFailure.raiseException()
+
     @inlineCallbacks
     def callLogoutHooks(self, response: UserLogoutResponseTuple):
         """
         Returns Deferred[UserLogoutResponseTuple]:
         """
 
-        for callable in self._postLogoutHooks:
-            yield callable(response)
+        yield self._callHooks(self._postLogoutHooks, response)
 
         self._postLoginSubject.on_next(response)
 
@@ -60,7 +149,40 @@ class UserFieldHookApi(UserFieldHookApiABC):
 
         """
 
-        for callable in self._postLoginHooks:
-            yield callable(response)
+        yield self._callHooks(self._postLoginHooks, response)
 
         self._postLoginSubject.on_next(response)
+
+    @inlineCallbacks
+    def callBulkLogoutHooks(self, responses: List[UserLogoutResponseTuple]):
+        """ Call Bulk Logout Hooks
+
+        The users have already been logged out, so hook failures are logged,
+        they don't fail the bulk logout.
+
+        The bulk logout hooks are called once with all the responses, the post logout
+        hooks they don't replace are called for each response.
+
+        Returns Deferred[None]
+        """
+        replaced = set(h.replaces for h in self._postBulkLogoutHooks if h.replaces)
+        postLogoutHooks = [h for h in self._postLogoutHooks
+                           if h.callable not in replaced]
+
+        semaphore = DeferredSemaphore(self.BULK_LOGOUT_HOOK_CONCURRENCY)
+
+        ds = [self._callHooks(self._postBulkLogoutHooks, responses)]
+        if postLogoutHooks:
+            ds.extend(semaphore.run(self._callHooks, postLogoutHooks, response)
+                      for response in responses)
+
+        results = yield DeferredList(ds, consumeErrors=True)
+
+        failures = [result for succeeded, result in results if not succeeded]
+        if failures:
+            logger.error("%s logout hook calls failed for a bulk logout of %s users,"
+                         " the first was :\n%s", len(failures), len(responses),
+                         failures[0].getTraceback())
+
+        for response in responses:
+            self._postLogoutSubject.on_next(response)
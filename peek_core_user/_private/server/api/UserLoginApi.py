@@ -6,6 +6,8 @@ from peek_core_device.server.DeviceApiABC import DeviceApiABC
 from peek_core_user._private.server.controller.LoginLogoutController import \
     LoginLogoutController
 from peek_core_user.server.UserLoginApiABC import UserLoginApiABC
+from peek_core_user.tuples.login.UserBulkLogoutSelectorTuple import \
+    UserBulkLogoutSelectorTuple
 from peek_core_user.tuples.login.UserLoginAction import UserLoginAction
 from peek_core_user.tuples.login.UserLogoutAction import UserLogoutAction
 
@@ -25,6 +27,9 @@ class UserLoginApi(UserLoginApiABC):
     def logout(self, logoutTuple: UserLogoutAction) -> Deferred:
         return self._loginLogoutController.logout(logoutTuple)
 
+    def bulkLogout(self, selector: UserBulkLogoutSelectorTuple) -> Deferred:
+        return self._loginLogoutController.bulkLogout(selector)
+
 
     def login(self, loginTuple: UserLoginAction) -> Deferred:
         return self._loginLogoutController.login(loginTuple)
\ No newline at end of file
@@ -1,14 +1,16 @@
 import logging
 from typing import List
 
-from peek_core_user._private.server.controller.PasswordUpdateController import \
-    PasswordUpdateController
+from peek_core_user._private.server.auth_connectors.PasswordHash import needsRehash
+from peek_core_user._private.server.auth_connectors.PasswordHashEngine import \
+    passwordHashEngine
 from peek_core_user._private.storage.InternalGroupTuple import InternalGroupTuple
 from peek_core_user._private.storage.InternalUserGroupTuple import InternalUserGroupTuple
 from peek_core_user._private.storage.InternalUserPassword import InternalUserPassword
 from peek_core_user._private.storage.InternalUserTuple import InternalUserTuple
-from peek_core_user._private.storage.Setting import globalSetting, ADMIN_LOGIN_GROUP, \
-    OFFICE_LOGIN_GROUP, MOBILE_LOGIN_GROUP
+from peek_core_user._private.storage.Setting import globalSettings, \
+    ADMIN_LOGIN_GROUP, OFFICE_LOGIN_GROUP, MOBILE_LOGIN_GROUP, \
+    PASSWORD_HASH_ITERATIONS
 from peek_core_user.server.UserDbErrors import UserPasswordNotSetException
 from twisted.cred.error import LoginFailed
 
@@ -31,10 +33,21 @@ class InternalAuth:
         if not results or not results[0].password:
             raise UserPasswordNotSetException(userName)
 
+        settings = globalSettings(dbSession, [ADMIN_LOGIN_GROUP,
+                                              OFFICE_LOGIN_GROUP,
+                                              MOBILE_LOGIN_GROUP,
+                                              PASSWORD_HASH_ITERATIONS])
+
         passObj = results[0]
-        if passObj.password != PasswordUpdateController.hashPass(password):
+        if not passwordHashEngine.verifyBlocking(password, passObj.password):
             raise LoginFailed("Username or password is incorrect")
 
+        # Upgrade old hashes, and hashes with a different cost, now we have the password
+        iterations = settings[PASSWORD_HASH_ITERATIONS]
+        if needsRehash(passObj.password, iterations):
+            passObj.password = passwordHashEngine.hashBlocking(password, iterations)
+            dbSession.commit()
+
         groups = dbSession.query(InternalGroupTuple) \
             .join(InternalUserGroupTuple) \
             .filter(InternalUserGroupTuple.userId == passObj.userId) \
@@ -43,17 +56,17 @@ class InternalAuth:
         groupNames = [g.groupName for g in groups]
 
         if forService == self.FOR_ADMIN:
-            adminGroup = globalSetting(dbSession, ADMIN_LOGIN_GROUP)
+            adminGroup = settings[ADMIN_LOGIN_GROUP]
             if adminGroup not in set(groupNames):
                 raise LoginFailed("User is not apart of an authorised group")
 
         elif forService == self.FOR_OFFICE:
-            officeGroup = globalSetting(dbSession, OFFICE_LOGIN_GROUP)
+            officeGroup = settings[OFFICE_LOGIN_GROUP]
             if officeGroup not in set(groupNames):
                 raise LoginFailed("User is not apart of an authorised group")
 
         elif forService == self.FOR_FIELD:
-            fieldGroup = globalSetting(dbSession, MOBILE_LOGIN_GROUP)
+            fieldGroup = settings[MOBILE_LOGIN_GROUP]
             if fieldGroup not in set(groupNames):
                 raise LoginFailed("User is not apart of an authorised group")
 
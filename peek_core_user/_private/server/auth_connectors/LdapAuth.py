@@ -1,7 +1,26 @@
 import logging
-from typing import List
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from threading import Lock
+from typing import List, Optional, Tuple
 
 from peek_core_user._private.server.auth_connectors.InternalAuth import InternalAuth
+from peek_core_user._private.server.auth_connectors.LdapCircuitBreaker import \
+    ldapCircuitBreakers, LDAP_SERVER_ERRORS
+from peek_core_user._private.server.auth_connectors.LdapConnectionPool import \
+    ldapConnectionPool
+from peek_core_user._private.server.auth_connectors.LdapCredentialCache import \
+    LdapAuthResult, getCachedLdapAuth, cacheLdapAuth, invalidateLdapCredentialCache
+from peek_core_user._private.server.auth_connectors.LdapGroupWriter import \
+    ldapImportHash, writeLdapGroupsBlocking
+from peek_core_user._private.server.auth_connectors.LdapRouting import \
+    routeLdapSettings, rememberLdapRoute
+from peek_core_user._private.server.auth_connectors.LdapSearchPlan import \
+    ldapSearchPlan, LdapSearchPlan
+from peek_core_user._private.storage.Setting import globalSettings, \
+    LDAP_CREDENTIAL_CACHE_ENABLED, LDAP_CREDENTIAL_CACHE_TTL_SECS, \
+    LDAP_CONNECTION_POOL_MAX_SIZE, LDAP_TRY_SERVERS_CONCURRENTLY, \
+    LDAP_NETWORK_TIMEOUT_SECS, LDAP_OPERATION_TIMEOUT_SECS, \
+    LDAP_BREAKER_FAILURE_THRESHOLD, LDAP_BREAKER_COOLDOWN_SECS, SettingSnapshot
 from peek_core_user._private.storage.InternalUserTuple import InternalUserTuple
 from peek_core_user._private.storage.LdapSetting import LdapSetting
 from twisted.cred.error import LoginFailed
@@ -43,11 +62,51 @@ class LdapNotEnabledError(Exception):
     pass
 
 
+_raceExecutorLock = Lock()
+_raceExecutor: Optional[ThreadPoolExecutor] = None
+_raceExecutorSize = 0
+
+
+def _raceExecutorFor(size: int) -> ThreadPoolExecutor:
+    """ Race Executor For
+
+    :param size: The most LDAP attempts that could run at once.
+    :return: The executor for the concurrent LDAP attempts, it's replaced with a
+                bigger one when more attempts could run at once.
+    """
+    global _raceExecutor, _raceExecutorSize
+
+    with _raceExecutorLock:
+        if _raceExecutor and size <= _raceExecutorSize:
+            return _raceExecutor
+
+        oldExecutor = _raceExecutor
+        _raceExecutor = ThreadPoolExecutor(max_workers=size,
+                                           thread_name_prefix="peek_core_user.LdapAuth")
+        _raceExecutorSize = size
+
+    # The running attempts finish in the old threads
+    if oldExecutor:
+        oldExecutor.shutdown(wait=False)
+
+    return _raceExecutor
+
+
 class LdapAuth:
     FOR_ADMIN = InternalAuth.FOR_ADMIN
     FOR_OFFICE = InternalAuth.FOR_OFFICE
     FOR_FIELD = InternalAuth.FOR_FIELD
 
+    #: The settings the LDAP login uses
+    SETTING_KEYS = [LDAP_CREDENTIAL_CACHE_ENABLED,
+                    LDAP_CREDENTIAL_CACHE_TTL_SECS,
+                    LDAP_CONNECTION_POOL_MAX_SIZE,
+                    LDAP_TRY_SERVERS_CONCURRENTLY,
+                    LDAP_NETWORK_TIMEOUT_SECS,
+                    LDAP_OPERATION_TIMEOUT_SECS,
+                    LDAP_BREAKER_FAILURE_THRESHOLD,
+                    LDAP_BREAKER_COOLDOWN_SECS]
+
     def checkPassBlocking(self, dbSession, userName, password,
                           forService: int) -> List[str]:
         """ Login User
@@ -61,35 +120,117 @@ class LdapAuth:
 
         assert forService in (1, 2, 3), "Unhandled for service type"
 
+        settings = globalSettings(dbSession, self.SETTING_KEYS)
+        ldapSettings = self._ldapSettingsForBlocking(dbSession, forService)
+
+        # From here on the user is known by the name without the domain
+        userName, ldapSettings = self._routeLdapSettings(userName, ldapSettings)
+
+        # Skip the LDAP servers if this user recently authenticated with this password
+        cachedGroups = self._cachedGroupsBlocking(userName, password, ldapSettings,
+                                                  settings)
+        if cachedGroups is not None:
+            return cachedGroups
+
+        ldapSettings = self._availableLdapSettings(ldapSettings)
+
+        if settings[LDAP_TRY_SERVERS_CONCURRENTLY] and len(ldapSettings) > 1:
+            result, firstException = self._tryConcurrently(
+                userName, password, ldapSettings, settings
+            )
+        else:
+            result, firstException = self._trySequentially(
+                userName, password, ldapSettings, settings
+            )
+
+        if result:
+            self._succeededBlocking(dbSession, userName, password, result,
+                                    ldapSettings, settings)
+            return list(result.groups)
+
+        self._failed(userName, firstException)
+
+    def _ldapSettingsForBlocking(self, dbSession, forService: int
+                                 ) -> List[LdapSetting]:
         ldapSettings: List[LdapSetting] = dbSession.query(LdapSetting) \
             .all()
 
         if not ldapSettings:
             raise Exception("No LDAP servers configured.")
 
-        firstException = None
+        return [s for s in ldapSettings if self._isEnabledFor(s, forService)]
 
-        for ldapSetting in ldapSettings:
-            if forService == self.FOR_ADMIN:
-                if not ldapSetting.adminEnabled:
-                    continue
+    def _cachedGroupsBlocking(self, userName, password,
+                              ldapSettings: List[LdapSetting],
+                              settings: SettingSnapshot) -> Optional[List[str]]:
+        """ Cached Groups
+
+        :return: The groups from the credential cache, or None if the LDAP servers
+                    need to be asked.
+        """
+        if not settings[LDAP_CREDENTIAL_CACHE_ENABLED]:
+            return None
 
-            elif forService == self.FOR_OFFICE:
-                if not ldapSetting.desktopEnabled:
-                    continue
+        cachedResult = getCachedLdapAuth(userName, password)
+        if cachedResult \
+                and cachedResult.ldapSettingId in set(s.id for s in ldapSettings):
+            return list(cachedResult.groups)
 
-            elif forService == self.FOR_FIELD:
-                if not ldapSetting.mobileEnabled:
-                    continue
+        return None
 
-            else:
-                raise Exception("InternalAuth:Unhandled forService type %s" % forService)
+    def _routeLdapSettings(self, userName, ldapSettings: List[LdapSetting]
+                           ) -> Tuple[str, List[LdapSetting]]:
+        """ Route LDAP Settings
 
-            try:
-                return self._tryLdap(dbSession, userName, password, ldapSetting)
-            except LoginFailed as e:
-                if not firstException:
-                    firstException = e
+        Go straight to the domain of the user, or to the last server that worked.
+
+        :return: A tuple of the user name without the domain, and the LDAP
+                    settings to try.
+        """
+        ldapUserName, ldapSettings = routeLdapSettings(userName, ldapSettings)
+        if not ldapSettings:
+            raise LoginFailed("No LDAP server is configured for the domain of %s"
+                              % userName)
+
+        return ldapUserName, ldapSettings
+
+    def _availableLdapSettings(self, ldapSettings: List[LdapSetting]
+                               ) -> List[LdapSetting]:
+        # Skip the servers that have been failing
+        ldapSettings = [s for s in ldapSettings if ldapCircuitBreakers.isAvailable(s)]
+        if not ldapSettings:
+            raise LoginFailed("The LDAP servers are unavailable, please try again"
+                              " later")
+
+        return ldapSettings
+
+    def _succeededBlocking(self, dbSession, userName, password,
+                           result: LdapAuthResult, ldapSettings: List[LdapSetting],
+                           settings: SettingSnapshot) -> None:
+        rememberLdapRoute(userName, result.ldapSettingId)
+
+        ldapSetting = [s for s in ldapSettings if s.id == result.ldapSettingId][0]
+        importHash = ldapImportHash(ldapSetting)
+
+        internalUser = self._makeOrCreateInternalUserBlocking(
+            dbSession, userName, result.userTitle, result.userUuid, result.email,
+            ldapSetting.ldapTitle, importHash
+        )
+
+        # Store the groups, so the group queries don't need the LDAP server.
+        # Don't change the groups of the users that an import owns.
+        if internalUser.importHash in (None, importHash):
+            writeLdapGroupsBlocking(dbSession, {internalUser.id: result.groups},
+                                    importHash)
+            dbSession.commit()
+
+        if settings[LDAP_CREDENTIAL_CACHE_ENABLED]:
+            cacheLdapAuth(userName, password, result,
+                          settings[LDAP_CREDENTIAL_CACHE_TTL_SECS])
+
+    def _failed(self, userName, firstException: Optional[Exception]) -> None:
+        # The password may have changed, forget the old one
+        invalidateLdapCredentialCache([userName])
 
         logger.error("Login failed for %s, %s",
                      userName, str(firstException))
@@ -99,134 +240,197 @@ class LdapAuth:
 
         raise LoginFailed("No LDAP providers found for this service")
 
-    def _tryLdap(self, dbSession, userName, password,
-                 ldapSetting: LdapSetting) -> List[str]:
+    def _isEnabledFor(self, ldapSetting: LdapSetting, forService: int) -> bool:
+        if forService == self.FOR_ADMIN:
+            return ldapSetting.adminEnabled
+
+        if forService == self.FOR_OFFICE:
+            return ldapSetting.desktopEnabled
+
+        if forService == self.FOR_FIELD:
+            return ldapSetting.mobileEnabled
+
+        raise Exception("InternalAuth:Unhandled forService type %s" % forService)
+
+    def _trySequentially(self, userName, password, ldapSettings: List[LdapSetting],
+                         settings: SettingSnapshot
+                         ) -> Tuple[Optional[LdapAuthResult], Optional[Exception]]:
+        """ Try Sequentially
+
+        Try each LDAP server in turn, until one succeeds.
+
+        :return: A tuple of the result, or None, and the first LoginFailed.
+        """
+        firstException = None
+
+        for ldapSetting in ldapSettings:
+            try:
+                return self._tryLdap(userName, password, ldapSetting,
+                                     settings), None
+            except LoginFailed as e:
+                if not firstException:
+                    firstException = e
+
+        return None, firstException
+
+    def _tryConcurrently(self, userName, password, ldapSettings: List[LdapSetting],
+                         settings: SettingSnapshot
+                         ) -> Tuple[Optional[LdapAuthResult], Optional[Exception]]:
+        """ Try Concurrently
+
+        Try all the LDAP servers at once, the first success wins. The first server,
+        the one the user was routed to, is tried on the calling thread, the others
+        on the race executor.
+
+        The attempts that haven't started are cancelled, the running ones are left
+        to finish, their results are ignored.
+
+        :return: A tuple of the result, or None, and the first failure in the
+                    order of the LDAP settings.
+        """
+        # Each LDAP setting's connection pool limits how many attempts can run
+        executor = _raceExecutorFor(
+            settings[LDAP_CONNECTION_POOL_MAX_SIZE] * len(ldapSettings)
+        )
+
+        futures = [executor.submit(self._tryLdap, userName, password,
+                                   ldapSetting, settings)
+                   for ldapSetting in ldapSettings[1:]]
+
+        pending = set(futures)
         try:
+            try:
+                return self._tryLdap(userName, password, ldapSettings[0],
+                                     settings), None
 
-            conn = ldap.initialize(ldapSetting.ldapUri)
-            conn.protocol_version = 3
-            conn.set_option(ldap.OPT_REFERRALS, 0)
+            except LoginFailed as e:
+                firstException = e
 
-            # make the connection
-            conn.simple_bind_s('%s@%s' % (userName, ldapSetting.ldapDomain), password)
-            ldapFilter = "(&(objectCategory=person)(objectClass=user)(sAMAccountName=%s))" % userName
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        return future.result(), None
 
-            dcParts = ','.join(['DC=%s' % part
-                                for part in ldapSetting.ldapDomain.split('.')])
+        finally:
+            for future in pending:
+                future.cancel()
 
-            ldapBases = []
-            if ldapSetting.ldapOUFolders:
-                ldapBases += self._makeLdapBase(ldapSetting.ldapOUFolders, userName, "OU")
-            if ldapSetting.ldapCNFolders:
-                ldapBases += self._makeLdapBase(ldapSetting.ldapCNFolders, userName, "CN")
+        return None, firstException
 
-            if not ldapBases:
-                raise LoginFailed("LDAP OU and/or CN search paths must be set.")
+    def _tryLdap(self, userName, password,
+                 ldapSetting: LdapSetting, settings: SettingSnapshot) -> LdapAuthResult:
+        plan = ldapSearchPlan(ldapSetting)
 
-            userDetails = None
-            for ldapBase in ldapBases:
-                ldapBase = "%s,%s" % (ldapBase, dcParts)
+        try:
+            pool = ldapConnectionPool(ldapSetting,
+                                      settings[LDAP_CONNECTION_POOL_MAX_SIZE],
+                                      settings[LDAP_NETWORK_TIMEOUT_SECS],
+                                      settings[LDAP_OPERATION_TIMEOUT_SECS])
 
-                try:
-                    # Example Base : 'CN=atuser1,CN=Users,DC=synad,DC=synerty,DC=com'
-                    userDetails = conn.search_st(ldapBase, ldap.SCOPE_SUBTREE,
-                                                 ldapFilter, None, 0, 10)
+            # The connection is bound as the user first, see LdapConnectionPool
+            with pool.connection() as conn:
+                userDetails = self._bindAndSearch(conn, userName, password,
+                                                  ldapSetting, plan,
+                                                  settings[LDAP_OPERATION_TIMEOUT_SECS])
 
-                    if userDetails:
-                        break
+            ldapCircuitBreakers.recordSuccess(ldapSetting)
 
-                except ldap.NO_SUCH_OBJECT:
-                    logger.warning("CN or OU doesn't exist : %s", ldapBase)
+        except LDAP_SERVER_ERRORS as e:
+            raise self._serverFailed(ldapSetting, e, settings)
 
         except ldap.NO_SUCH_OBJECT:
             raise LoginFailed(
                 "An internal error occurred, ask admin to check Attune logs")
 
         except ldap.INVALID_CREDENTIALS:
+            # The server answered, so it's healthy
+            ldapCircuitBreakers.recordSuccess(ldapSetting)
             raise LoginFailed("Username or password is incorrect")
 
+        return self._makeResult(ldapSetting, plan, userDetails)
+
+    def _serverFailed(self, ldapSetting: LdapSetting, error: Exception,
+                      settings: SettingSnapshot) -> LoginFailed:
+        ldapCircuitBreakers.recordFailure(ldapSetting, error,
+                                          settings[LDAP_BREAKER_FAILURE_THRESHOLD],
+                                          settings[LDAP_BREAKER_COOLDOWN_SECS])
+        logger.warning("LDAP server %s failed, %s", ldapSetting.ldapTitle, error)
+        return LoginFailed("The LDAP server %s is unavailable"
+                           % ldapSetting.ldapTitle)
+
+    def _makeResult(self, ldapSetting: LdapSetting, plan: LdapSearchPlan,
+                    userDetails) -> LdapAuthResult:
         if not userDetails:
             raise LoginFailed("User doesn't belong to the correct CN/OUs")
 
         userDetails = userDetails[0][1]
 
-        groups = []
-        for memberOf in userDetails['memberOf']:
-            group = memberOf.decode().split(',')[0]
-            if '=' in group:
-                group = group.split('=')[1]
-            groups.append(group)
+        groups = plan.groupNames(userDetails.get('memberOf', []))
 
         userTitle = None
-        if userDetails['displayName']:
+        if userDetails.get('displayName'):
             userTitle = userDetails['displayName'][0].decode()
 
         email = None
-        if userDetails['userPrincipalName']:
+        if userDetails.get('userPrincipalName'):
             email = userDetails['userPrincipalName'][0].decode()
 
         userUuid = None
-        if userDetails['distinguishedName']:
+        if userDetails.get('distinguishedName'):
             userUuid = userDetails['distinguishedName'][0].decode()
 
-        if ldapSetting.ldapGroups:
-            ldapGroups = set([s.strip() for s in ldapSetting.ldapGroups.split(',')])
+        if not plan.isAuthorised(groups):
+            raise LoginFailed("User is not apart of an authorised group")
+
+        return LdapAuthResult(ldapSettingId=ldapSetting.id,
+                              groups=tuple(groups),
+                              userTitle=userTitle,
+                              userUuid=userUuid,
+                              email=email)
+
+    def _bindAndSearch(self, conn, userName, password, ldapSetting: LdapSetting,
+                       plan: LdapSearchPlan, timeoutSecs: float):
+        # Bind as the user, this checks their password
+        conn.simple_bind_s('%s@%s' % (userName, ldapSetting.ldapDomain), password)
+        ldapFilter = plan.userFilter(userName)
+
+        userDetails = None
+        for ldapBase in plan.searchBasesFor(userName):
+            try:
+                userDetails = conn.search_st(ldapBase, ldap.SCOPE_SUBTREE,
+                                             ldapFilter, plan.ATTRIBUTES, 0,
+                                             timeoutSecs)
 
-            if not ldapGroups & set(groups):
-                raise LoginFailed("User is not apart of an authorised group")
+                if userDetails:
+                    plan.foundIn(userName, ldapBase)
+                    break
 
-        self._makeOrCreateInternalUserBlocking(dbSession,
-                                               userName, userTitle, userUuid, email,
-                                               ldapSetting.ldapTitle)
+            except ldap.NO_SUCH_OBJECT:
+                logger.warning("CN or OU doesn't exist : %s", ldapBase)
 
-        return groups
+        return userDetails
 
     def _makeOrCreateInternalUserBlocking(self, dbSession,
                                           userName, userTitle, userUuid, email,
-                                          ldapName):
+                                          ldapName, importHash) -> InternalUserTuple:
 
         internalUser = dbSession.query(InternalUserTuple) \
             .filter(InternalUserTuple.userName == userName) \
             .all()
 
         if internalUser:
-            return
+            return internalUser[0]
 
         newInternalUser = InternalUserTuple(
             userName=userName,
             userTitle="%s (%s)" % (userTitle, ldapName),
             userUuid=userUuid,
-            email=email
+            email=email,
+            importHash=importHash
         )
 
         dbSession.add(newInternalUser)
         dbSession.commit()
 
-    def _makeLdapBase(self, ldapFolders, userName, propertyName):
-        try:
-            ldapBases = []
-            for folder in ldapFolders.split(','):
-                folder = folder.strip()
-                if not folder:
-                    continue
-
-                parts = []
-                for part in folder.split('/'):
-                    part = part.strip()
-                    if not part:
-                        continue
-                    parts.append('%s=%s' % (propertyName, part))
-
-                ldapBases.append(','.join(reversed(parts)))
-
-            return ldapBases
-
-        except Exception as e:
-            logger.error(
-                "Login failed for %s, failed to parse LDAP %s Folders setting",  propertyName,
-                userName)
-
-            logger.exception(e)
-
-            raise LoginFailed(
-                "An internal error occurred, ask admin to check Attune logs")
+        return newInternalUser
@@ -0,0 +1,157 @@
+import logging
+from datetime import datetime
+from threading import Lock
+from time import monotonic
+from typing import List, Optional
+
+import ldap
+import pytz
+
+from peek_core_user._private.storage.LdapSetting import LdapSetting
+from peek_core_user._private.tuples.LdapServerStateTuple import LdapServerStateTuple
+
+logger = logging.getLogger(__name__)
+
+#: The python-ldap errors that mean the server is down or hung, rather than the
+# login being wrong
+LDAP_SERVER_ERRORS = (ldap.SERVER_DOWN, ldap.TIMEOUT, ldap.CONNECT_ERROR,
+                      ldap.TIMELIMIT_EXCEEDED, ldap.BUSY, ldap.UNAVAILABLE)
+
+
+class _ServerState:
+    def __init__(self, ldapSetting: LdapSetting):
+        self.ldapSettingId = ldapSetting.id
+        self.ldapTitle = ldapSetting.ldapTitle
+        self.ldapUri = ldapSetting.ldapUri
+
+        self.consecutiveFailures = 0
+        self.isOpen = False
+        self.openedDate: Optional[datetime] = None
+        self.nextProbeAt: Optional[float] = None
+        self.cooldownSecs = 0
+        self.lastError: Optional[str] = None
+        self.lastProbeDate: Optional[datetime] = None
+
+    def toTuple(self) -> LdapServerStateTuple:
+        return LdapServerStateTuple(
+            ldapSettingId=self.ldapSettingId,
+            ldapTitle=self.ldapTitle,
+            ldapUri=self.ldapUri,
+            state=(LdapServerStateTuple.STATE_OPEN if self.isOpen
+                   else LdapServerStateTuple.STATE_CLOSED),
+            consecutiveFailures=self.consecutiveFailures,
+            openedDate=self.openedDate,
+            lastError=self.lastError,
+            lastProbeDate=self.lastProbeDate
+        )
+
+
+class _LdapCircuitBreakers:
+    """ LDAP Circuit Breakers
+
+    This class tracks the failures of each LDAP server.
+
+    After a number of consecutive failures the circuit is opened, and logins skip
+    that server. Once the cooldown has passed, the server is probed in the
+    background, and the circuit is closed again when a probe succeeds.
+
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._statesBySettingId = {}
+        self._changed = False
+
+    def _state(self, ldapSetting: LdapSetting) -> _ServerState:
+        state = self._statesBySettingId.get(ldapSetting.id)
+        if state is None or state.ldapUri != ldapSetting.ldapUri:
+            state = _ServerState(ldapSetting)
+            self._statesBySettingId[ldapSetting.id] = state
+            self._changed = True
+        return state
+
+    def isAvailable(self, ldapSetting: LdapSetting) -> bool:
+        with self._lock:
+            state = self._statesBySettingId.get(ldapSetting.id)
+            return not (state and state.isOpen
+                        and state.ldapUri == ldapSetting.ldapUri)
+
+    def recordSuccess(self, ldapSetting: LdapSetting) -> None:
+        with self._lock:
+            state = self._state(ldapSetting)
+            if state.consecutiveFailures or state.isOpen:
+                self._close(state)
+
+    def recordFailure(self, ldapSetting: LdapSetting, error: Exception,
+                      failureThreshold: int, cooldownSecs: float) -> None:
+        with self._lock:
+            state = self._state(ldapSetting)
+            state.consecutiveFailures += 1
+            state.lastError = str(error)
+            self._changed = True
+
+            if not state.isOpen and state.consecutiveFailures >= failureThreshold:
+                logger.warning("LDAP server %s failed %s times, skipping it for %ss,"
+                               " %s", state.ldapTitle, state.consecutiveFailures,
+                               cooldownSecs, error)
+                state.isOpen = True
+                state.openedDate = datetime.now(pytz.utc)
+                state.cooldownSecs = cooldownSecs
+                state.nextProbeAt = monotonic() + cooldownSecs
+
+    def dueForProbe(self) -> List[tuple]:
+        """ Due For Probe
+
+        :return: A list of (ldapSettingId, ldapUri) of the open servers whose
+                    cooldown has passed.
+        """
+        now = monotonic()
+        with self._lock:
+            return [(s.ldapSettingId, s.ldapUri)
+                    for s in self._statesBySettingId.values()
+                    if s.isOpen and s.nextProbeAt <= now]
+
+    def probed(self, ldapSettingId: int, ldapUri: str,
+               error: Optional[Exception]) -> None:
+        with self._lock:
+            state = self._statesBySettingId.get(ldapSettingId)
+            if state is None or state.ldapUri != ldapUri or not state.isOpen:
+                return
+
+            state.lastProbeDate = datetime.now(pytz.utc)
+            self._changed = True
+
+            if error is None:
+                logger.info("LDAP server %s is back, using it again", state.ldapTitle)
+                self._close(state)
+                return
+
+            state.lastError = str(error)
+            state.nextProbeAt = monotonic() + state.cooldownSecs
+
+    def _close(self, state: _ServerState) -> None:
+        state.consecutiveFailures = 0
+        state.isOpen = False
+        state.openedDate = None
+        state.nextProbeAt = None
+        self._changed = True
+
+    def takeChanged(self) -> bool:
+        with self._lock:
+            changed, self._changed = self._changed, False
+            return changed
+
+    def stateTuple(self, ldapSetting: LdapSetting) -> LdapServerStateTuple:
+        with self._lock:
+            state = self._statesBySettingId.get(ldapSetting.id)
+            if state is None or state.ldapUri != ldapSetting.ldapUri:
+                state = _ServerState(ldapSetting)
+            return state.toTuple()
+
+    def forget(self) -> None:
+        with self._lock:
+            self._statesBySettingId = {}
+            self._changed = True
+
+
+ldapCircuitBreakers = _LdapCircuitBreakers()
@@ -0,0 +1,208 @@
+import logging
+from contextlib import contextmanager
+from threading import Lock, BoundedSemaphore
+from time import monotonic
+
+import ldap
+from twisted.cred.error import LoginFailed
+
+from peek_core_user._private.server.auth_connectors.LdapCircuitBreaker import \
+    LDAP_SERVER_ERRORS
+from peek_core_user._private.storage.LdapSetting import LdapSetting
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "lastUsed")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.lastUsed = monotonic()
+
+
+class LdapConnectionPool:
+    """ LDAP Connection Pool
+
+    This class keeps the connections to one LDAP server open between logins, so
+    each login doesn't pay for the TCP and TLS setup.
+
+    A connection that has been idle is health checked before it's used, a
+    connection that fails is closed rather than returned to the pool.
+
+    The connections are returned to the pool still bound as the last user, every
+    login starts with its own bind, which replaces that identity. This saves a
+    round trip per login, and works with servers that refuse anonymous binds.
+
+    """
+
+    #: Check connections that have been idle longer than this before using them
+    HEALTH_CHECK_IDLE_SECS = 60
+
+    #: How long to wait for a connection when the pool is at its maximum size
+    CHECKOUT_TIMEOUT_SECS = 10
+
+    def __init__(self, ldapUri: str, maxSize: int,
+                 networkTimeoutSecs: float, operationTimeoutSecs: float):
+        self.ldapUri = ldapUri
+        self.maxSize = maxSize
+        self.networkTimeoutSecs = networkTimeoutSecs
+        self.operationTimeoutSecs = operationTimeoutSecs
+
+        self._lock = Lock()
+        self._idle = []
+        self._slots = BoundedSemaphore(maxSize)
+        self._closed = False
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+
+        for pooled in idle:
+            self._unbind(pooled.conn)
+
+    @contextmanager
+    def connection(self):
+        """ Connection
+
+        A context manager that checks out a connection, and returns it to the pool
+        afterwards.
+
+        The connection may still be bound as the last user, bind before using it.
+        If the connection raises one of the server errors it's closed, rather
+        than returned to the pool.
+
+        """
+        if not self._slots.acquire(timeout=self.CHECKOUT_TIMEOUT_SECS):
+            raise LoginFailed("The LDAP server is busy, please try again")
+
+        try:
+            conn = self._checkout()
+            broken = False
+            try:
+                yield conn
+
+            except LDAP_SERVER_ERRORS:
+                broken = True
+                raise
+
+            finally:
+                if broken:
+                    self._unbind(conn)
+                else:
+                    self._checkin(conn)
+
+        finally:
+            self._slots.release()
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                pooled = self._idle.pop() if self._idle else None
+
+            if pooled is None:
+                return self._connect()
+
+            if monotonic() - pooled.lastUsed < self.HEALTH_CHECK_IDLE_SECS:
+                return pooled.conn
+
+            if self._isHealthy(pooled.conn):
+                return pooled.conn
+
+            self._unbind(pooled.conn)
+
+    def _checkin(self, conn) -> None:
+        with self._lock:
+            if self._closed:
+                closed = True
+            else:
+                closed = False
+                self._idle.append(_PooledConnection(conn))
+
+        if closed:
+            self._unbind(conn)
+
+    def _connect(self):
+        return makeLdapConnection(self.ldapUri, self.networkTimeoutSecs,
+                                  self.operationTimeoutSecs)
+
+    def _isHealthy(self, conn) -> bool:
+        try:
+            # Read the root DSE, every LDAP server allows this
+            conn.search_st('', ldap.SCOPE_BASE, '(objectClass=*)',
+                           ['supportedLDAPVersion'], 0, self.operationTimeoutSecs)
+            return True
+
+        except ldap.LDAPError as e:
+            logger.debug("LDAP connection to %s failed its health check, %s",
+                         self.ldapUri, e)
+            return False
+
+    @staticmethod
+    def _unbind(conn) -> None:
+        try:
+            conn.unbind_s()
+        except ldap.LDAPError:
+            pass
+
+
+def makeLdapConnection(ldapUri: str, networkTimeoutSecs: float,
+                       operationTimeoutSecs: float):
+    """ Make LDAP Connection
+
+    :param networkTimeoutSecs: The timeout for connecting to the server.
+    :param operationTimeoutSecs: The timeout for each operation, including binds.
+    """
+    conn = ldap.initialize(ldapUri)
+    conn.protocol_version = 3
+    conn.set_option(ldap.OPT_REFERRALS, 0)
+    conn.set_option(ldap.OPT_NETWORK_TIMEOUT, networkTimeoutSecs)
+    conn.set_option(ldap.OPT_TIMEOUT, operationTimeoutSecs)
+    return conn
+
+
+_poolsLock = Lock()
+_poolsBySettingId = {}
+
+
+def ldapConnectionPool(ldapSetting: LdapSetting, maxSize: int,
+                       networkTimeoutSecs: float,
+                       operationTimeoutSecs: float) -> LdapConnectionPool:
+    """ LDAP Connection Pool
+
+    :return: The connection pool for this LDAP setting, a new pool is created if
+                the setting has changed.
+    """
+    with _poolsLock:
+        pool = _poolsBySettingId.get(ldapSetting.id)
+
+        if pool \
+                and pool.ldapUri == ldapSetting.ldapUri \
+                and pool.maxSize == maxSize \
+                and pool.networkTimeoutSecs == networkTimeoutSecs \
+                and pool.operationTimeoutSecs == operationTimeoutSecs:
+            return pool
+
+        newPool = LdapConnectionPool(ldapSetting.ldapUri, maxSize,
+                                     networkTimeoutSecs, operationTimeoutSecs)
+        _poolsBySettingId[ldapSetting.id] = newPool
+
+    if pool:
+        pool.close()
+
+    return newPool
+
+
+def closeLdapConnectionPools() -> None:
+    """ Close LDAP Connection Pools
+
+    Call this when the LDAP settings are changed, or the plugin stops.
+
+    """
+    with _poolsLock:
+        pools = list(_poolsBySettingId.values())
+        _poolsBySettingId.clear()
+
+    for pool in pools:
+        pool.close()
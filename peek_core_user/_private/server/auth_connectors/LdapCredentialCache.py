@@ -0,0 +1,142 @@
+import hashlib
+import hmac
+import logging
+import os
+from collections import namedtuple
+from threading import Lock
+from time import monotonic
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+#: The result of a successful LDAP authentication
+LdapAuthResult = namedtuple("LdapAuthResult",
+                            ["ldapSettingId", "groups", "userTitle", "userUuid",
+                             "email"])
+
+
+class _CacheEntry:
+    __slots__ = ("salt", "credentialHash", "result", "expiresAt")
+
+    def __init__(self, salt: bytes, credentialHash: bytes,
+                 result: LdapAuthResult, expiresAt: float):
+        self.salt = salt
+        self.credentialHash = credentialHash
+        self.result = result
+        self.expiresAt = expiresAt
+
+
+class _LdapCredentialCache:
+    """ LDAP Credential Cache
+
+    This class remembers successful LDAP authentications for a short time, so
+    a user logging in again doesn't need the LDAP server.
+
+    The password is never kept, only a salted PBKDF2 hash of it, that is checked
+    the same way a password stored in a database would be.
+
+    """
+
+    HASH_NAME = 'sha256'
+    HASH_ITERATIONS = 50000
+    MAX_SIZE = 10000
+
+    def __init__(self):
+        self._lock = Lock()
+        self._entriesByUserName = {}
+        self._hits = 0
+        self._misses = 0
+
+    def _hash(self, password: str, salt: bytes) -> bytes:
+        return hashlib.pbkdf2_hmac(self.HASH_NAME, password.encode(), salt,
+                                   self.HASH_ITERATIONS)
+
+    def get(self, userName: str, password: str) -> Optional[LdapAuthResult]:
+        with self._lock:
+            entry = self._entriesByUserName.get(userName.lower())
+
+            if entry and entry.expiresAt <= monotonic():
+                del self._entriesByUserName[userName.lower()]
+                entry = None
+
+        # Hash outside the lock, it's slow on purpose
+        matched = entry is not None \
+                  and hmac.compare_digest(entry.credentialHash,
+                                          self._hash(password, entry.salt))
+
+        with self._lock:
+            if matched:
+                self._hits += 1
+            else:
+                self._misses += 1
+
+        return entry.result if matched else None
+
+    def set(self, userName: str, password: str, result: LdapAuthResult,
+            ttlSecs: float) -> None:
+        salt = os.urandom(16)
+        entry = _CacheEntry(salt, self._hash(password, salt), result,
+                            monotonic() + ttlSecs)
+
+        with self._lock:
+            if len(self._entriesByUserName) >= self.MAX_SIZE:
+                self._removeExpired()
+
+            if len(self._entriesByUserName) >= self.MAX_SIZE:
+                logger.debug("LDAP credential cache is full, not caching %s",
+                             userName)
+                return
+
+            self._entriesByUserName[userName.lower()] = entry
+
+    def _removeExpired(self) -> None:
+        now = monotonic()
+        for userName in [u for u, e in self._entriesByUserName.items()
+                         if e.expiresAt <= now]:
+            del self._entriesByUserName[userName]
+
+    def invalidate(self, userNames: Optional[List[str]] = None) -> None:
+        with self._lock:
+            if userNames is None:
+                self._entriesByUserName = {}
+                return
+
+            for userName in userNames:
+                self._entriesByUserName.pop(userName.lower(), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(size=len(self._entriesByUserName),
+                        hits=self._hits,
+                        misses=self._misses)
+
+
+_ldapCredentialCache = _LdapCredentialCache()
+
+
+def getCachedLdapAuth(userName: str, password: str) -> Optional[LdapAuthResult]:
+    """ Get Cached LDAP Auth
+
+    :return: The result of the last LDAP authentication with this user name and
+                password, if it hasn't expired, otherwise None.
+    """
+    return _ldapCredentialCache.get(userName, password)
+
+
+def cacheLdapAuth(userName: str, password: str, result: LdapAuthResult,
+                  ttlSecs: float) -> None:
+    _ldapCredentialCache.set(userName, password, result, ttlSecs)
+
+
+def invalidateLdapCredentialCache(userNames: Optional[List[str]] = None) -> None:
+    """ Invalidate LDAP Credential Cache
+
+    Call this when a password changes, or an admin changes users or LDAP settings.
+
+    :param userNames: The users to forget, or None to forget all the users.
+    """
+    _ldapCredentialCache.invalidate(userNames)
+
+
+def ldapCredentialCacheStats() -> dict:
+    return _ldapCredentialCache.stats()
@@ -0,0 +1,114 @@
+import logging
+from collections import namedtuple
+from typing import Dict, Iterable
+
+from sqlalchemy import text
+
+from peek_core_user._private.storage.DeclarativeBase import metadata
+from peek_core_user._private.storage.LdapSetting import LdapSetting
+
+logger = logging.getLogger(__name__)
+
+#: The counts of what writeLdapGroupsBlocking changed
+LdapGroupWriteResult = namedtuple("LdapGroupWriteResult",
+                                  ["groupsAdded", "membershipsAdded",
+                                   "membershipsRemoved"])
+
+_WRITE_GROUPS_SQL = '''
+WITH pairs AS (
+    SELECT *
+    FROM unnest(CAST(:pairUserIds AS integer[]),
+                CAST(:pairGroupNames AS varchar[])) AS p("userId", "groupName")
+),
+newGroups AS (
+    INSERT INTO {schema}."InternalGroup" ("groupName", "groupTitle", "importHash")
+    SELECT DISTINCT "groupName", "groupName", :importHash
+    FROM pairs
+    ON CONFLICT DO NOTHING
+    RETURNING id, "groupName"
+),
+ldapGroups AS (
+    SELECT id, "groupName" FROM newGroups
+    UNION ALL
+    SELECT id, "groupName" FROM {schema}."InternalGroup"
+    WHERE "importHash" = :importHash
+      AND "groupName" IN (SELECT "groupName" FROM pairs)
+),
+wanted AS (
+    SELECT DISTINCT p."userId", g.id AS "groupId"
+    FROM pairs p
+    JOIN ldapGroups g ON g."groupName" = p."groupName"
+),
+removed AS (
+    DELETE FROM {schema}."InternalUserGroup" ug
+    WHERE ug."userId" = ANY(CAST(:userIds AS integer[]))
+      AND ug."groupId" IN (SELECT id
+                           FROM {schema}."InternalGroup"
+                           WHERE "importHash" = :importHash)
+      AND NOT EXISTS (SELECT 1
+                      FROM wanted w
+                      WHERE w."userId" = ug."userId"
+                        AND w."groupId" = ug."groupId")
+    RETURNING 1
+),
+added AS (
+    INSERT INTO {schema}."InternalUserGroup" ("userId", "groupId")
+    SELECT "userId", "groupId" FROM wanted
+    ON CONFLICT DO NOTHING
+    RETURNING 1
+)
+SELECT (SELECT count(*) FROM newGroups) AS "groupsAdded",
+       (SELECT count(*) FROM added) AS "membershipsAdded",
+       (SELECT count(*) FROM removed) AS "membershipsRemoved"
+'''.format(schema=metadata.schema)
+
+
+def ldapImportHash(ldapSetting: LdapSetting) -> str:
+    """ LDAP Import Hash
+
+    The users and groups written from an LDAP server are marked with this, so the
+    LDAP writes never change the users that an import owns.
+
+    """
+    return "ldap-sync:%s" % ldapSetting.id
+
+
+def writeLdapGroupsBlocking(dbSession, groupNamesByUserId: Dict[int, Iterable[str]],
+                            importHash: str) -> LdapGroupWriteResult:
+    """ Write LDAP Groups
+
+    Make the group memberships of these users match their LDAP groups, with one
+    statement. Any missing groups are created, then only the memberships that
+    differ are inserted or deleted, the rest aren't touched.
+
+    Only the groups that this LDAP setting owns, by their importHash, are
+    written. The memberships of groups added by an admin or by an import are
+    never removed, and a group with the same name that the LDAP setting doesn't
+    own isn't linked to.
+
+    The caller commits.
+
+    :param groupNamesByUserId: The LDAP group names of each user, by InternalUser id.
+    :param importHash: The ldapImportHash of the LDAP setting.
+    """
+    if not groupNamesByUserId:
+        return LdapGroupWriteResult(0, 0, 0)
+
+    pairUserIds = []
+    pairGroupNames = []
+    for userId, groupNames in groupNamesByUserId.items():
+        for groupName in set(groupNames):
+            pairUserIds.append(userId)
+            pairGroupNames.append(groupName)
+
+    row = dbSession.execute(
+        text(_WRITE_GROUPS_SQL),
+        dict(pairUserIds=pairUserIds,
+             pairGroupNames=pairGroupNames,
+             userIds=list(groupNamesByUserId),
+             importHash=importHash)
+    ).fetchone()
+
+    return LdapGroupWriteResult(groupsAdded=row.groupsAdded,
+                                membershipsAdded=row.membershipsAdded,
+                                membershipsRemoved=row.membershipsRemoved)
@@ -0,0 +1,295 @@
+import logging
+from typing import List, Optional, Tuple
+
+import ldap
+from twisted.cred.error import LoginFailed
+from twisted.internet.defer import Deferred, DeferredList, inlineCallbacks
+
+from peek_core_user._private.server.auth_connectors.InternalAuth import InternalAuth
+from peek_core_user._private.server.auth_connectors.LdapAuth import LdapAuth
+from peek_core_user._private.server.auth_connectors.LdapCircuitBreaker import \
+    ldapCircuitBreakers, LDAP_SERVER_ERRORS
+from peek_core_user._private.server.auth_connectors.LdapCredentialCache import \
+    LdapAuthResult
+from peek_core_user._private.server.auth_connectors.LdapReactorClient import \
+    ldapReactorConnectionPool, LdapReactorConnection, reactorClientSupported
+from peek_core_user._private.server.auth_connectors.LdapSearchPlan import \
+    ldapSearchPlan, LdapSearchPlan
+from peek_core_user._private.server.controller.LoginWorkQueue import LoginWorkQueue
+from peek_core_user._private.storage.LdapSetting import LdapSetting
+from peek_core_user._private.storage.Setting import globalSettings, \
+    cachedGlobalSettings, \
+    LDAP_CONNECTION_POOL_MAX_SIZE, LDAP_TRY_SERVERS_CONCURRENTLY, \
+    LDAP_NETWORK_TIMEOUT_SECS, LDAP_OPERATION_TIMEOUT_SECS, SettingSnapshot, \
+    LDAP_AUTH_ENABLED, LDAP_USE_REACTOR_CLIENT, INTERNAL_AUTH_ENABLED_FOR_FIELD, \
+    INTERNAL_AUTH_ENABLED_FOR_OFFICE
+from peek_plugin_base.storage.DbConnection import DbSessionCreator
+
+logger = logging.getLogger(__name__)
+
+
+class LdapReactorAuth(LdapAuth):
+    """ LDAP Reactor Auth
+
+    This is the same LDAP login as `LdapAuth`, but the binds and searches run on
+    the reactor with `LdapReactorConnection`, so a login waiting on the LDAP server
+    doesn't hold a thread.
+
+    Only the database work, and the credential cache hashing, use threads, and
+    they're run by the LoginWorkQueue, so they're admitted, prioritised and
+    rejected the same as the other login work.
+    The settings, the internal authentication and the LDAP settings are loaded
+    with one call, before any LDAP server is asked.
+
+    Whether the reactor client is enabled is read from the setting cache on the
+    reactor, so a login doesn't queue any extra work when it's off.
+
+    """
+
+    #: The settings the login uses, as well as LdapAuth.SETTING_KEYS
+    LOGIN_SETTING_KEYS = [LDAP_AUTH_ENABLED,
+                          LDAP_USE_REACTOR_CLIENT,
+                          INTERNAL_AUTH_ENABLED_FOR_FIELD,
+                          INTERNAL_AUTH_ENABLED_FOR_OFFICE]
+
+    #: The settings read on the reactor, to decide if the reactor client is used
+    SWITCH_SETTING_KEYS = [LDAP_AUTH_ENABLED,
+                           LDAP_USE_REACTOR_CLIENT]
+
+    def __init__(self, dbSessionCreator: DbSessionCreator,
+                 workQueue: LoginWorkQueue):
+        self._dbSessionCreator = dbSessionCreator
+        self._workQueue = workQueue
+
+    @inlineCallbacks
+    def checkPass(self, userName, password, forService: int,
+                  priority: int) -> Deferred:
+        """ Check Pass
+
+        The internal authentication is tried first, if it's enabled for the
+        service, the same as `LoginLogoutController._checkPassBlocking`.
+
+        :param userName: The username of the user.
+        :param password: The users secret password.
+        :param forService: The service the user is logging into.
+        :param priority: The LoginWorkQueue priority of the database work.
+
+        :return: A Deferred that fires with a tuple of the user name the login is
+                    for, and the list of the user's groups. Or None if the reactor
+                    client isn't enabled, then check the password in a thread.
+        """
+
+        assert forService in (1, 2, 3), "Unhandled for service type"
+
+        if not reactorClientSupported():
+            return None
+
+        # Until a login in a thread loads the settings into the cache again,
+        # this login is checked in the thread as well.
+        switches = cachedGlobalSettings(self.SWITCH_SETTING_KEYS)
+        if switches is None \
+                or not (switches[LDAP_AUTH_ENABLED]
+                        and switches[LDAP_USE_REACTOR_CLIENT]):
+            return None
+
+        prepared = yield self._workQueue.run(priority, self._prepareBlocking,
+                                             userName, password, forService)
+        if prepared is None:
+            return None
+
+        # The user name comes back without the domain, unless it's an internal user
+        settings, userName, ldapSettings, groups = prepared
+
+        if groups is not None:
+            return userName, groups
+
+        ldapSettings = self._availableLdapSettings(ldapSettings)
+
+        if settings[LDAP_TRY_SERVERS_CONCURRENTLY] and len(ldapSettings) > 1:
+            result, firstException = yield self._tryConcurrentlyAsync(
+                userName, password, ldapSettings, settings
+            )
+        else:
+            result, firstException = yield self._trySequentiallyAsync(
+                userName, password, ldapSettings, settings
+            )
+
+        if result:
+            yield self._workQueue.run(priority, self._finishBlocking,
+                                      userName, password, result,
+                                      ldapSettings, settings)
+            return userName, list(result.groups)
+
+        self._failed(userName, firstException)
+
+    def _prepareBlocking(self, userName, password, forService: int
+                         ) -> Optional[Tuple[SettingSnapshot, str, List[LdapSetting],
+                                             Optional[List[str]]]]:
+        """ Prepare
+
+        :return: None if the reactor client isn't enabled, otherwise a tuple of the
+                    settings, the user name, the LDAP settings to try, and the
+                    groups if the user was authenticated without the LDAP servers.
+        """
+        dbSession = self._dbSessionCreator()
+        try:
+            settings = globalSettings(dbSession,
+                                      self.SETTING_KEYS + self.LOGIN_SETTING_KEYS)
+
+            if not (settings[LDAP_AUTH_ENABLED] and settings[LDAP_USE_REACTOR_CLIENT]):
+                return None
+
+            # TRY INTERNAL IF ITS ENABLED
+            if self._isInternalAuthEnabled(settings, forService):
+                try:
+                    groups = InternalAuth().checkPassBlocking(dbSession, userName,
+                                                              password, forService)
+                    return settings, userName, [], groups
+
+                except Exception:
+                    dbSession.rollback()
+
+            ldapSettings = self._ldapSettingsForBlocking(dbSession, forService)
+
+            # The LDAP settings are used on the reactor after the session closes
+            dbSession.expunge_all()
+
+        finally:
+            dbSession.close()
+
+        userName, ldapSettings = self._routeLdapSettings(userName, ldapSettings)
+
+        cachedGroups = self._cachedGroupsBlocking(userName, password, ldapSettings,
+                                                  settings)
+
+        return settings, userName, ldapSettings, cachedGroups
+
+    @staticmethod
+    def _isInternalAuthEnabled(settings: SettingSnapshot, forService: int) -> bool:
+        if forService == InternalAuth.FOR_FIELD:
+            return settings[INTERNAL_AUTH_ENABLED_FOR_FIELD]
+
+        if forService == InternalAuth.FOR_OFFICE:
+            return settings[INTERNAL_AUTH_ENABLED_FOR_OFFICE]
+
+        return False
+
+    def _finishBlocking(self, userName, password, result: LdapAuthResult,
+                        ldapSettings: List[LdapSetting],
+                        settings: SettingSnapshot) -> None:
+        dbSession = self._dbSessionCreator()
+        try:
+            self._succeededBlocking(dbSession, userName, password, result,
+                                    ldapSettings, settings)
+
+        finally:
+            dbSession.close()
+
+    @inlineCallbacks
+    def _trySequentiallyAsync(self, userName, password,
+                              ldapSettings: List[LdapSetting],
+                              settings: SettingSnapshot) -> Deferred:
+        """ Try Sequentially
+
+        :return: A Deferred that fires with a tuple of the result, or None,
+                    and the first LoginFailed.
+        """
+        firstException = None
+
+        for ldapSetting in ldapSettings:
+            try:
+                result = yield self._tryLdapAsync(userName, password, ldapSetting,
+                                                  settings)
+                return result, None
+
+            except LoginFailed as e:
+                if not firstException:
+                    firstException = e
+
+        return None, firstException
+
+    @inlineCallbacks
+    def _tryConcurrentlyAsync(self, userName, password,
+                              ldapSettings: List[LdapSetting],
+                              settings: SettingSnapshot) -> Deferred:
+        """ Try Concurrently
+
+        Try all the LDAP servers at once, the first success wins, the other
+        attempts are left to finish and their results are ignored.
+
+        :return: A Deferred that fires with a tuple of the result, or None,
+                    and the first failure in the order of the LDAP settings.
+        """
+        deferreds = [self._tryLdapAsync(userName, password, ldapSetting, settings)
+                     for ldapSetting in ldapSettings]
+
+        results = yield DeferredList(deferreds, fireOnOneCallback=True,
+                                     consumeErrors=True)
+
+        # fireOnOneCallback fires with (result, index) on the first success
+        if isinstance(results, tuple):
+            return results[0], None
+
+        for success, failure in results:
+            if not success:
+                return None, failure.value
+
+        return None, None
+
+    @inlineCallbacks
+    def _tryLdapAsync(self, userName, password, ldapSetting: LdapSetting,
+                      settings: SettingSnapshot) -> Deferred:
+        plan = ldapSearchPlan(ldapSetting)
+
+        try:
+            pool = ldapReactorConnectionPool(ldapSetting,
+                                             settings[LDAP_CONNECTION_POOL_MAX_SIZE],
+                                             settings[LDAP_NETWORK_TIMEOUT_SECS],
+                                             settings[LDAP_OPERATION_TIMEOUT_SECS])
+
+            conn = yield pool.checkout()
+            try:
+                userDetails = yield self._bindAndSearchAsync(conn, userName,
+                                                             password, ldapSetting,
+                                                             plan)
+            finally:
+                pool.checkin(conn)
+
+            ldapCircuitBreakers.recordSuccess(ldapSetting)
+
+        except LDAP_SERVER_ERRORS as e:
+            raise self._serverFailed(ldapSetting, e, settings)
+
+        except ldap.NO_SUCH_OBJECT:
+            raise LoginFailed(
+                "An internal error occurred, ask admin to check Attune logs")
+
+        except ldap.INVALID_CREDENTIALS:
+            # The server answered, so it's healthy
+            ldapCircuitBreakers.recordSuccess(ldapSetting)
+            raise LoginFailed("Username or password is incorrect")
+
+        return self._makeResult(ldapSetting, plan, userDetails)
+
+    @inlineCallbacks
+    def _bindAndSearchAsync(self, conn: LdapReactorConnection, userName, password,
+                            ldapSetting: LdapSetting, plan: LdapSearchPlan
+                            ) -> Deferred:
+        # Bind as the user, this checks their password
+        yield conn.bind('%s@%s' % (userName, ldapSetting.ldapDomain), password)
+        ldapFilter = plan.userFilter(userName)
+
+        userDetails = None
+        for ldapBase in plan.searchBasesFor(userName):
+            try:
+                userDetails = yield conn.search(ldapBase, ldap.SCOPE_SUBTREE,
+                                                ldapFilter, plan.ATTRIBUTES)
+
+                if userDetails:
+                    plan.foundIn(userName, ldapBase)
+                    break
+
+            except ldap.NO_SUCH_OBJECT:
+                logger.warning("CN or OU doesn't exist : %s", ldapBase)
+
+        return userDetails
@@ -0,0 +1,362 @@
+import logging
+from time import monotonic
+from typing import Dict, List, Tuple
+
+import ldap
+from twisted.cred.error import LoginFailed
+from twisted.internet import reactor, defer
+from twisted.internet.defer import Deferred, DeferredSemaphore, inlineCallbacks
+from twisted.internet.interfaces import IReadDescriptor
+from twisted.python.failure import Failure
+from twisted.python.threadable import isInIOThread
+from zope.interface import implementer
+
+from peek_core_user._private.server.auth_connectors.LdapConnectionPool import \
+    makeLdapConnection
+from peek_core_user._private.storage.LdapSetting import LdapSetting
+
+logger = logging.getLogger(__name__)
+
+
+def reactorClientSupported() -> bool:
+    """ Reactor Client Supported
+
+    The reactor client needs libldap to connect asynchronously, otherwise the
+    first bind on each connection would block the reactor until it connects.
+
+    :return: True if this python-ldap and libldap can connect asynchronously.
+    """
+    return hasattr(ldap, 'OPT_CONNECT_ASYNC')
+
+
+@implementer(IReadDescriptor)
+class LdapReactorConnection:
+    """ LDAP Reactor Connection
+
+    This class runs python-ldap's asynchronous operations on the reactor.
+
+    Each operation returns a Deferred, the reactor watches the connection's socket
+    and collects the results, so no thread waits on the LDAP server.
+
+    The socket is also polled on a timer while operations are pending, libldap may
+    have buffered a result already, or still be connecting.
+
+    This must only be used from the reactor thread.
+
+    """
+
+    POLL_SECS = 0.05
+
+    def __init__(self, ldapUri: str, networkTimeoutSecs: float,
+                 operationTimeoutSecs: float):
+        if not reactorClientSupported():
+            raise Exception("python-ldap doesn't support OPT_CONNECT_ASYNC,"
+                            " the LDAP reactor client can't be used")
+
+        self.ldapUri = ldapUri
+        self.operationTimeoutSecs = operationTimeoutSecs
+        self.lastUsed = monotonic()
+
+        #: True when this connection should not be reused
+        self.broken = False
+
+        self._conn = makeLdapConnection(ldapUri, networkTimeoutSecs,
+                                        operationTimeoutSecs)
+
+        # Don't block the reactor while the TCP connection is made
+        self._conn.set_option(ldap.OPT_CONNECT_ASYNC, True)
+
+        self._pending: Dict[int, Tuple[Deferred, object]] = {}
+        self._fd = None
+        self._pollCall = None
+        self._closed = False
+
+    def bind(self, who: str, cred: str) -> Deferred:
+        """ Bind
+
+        :return: A Deferred that fires when the bind succeeds.
+        """
+        return self._start(self._conn.simple_bind, who, cred)
+
+    def search(self, base: str, scope: int, filterstr: str,
+               attrlist: List[str]) -> Deferred:
+        """ Search
+
+        :return: A Deferred that fires with the list of (dn, attributes) found.
+        """
+        return self._start(self._conn.search_ext, base, scope,
+                           filterstr=filterstr, attrlist=attrlist,
+                           timeout=self.operationTimeoutSecs)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+
+        self._closed = True
+        self.broken = True
+        self._unwatch()
+
+        if self._pollCall and self._pollCall.active():
+            self._pollCall.cancel()
+
+        self._failPending(ldap.SERVER_DOWN({'desc': "The connection was closed"}))
+
+        try:
+            # An unbind has no response, so this doesn't wait
+            self._conn.unbind()
+        except ldap.LDAPError:
+            pass
+
+    def _start(self, method, *args, **kwargs) -> Deferred:
+        if self._closed:
+            return defer.fail(ldap.SERVER_DOWN({'desc': "The connection is closed"}))
+
+        try:
+            msgid = method(*args, **kwargs)
+        except ldap.LDAPError:
+            self.broken = True
+            return defer.fail()
+
+        d = Deferred()
+        timeoutCall = reactor.callLater(self.operationTimeoutSecs,
+                                        self._timedOut, msgid)
+        self._pending[msgid] = (d, timeoutCall)
+        self.lastUsed = monotonic()
+
+        self._watch()
+        return d
+
+    def _watch(self) -> None:
+        if self._fd is None:
+            try:
+                fd = self._conn.get_option(ldap.OPT_DESC)
+            except ldap.LDAPError:
+                fd = None
+
+            if fd is not None and fd >= 0:
+                self._fd = fd
+                reactor.addReader(self)
+
+        if self._pollCall is None or not self._pollCall.active():
+            self._pollCall = reactor.callLater(self.POLL_SECS, self._poll)
+
+    def _unwatch(self) -> None:
+        if self._fd is not None:
+            reactor.removeReader(self)
+            self._fd = None
+
+    def _poll(self) -> None:
+        self._pollCall = None
+        self._drain()
+
+        if self._pending and not self._closed:
+            self._watch()
+
+    def _drain(self) -> None:
+        for msgid in list(self._pending):
+            try:
+                rtype, rdata, _, _ = self._conn.result3(msgid, all=1, timeout=0)
+
+            except ldap.LDAPError:
+                self._finish(msgid, Failure())
+                continue
+
+            # The result hasn't arrived yet
+            if rtype is None:
+                continue
+
+            self._finish(msgid, rdata)
+
+    def _finish(self, msgid: int, result) -> None:
+        entry = self._pending.pop(msgid, None)
+        if entry is None:
+            return
+
+        d, timeoutCall = entry
+        if timeoutCall.active():
+            timeoutCall.cancel()
+
+        if not self._pending:
+            self._unwatch()
+
+        if isinstance(result, Failure):
+            if result.check(ldap.SERVER_DOWN, ldap.CONNECT_ERROR, ldap.TIMEOUT):
+                self.broken = True
+            d.errback(result)
+        else:
+            d.callback(result)
+
+    def _timedOut(self, msgid: int) -> None:
+        self.broken = True
+
+        try:
+            self._conn.abandon(msgid)
+        except ldap.LDAPError:
+            pass
+
+        self._finish(msgid, Failure(ldap.TIMEOUT(
+            {'desc': "No result after %ss" % self.operationTimeoutSecs}
+        )))
+
+    def _failPending(self, error: Exception) -> None:
+        pending, self._pending = self._pending, {}
+        for d, timeoutCall in pending.values():
+            if timeoutCall.active():
+                timeoutCall.cancel()
+            d.errback(Failure(error))
+
+    # ---------------
+    # IReadDescriptor methods
+
+    def fileno(self) -> int:
+        return -1 if self._fd is None else self._fd
+
+    def doRead(self) -> None:
+        self._drain()
+
+    def connectionLost(self, reason) -> None:
+        self._fd = None
+        self.broken = True
+        self._failPending(ldap.SERVER_DOWN({'desc': str(reason.value)}))
+
+    def logPrefix(self) -> str:
+        return self.__class__.__name__
+
+
+class LdapReactorConnectionPool:
+    """ LDAP Reactor Connection Pool
+
+    This is the reactor version of `LdapConnectionPool`, connections are health
+    checked after being idle, and returned to the pool still bound as the last
+    user, so bind before using one.
+
+    Callers must check every connection they check out back in.
+
+    """
+
+    #: Check connections that have been idle longer than this before using them
+    HEALTH_CHECK_IDLE_SECS = 60
+
+    #: How long to wait for a connection when the pool is at its maximum size
+    CHECKOUT_TIMEOUT_SECS = 10
+
+    def __init__(self, ldapUri: str, maxSize: int,
+                 networkTimeoutSecs: float, operationTimeoutSecs: float):
+        self.ldapUri = ldapUri
+        self.maxSize = maxSize
+        self.networkTimeoutSecs = networkTimeoutSecs
+        self.operationTimeoutSecs = operationTimeoutSecs
+
+        self._idle: List[LdapReactorConnection] = []
+        self._slots = DeferredSemaphore(maxSize)
+        self._closed = False
+
+    def close(self) -> None:
+        self._closed = True
+        idle, self._idle = self._idle, []
+
+        for conn in idle:
+            conn.close()
+
+    @inlineCallbacks
+    def checkout(self) -> Deferred:
+        """ Checkout
+
+        :return: A Deferred that fires with a LdapReactorConnection.
+        """
+        d = self._slots.acquire()
+        d.addTimeout(self.CHECKOUT_TIMEOUT_SECS, reactor)
+        try:
+            yield d
+        except defer.TimeoutError:
+            raise LoginFailed("The LDAP server is busy, please try again")
+
+        try:
+            conn = yield self._checkoutConnection()
+            return conn
+
+        except Exception:
+            self._slots.release()
+            raise
+
+    def checkin(self, conn: LdapReactorConnection) -> None:
+        # Don't reuse a connection that failed
+        if conn.broken or self._closed:
+            conn.close()
+        else:
+            self._idle.append(conn)
+
+        self._slots.release()
+
+    @inlineCallbacks
+    def _checkoutConnection(self) -> Deferred:
+        while self._idle:
+            conn = self._idle.pop()
+
+            if monotonic() - conn.lastUsed < self.HEALTH_CHECK_IDLE_SECS:
+                return conn
+
+            try:
+                # Read the root DSE, every LDAP server allows this
+                yield conn.search('', ldap.SCOPE_BASE, '(objectClass=*)',
+                                  ['supportedLDAPVersion'])
+                return conn
+
+            except ldap.LDAPError as e:
+                logger.debug("LDAP connection to %s failed its health check, %s",
+                             self.ldapUri, e)
+                conn.close()
+
+        return LdapReactorConnection(self.ldapUri, self.networkTimeoutSecs,
+                                     self.operationTimeoutSecs)
+
+
+_poolsBySettingId: Dict[int, LdapReactorConnectionPool] = {}
+
+
+def ldapReactorConnectionPool(ldapSetting: LdapSetting, maxSize: int,
+                              networkTimeoutSecs: float,
+                              operationTimeoutSecs: float
+                              ) -> LdapReactorConnectionPool:
+    """ LDAP Reactor Connection Pool
+
+    :return: The reactor connection pool for this LDAP setting, a new pool is
+                created if the setting has changed.
+    """
+    assert isInIOThread(), "The LDAP reactor pools must be used from the reactor"
+
+    pool = _poolsBySettingId.get(ldapSetting.id)
+
+    if pool \
+            and pool.ldapUri == ldapSetting.ldapUri \
+            and pool.maxSize == maxSize \
+            and pool.networkTimeoutSecs == networkTimeoutSecs \
+            and pool.operationTimeoutSecs == operationTimeoutSecs:
+        return pool
+
+    newPool = LdapReactorConnectionPool(ldapSetting.ldapUri, maxSize,
+                                        networkTimeoutSecs, operationTimeoutSecs)
+    _poolsBySettingId[ldapSetting.id] = newPool
+
+    if pool:
+        pool.close()
+
+    return newPool
+
+
+def closeLdapReactorConnectionPools() -> None:
+    """ Close LDAP Reactor Connection Pools
+
+    Call this when the LDAP settings are changed, or the plugin stops.
+    It can be called from any thread.
+
+    """
+    if not isInIOThread():
+        reactor.callFromThread(closeLdapReactorConnectionPools)
+        return
+
+    pools = list(_poolsBySettingId.values())
+    _poolsBySettingId.clear()
+
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,111 @@
+import logging
+from collections import OrderedDict
+from threading import Lock
+from typing import List, Tuple
+
+from peek_core_user._private.storage.LdapSetting import LdapSetting
+
+logger = logging.getLogger(__name__)
+
+
+class _LdapRoutes:
+    """ LDAP Routes
+
+    This class remembers which LDAP setting last authenticated each user, so their
+    next login tries that LDAP server first.
+
+    """
+
+    MAX_SIZE = 10000
+
+    def __init__(self):
+        self._lock = Lock()
+        self._settingIdByUserName = OrderedDict()
+
+    def get(self, userName: str):
+        with self._lock:
+            return self._settingIdByUserName.get(userName.lower())
+
+    def set(self, userName: str, ldapSettingId: int) -> None:
+        with self._lock:
+            self._settingIdByUserName[userName.lower()] = ldapSettingId
+            self._settingIdByUserName.move_to_end(userName.lower())
+
+            while len(self._settingIdByUserName) > self.MAX_SIZE:
+                self._settingIdByUserName.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._settingIdByUserName.clear()
+
+
+_ldapRoutes = _LdapRoutes()
+
+
+def _splitDomain(userName: str) -> Tuple[str, str]:
+    """ Split Domain
+
+    :return: A tuple of the user name without the domain, and the domain, or None.
+    """
+    if '@' in userName:
+        bareUserName, domain = userName.rsplit('@', 1)
+        return bareUserName, domain.lower()
+
+    if '\\' in userName:
+        domain, bareUserName = userName.split('\\', 1)
+        return bareUserName, domain.lower()
+
+    return userName, None
+
+
+def _matchesDomain(ldapSetting: LdapSetting, domain: str) -> bool:
+    ldapDomain = ldapSetting.ldapDomain.lower()
+
+    # Match the UPN suffix, EG 'synad.synerty.com', or the NetBIOS name, EG 'synad'
+    return domain == ldapDomain or domain == ldapDomain.split('.')[0]
+
+
+def ldapUserName(userName: str) -> str:
+    """ LDAP User Name
+
+    :return: The user name without the domain, this is the name the user has
+                in the internal directory.
+    """
+    return _splitDomain(userName)[0]
+
+
+def routeLdapSettings(userName: str, ldapSettings: List[LdapSetting]
+                      ) -> Tuple[str, List[LdapSetting]]:
+    """ Route LDAP Settings
+
+    A user name with a domain, EG 'user@domain' or 'DOMAIN\\user', is routed only to
+    the LDAP settings for that domain.
+
+    A bare user name tries the LDAP setting that last authenticated the user first.
+
+    :return: A tuple of the user name to use with LDAP, and the LDAP settings to
+                try, in order.
+    """
+    bareUserName, domain = _splitDomain(userName)
+
+    if domain:
+        return bareUserName, [s for s in ldapSettings if _matchesDomain(s, domain)]
+
+    lastSettingId = _ldapRoutes.get(userName)
+    if lastSettingId is None:
+        return userName, ldapSettings
+
+    return userName, sorted(ldapSettings, key=lambda s: s.id != lastSettingId)
+
+
+def rememberLdapRoute(userName: str, ldapSettingId: int) -> None:
+    _ldapRoutes.set(userName, ldapSettingId)
+
+
+def forgetLdapRoutes() -> None:
+    """ Forget LDAP Routes
+
+    Call this when the LDAP settings are changed.
+
+    """
+    _ldapRoutes.clear()
@@ -0,0 +1,171 @@
+import logging
+from collections import OrderedDict
+from threading import Lock
+from typing import List, Optional, Set
+
+from ldap.filter import escape_filter_chars
+from twisted.cred.error import LoginFailed
+
+from peek_core_user._private.storage.LdapSetting import LdapSetting
+
+logger = logging.getLogger(__name__)
+
+
+class LdapSearchPlan:
+    """ LDAP Search Plan
+
+    This class holds the parsed search settings of one LdapSetting, so they aren't
+    parsed for every login.
+
+    It also remembers the search base each user was last found in, so that base is
+    searched first next time.
+
+    """
+
+    #: The only attributes the login uses, don't fetch the rest
+    ATTRIBUTES = ['memberOf', 'displayName', 'userPrincipalName', 'distinguishedName']
+
+    MAX_REMEMBERED_USERS = 10000
+
+    def __init__(self, ldapSetting: LdapSetting):
+        self.signature = self.makeSignature(ldapSetting)
+
+        dcParts = ','.join(['DC=%s' % part
+                            for part in ldapSetting.ldapDomain.split('.')])
+
+        ldapBases = []
+        if ldapSetting.ldapOUFolders:
+            ldapBases += self._makeLdapBases(ldapSetting.ldapOUFolders, "OU")
+        if ldapSetting.ldapCNFolders:
+            ldapBases += self._makeLdapBases(ldapSetting.ldapCNFolders, "CN")
+
+        # Example Base : 'CN=atuser1,CN=Users,DC=synad,DC=synerty,DC=com'
+        self.searchBases: List[str] = ["%s,%s" % (b, dcParts) for b in ldapBases]
+
+        #: The root of the domain, EG 'DC=synad,DC=synerty,DC=com'
+        self.domainBase: str = dcParts
+
+        self.authorisedGroups: Optional[Set[str]] = None
+        if ldapSetting.ldapGroups:
+            self.authorisedGroups = set([s.strip()
+                                         for s in ldapSetting.ldapGroups.split(',')])
+
+        self._lock = Lock()
+        self._lastBaseByUserName = OrderedDict()
+
+    @staticmethod
+    def makeSignature(ldapSetting: LdapSetting) -> tuple:
+        return (ldapSetting.ldapDomain, ldapSetting.ldapOUFolders,
+                ldapSetting.ldapCNFolders, ldapSetting.ldapGroups)
+
+    @staticmethod
+    def userFilter(userName: str) -> str:
+        return ("(&(objectCategory=person)(objectClass=user)(sAMAccountName=%s))"
+                % escape_filter_chars(userName))
+
+    @staticmethod
+    def groupNames(memberOf: List[bytes]) -> List[str]:
+        """ Group Names
+
+        :param memberOf: The memberOf values of a user,
+                    EG b'CN=Domain Admins,CN=Users,DC=synad,DC=synerty,DC=com'
+        :return: The CN of each group, EG 'Domain Admins'
+        """
+        groups = []
+        for dn in memberOf:
+            group = dn.decode().split(',')[0]
+            if '=' in group:
+                group = group.split('=')[1]
+            groups.append(group)
+
+        return groups
+
+    def isAuthorised(self, groups: List[str]) -> bool:
+        return not self.authorisedGroups or bool(self.authorisedGroups & set(groups))
+
+    def searchBasesFor(self, userName: str) -> List[str]:
+        """ Search Bases For
+
+        :return: The search bases, the one the user was last found in is first.
+        """
+        with self._lock:
+            lastBase = self._lastBaseByUserName.get(userName.lower())
+
+        if lastBase is None or lastBase not in self.searchBases:
+            return self.searchBases
+
+        return [lastBase] + [b for b in self.searchBases if b != lastBase]
+
+    def foundIn(self, userName: str, searchBase: str) -> None:
+        with self._lock:
+            self._lastBaseByUserName[userName.lower()] = searchBase
+            self._lastBaseByUserName.move_to_end(userName.lower())
+
+            while len(self._lastBaseByUserName) > self.MAX_REMEMBERED_USERS:
+                self._lastBaseByUserName.popitem(last=False)
+
+    @staticmethod
+    def _makeLdapBases(ldapFolders, propertyName) -> List[str]:
+        ldapBases = []
+        for folder in ldapFolders.split(','):
+            folder = folder.strip()
+            if not folder:
+                continue
+
+            parts = []
+            for part in folder.split('/'):
+                part = part.strip()
+                if not part:
+                    continue
+                parts.append('%s=%s' % (propertyName, part))
+
+            ldapBases.append(','.join(reversed(parts)))
+
+        return ldapBases
+
+
+_plansLock = Lock()
+_plansBySettingId = {}
+
+
+def ldapSearchPlan(ldapSetting: LdapSetting) -> LdapSearchPlan:
+    """ LDAP Search Plan
+
+    :return: The search plan for this LDAP setting, it's rebuilt if the setting
+                has changed.
+    """
+    signature = LdapSearchPlan.makeSignature(ldapSetting)
+
+    with _plansLock:
+        plan = _plansBySettingId.get(ldapSetting.id)
+        if plan and plan.signature == signature:
+            return plan
+
+    try:
+        plan = LdapSearchPlan(ldapSetting)
+
+    except Exception as e:
+        logger.error("Failed to parse the search settings of LDAP setting %s",
+                     ldapSetting.ldapTitle)
+        logger.exception(e)
+
+        raise LoginFailed(
+            "An internal error occurred, ask admin to check Attune logs")
+
+    if not plan.searchBases:
+        raise LoginFailed("LDAP OU and/or CN search paths must be set.")
+
+    with _plansLock:
+        _plansBySettingId[ldapSetting.id] = plan
+
+    return plan
+
+
+def forgetLdapSearchPlans() -> None:
+    """ Forget LDAP Search Plans
+
+    Call this when the LDAP settings are changed.
+
+    """
+    with _plansLock:
+        _plansBySettingId.clear()
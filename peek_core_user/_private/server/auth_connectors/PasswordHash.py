@@ -0,0 +1,83 @@
+"""
+These functions are run in the PasswordHashEngine's worker processes, so this module
+only imports the standard library.
+
+"""
+import base64
+import hashlib
+import hmac
+import os
+
+#: The prefix of the current hash format,
+# EG '$pbkdf2-sha256$310000$<salt>$<hash>'
+PBKDF2_SHA256_PREFIX = '$pbkdf2-sha256$'
+
+_SALT_BYTES = 16
+
+#: The salt of the original, unversioned, SHA-1 hashes
+_LEGACY_SHA1_SALT = b'peek is a secure thingie'
+
+
+def hashPassword(rawPass: str, iterations: int) -> str:
+    """ Hash Password
+
+    :return: The PBKDF2-SHA256 hash, prefixed with the format and the cost.
+    """
+    salt = os.urandom(_SALT_BYTES)
+    digest = _pbkdf2Sha256(rawPass, salt, iterations)
+
+    return '%s%s$%s$%s' % (PBKDF2_SHA256_PREFIX, iterations,
+                           _b64encode(salt), _b64encode(digest))
+
+
+def verifyPassword(rawPass: str, storedHash: str) -> bool:
+    """ Verify Password
+
+    :param storedHash: A hash from hashPassword, or an original SHA-1 hash.
+    """
+    if storedHash.startswith(PBKDF2_SHA256_PREFIX):
+        try:
+            iterations, salt, digest = \
+                storedHash[len(PBKDF2_SHA256_PREFIX):].split('$')
+            iterations, salt, digest = \
+                int(iterations), _b64decode(salt), _b64decode(digest)
+
+        except ValueError:
+            return False
+
+        return hmac.compare_digest(digest,
+                                   _pbkdf2Sha256(rawPass, salt, iterations))
+
+    return hmac.compare_digest(storedHash.encode(),
+                               _legacySha1(rawPass).encode())
+
+
+def needsRehash(storedHash: str, iterations: int) -> bool:
+    """ Needs Rehash
+
+    :return: True if the hash isn't in the current format, or has a different cost.
+    """
+    if not storedHash.startswith(PBKDF2_SHA256_PREFIX):
+        return True
+
+    storedIterations = storedHash[len(PBKDF2_SHA256_PREFIX):].split('$')[0]
+    return storedIterations != str(iterations)
+
+
+def _pbkdf2Sha256(rawPass: str, salt: bytes, iterations: int) -> bytes:
+    return hashlib.pbkdf2_hmac('sha256', rawPass.encode(), salt, iterations)
+
+
+def _legacySha1(rawPass: str) -> str:
+    m = hashlib.sha1()
+    m.update(_LEGACY_SHA1_SALT)
+    m.update(rawPass.encode())
+    return m.hexdigest()
+
+
+def _b64encode(value: bytes) -> str:
+    return base64.b64encode(value).decode().rstrip('=')
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.b64decode(value + '=' * (-len(value) % 4))
@@ -0,0 +1,78 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+
+from peek_core_user._private.server.auth_connectors.PasswordHash import \
+    hashPassword, verifyPassword
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHashEngine:
+    """ Password Hash Engine
+
+    This class runs the password hashing and verifying in a pool of processes.
+
+    The hashing is slow on purpose, run in the server process it would hold the GIL
+    and slow down every other thread. The calling thread just waits for the result.
+
+    When the engine isn't started, EG in the celery worker, the hashing runs in the
+    calling thread.
+
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._pool = None
+
+    def start(self, processCount: int) -> None:
+        """ Start
+
+        :param processCount: The number of hashing processes, 0 for one per CPU.
+        """
+        with self._lock:
+            if self._pool:
+                return
+
+            # Don't fork the reactor and its threads
+            self._pool = ProcessPoolExecutor(
+                max_workers=processCount or os.cpu_count(),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+
+        if pool:
+            pool.shutdown(wait=False)
+
+    def hashBlocking(self, rawPass: str, iterations: int) -> str:
+        return self._run(hashPassword, rawPass, iterations)
+
+    def verifyBlocking(self, rawPass: str, storedHash: str) -> bool:
+        return self._run(verifyPassword, rawPass, storedHash)
+
+    def _run(self, func, *args):
+        pool = self._pool
+        if not pool:
+            return func(*args)
+
+        try:
+            return pool.submit(func, *args).result()
+
+        except BrokenProcessPool as e:
+            logger.error("The password hashing processes have died,"
+                         " hashing in this process, %s", e)
+
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+
+            return func(*args)
+
+
+passwordHashEngine = PasswordHashEngine()
@@ -3,26 +3,35 @@ from typing import List
 
 from peek_core_user._private.server.auth_connectors.InternalAuth import InternalAuth
 from peek_core_user._private.server.auth_connectors.LdapAuth import LdapAuth
+from peek_core_user._private.server.controller.LoginWorkQueue import LoginWorkQueue
 from peek_core_user._private.storage.Setting import \
-    globalSetting, LDAP_AUTH_ENABLED, \
+    globalSettings, LDAP_AUTH_ENABLED, \
     INTERNAL_AUTH_ENABLED_FOR_ADMIN
 from peek_plugin_base.storage.DbConnection import DbSessionCreator
 from twisted.cred.error import LoginFailed
-from vortex.DeferUtil import deferToThreadWrapWithLogger
+from twisted.internet.defer import Deferred
 
 logger = logging.getLogger(__name__)
 
 
 class AdminAuthController:
 
-    def __init__(self, dbSessionCreator: DbSessionCreator):
+    def __init__(self, dbSessionCreator: DbSessionCreator,
+                 workQueue: LoginWorkQueue):
         self._dbSessionCreator: DbSessionCreator = dbSessionCreator
+        self._workQueue = workQueue
 
     def shutdown(self):
         pass
 
-    @deferToThreadWrapWithLogger(logger)
-    def check(self, userName, password) -> List[str]:
+    def check(self, userName, password) -> Deferred:
+        """
+        Returns Deferred[List[str]]
+        """
+        return self._workQueue.run(LoginWorkQueue.PRIORITY_ADMIN,
+                                   self._checkBlocking, userName, password)
+
+    def _checkBlocking(self, userName, password) -> List[str]:
         if not password:
             raise LoginFailed("Password is empty")
 
@@ -30,9 +39,12 @@ class AdminAuthController:
         try:
             lastException = None
 
+            settings = globalSettings(ormSession, [INTERNAL_AUTH_ENABLED_FOR_ADMIN,
+                                                   LDAP_AUTH_ENABLED])
+
             # TRY INTERNAL IF ITS ENABLED
             try:
-                if globalSetting(ormSession, INTERNAL_AUTH_ENABLED_FOR_ADMIN):
+                if settings[INTERNAL_AUTH_ENABLED_FOR_ADMIN]:
                     return InternalAuth().checkPassBlocking(ormSession, userName,
                                                             password,
                                                             InternalAuth.FOR_ADMIN)
@@ -42,7 +54,7 @@ class AdminAuthController:
 
             # TRY LDAP IF ITS ENABLED
             try:
-                if globalSetting(ormSession, LDAP_AUTH_ENABLED):
+                if settings[LDAP_AUTH_ENABLED]:
                     # TODO Make the client tell us if it's for office or field
                     return LdapAuth().checkPassBlocking(ormSession, userName,
                                                         password, LdapAuth.FOR_ADMIN)
@@ -0,0 +1,58 @@
+import logging
+
+from twisted.internet import reactor
+from vortex.TupleSelector import TupleSelector
+from vortex.handler.TupleDataObservableHandler import TupleDataObservableHandler
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescingTupleNotifier:
+    """ Coalescing Tuple Notifier
+
+    This class coalesces the update notifications for a tuple selector.
+
+    The first call to `notify` schedules one notification for the end of the
+    window, further calls within that window are absorbed by it.
+    So a burst of events results in one rebuild of the tuples per window.
+
+    All methods must be called from the reactor thread.
+
+    """
+
+    def __init__(self, tupleObservable: TupleDataObservableHandler,
+                 tupleSelector: TupleSelector, windowSecs: float):
+        self._tupleObservable = tupleObservable
+        self._tupleSelector = tupleSelector
+        self._windowSecs = windowSecs
+
+        self._pendingCall = None
+        self._absorbedCount = 0
+
+    def shutdown(self):
+        if self._pendingCall and self._pendingCall.active():
+            self._pendingCall.cancel()
+
+        self._pendingCall = None
+        self._tupleObservable = None
+
+    def notify(self) -> None:
+        if not self._tupleObservable:
+            return
+
+        if self._pendingCall:
+            self._absorbedCount += 1
+            return
+
+        self._pendingCall = reactor.callLater(self._windowSecs, self._flush)
+
+    def _flush(self) -> None:
+        self._pendingCall = None
+
+        if self._absorbedCount:
+            logger.debug("Coalesced %s notifications for %s",
+                         self._absorbedCount + 1, self._tupleSelector.name)
+            self._absorbedCount = 0
+
+        if self._tupleObservable:
+            self._tupleObservable.notifyOfTupleUpdate(self._tupleSelector)
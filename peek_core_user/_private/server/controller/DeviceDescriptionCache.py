@@ -0,0 +1,115 @@
+import logging
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import List, Optional
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, inlineCallbacks
+from twisted.internet.threads import blockingCallFromThread
+
+from peek_core_device.server.DeviceApiABC import DeviceApiABC
+
+logger = logging.getLogger(__name__)
+
+
+class DeviceDescriptionCache:
+    """ Device Description Cache
+
+    This class caches the device descriptions from the peek_core_device API.
+
+    Entries expire after a TTL, the oldest entries are dropped when the cache is full.
+    Devices that have no description (not enrolled, or removed) are not cached.
+
+    The blocking methods must only be called from a thread,
+    the others must only be called from the reactor.
+
+    """
+
+    DEFAULT_TTL_SECS = 60.0
+    DEFAULT_MAX_SIZE = 10000
+
+    def __init__(self, deviceApi: DeviceApiABC,
+                 ttlSecs: float = DEFAULT_TTL_SECS,
+                 maxSize: int = DEFAULT_MAX_SIZE):
+        self._deviceApi = deviceApi
+        self._ttlSecs = ttlSecs
+        self._maxSize = maxSize
+
+        self._lock = Lock()
+        #: OrderedDict[deviceToken, (expiresAt, description)]
+        self._entries = OrderedDict()
+
+    def shutdown(self):
+        self.invalidate()
+
+    def invalidate(self, deviceToken: Optional[str] = None) -> None:
+        with self._lock:
+            if deviceToken is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(deviceToken, None)
+
+    def _get(self, deviceToken: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(deviceToken)
+            if entry is None:
+                return None
+
+            expiresAt, description = entry
+            if expiresAt < monotonic():
+                del self._entries[deviceToken]
+                return None
+
+            return description
+
+    def _set(self, deviceToken: str, description: Optional[str]) -> None:
+        if not description:
+            return
+
+        with self._lock:
+            self._entries.pop(deviceToken, None)
+            self._entries[deviceToken] = (monotonic() + self._ttlSecs, description)
+
+            while len(self._entries) > self._maxSize:
+                self._entries.popitem(last=False)
+
+    def descriptionBlocking(self, deviceToken: str) -> Optional[str]:
+        description = self._get(deviceToken)
+        if description is None:
+            description = self._deviceApi.deviceDescriptionBlocking(deviceToken)
+            self._set(deviceToken, description)
+
+        return description
+
+    @inlineCallbacks
+    def description(self, deviceToken: str) -> Deferred:
+        """
+        Returns Deferred[Optional[str]]
+        """
+        description = self._get(deviceToken)
+        if description is None:
+            description = yield self._deviceApi.deviceDescription(deviceToken)
+            self._set(deviceToken, description)
+
+        return description
+
+    def prefetchBlocking(self, deviceTokens: List[str]) -> None:
+        """ Prefetch Blocking
+
+        Load the descriptions for the device tokens that are not cached,
+        with one call to the device API.
+
+        """
+        missingTokens = [t for t in set(deviceTokens)
+                         if t and self._get(t) is None]
+
+        if not missingTokens:
+            return
+
+        deviceDetails = blockingCallFromThread(reactor,
+                                               self._deviceApi.deviceDetails,
+                                               missingTokens)
+
+        for deviceDetail in deviceDetails:
+            self._set(deviceDetail.deviceToken, deviceDetail.description)
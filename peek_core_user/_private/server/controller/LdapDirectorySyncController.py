@@ -0,0 +1,117 @@
+import logging
+from time import monotonic
+
+from twisted.internet.defer import Deferred, inlineCallbacks
+from twisted.internet.task import LoopingCall
+from vortex.DeferUtil import deferToThreadWrapWithLogger
+from vortex.TupleSelector import TupleSelector
+from vortex.handler.TupleDataObservableHandler import TupleDataObservableHandler
+
+from peek_core_user._private.storage.InternalGroupTuple import InternalGroupTuple
+from peek_core_user._private.storage.InternalUserTuple import InternalUserTuple
+from peek_core_user._private.storage.LdapSetting import LdapSetting
+from peek_core_user._private.storage.Setting import globalSetting, \
+    LDAP_SYNC_PERIOD_MINS
+from peek_core_user._private.tuples.LdapSyncResultTuple import LdapSyncResultTuple
+from peek_core_user._private.worker.tasks.LdapDirectorySyncTask import \
+    syncLdapDirectory
+from peek_core_user.tuples.GroupDetailTuple import GroupDetailTuple
+from peek_core_user.tuples.UserDetailTuple import UserDetailTuple
+from peek_core_user.tuples.UserListItemTuple import UserListItemTuple
+
+logger = logging.getLogger(__name__)
+
+
+class LdapDirectorySyncController:
+    """ LDAP Directory Sync Controller
+
+    This class runs the LDAP directory sync worker task every
+    "LDAP Sync Period Minutes", when an LDAP setting has sync enabled.
+
+    """
+
+    CHECK_PERIOD_SECS = 60.0
+
+    def __init__(self, dbSessionCreator):
+        self._dbSessionCreator = dbSessionCreator
+        self._tupleDataObserver: TupleDataObservableHandler = None
+        self._lastSyncAt = None
+        self._syncing = False
+        self._loopingCall = LoopingCall(self._check)
+
+    def setup(self, tupleDataObserver: TupleDataObservableHandler):
+        self._tupleDataObserver = tupleDataObserver
+
+        d = self._loopingCall.start(self.CHECK_PERIOD_SECS, now=False)
+        d.addErrback(lambda f: logger.exception(f.value))
+
+    def shutdown(self):
+        if self._loopingCall.running:
+            self._loopingCall.stop()
+
+        self._tupleDataObserver = None
+
+    @inlineCallbacks
+    def _check(self) -> Deferred:
+        try:
+            periodMins, syncEnabled = yield self._loadSyncConfig()
+
+            if not syncEnabled or self._syncing:
+                return
+
+            if self._lastSyncAt is not None \
+                    and monotonic() - self._lastSyncAt < periodMins * 60:
+                return
+
+            yield self.sync()
+
+        except Exception as e:
+            # Don't stop the LoopingCall
+            logger.exception(e)
+
+    @inlineCallbacks
+    def sync(self) -> Deferred:
+        """ Sync
+
+        :return: A Deferred that fires with the LdapSyncResultTuple.
+        """
+        self._syncing = True
+        self._lastSyncAt = monotonic()
+        try:
+            result: LdapSyncResultTuple = yield syncLdapDirectory.delay()
+
+        finally:
+            self._syncing = False
+
+        for error in result.errors:
+            logger.error("LDAP sync : %s", error)
+
+        if result.hasChanges and self._tupleDataObserver:
+            self._notifyOfDirectoryUpdate()
+
+        return result
+
+    def _notifyOfDirectoryUpdate(self):
+        for tupleName in (InternalUserTuple.tupleName(),
+                          UserDetailTuple.tupleName(),
+                          UserListItemTuple.tupleName(),
+                          InternalGroupTuple.tupleName(),
+                          GroupDetailTuple.tupleName()):
+            self._tupleDataObserver.notifyOfTupleUpdate(TupleSelector(tupleName, {}))
+
+    @deferToThreadWrapWithLogger(logger)
+    def _loadSyncConfig(self):
+        ormSession = self._dbSessionCreator()
+        try:
+            periodMins = globalSetting(ormSession, LDAP_SYNC_PERIOD_MINS)
+
+            syncEnabled = bool(
+                ormSession.query(LdapSetting.id)
+                    .filter(LdapSetting.syncEnabled == True)
+                    .count()
+            )
+
+            return periodMins, syncEnabled
+
+        finally:
+            ormSession.close()
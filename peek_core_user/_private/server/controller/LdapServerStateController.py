@@ -0,0 +1,97 @@
+import logging
+
+import ldap
+from twisted.internet.defer import inlineCallbacks, Deferred
+from twisted.internet.task import LoopingCall
+from vortex.DeferUtil import deferToThreadWrapWithLogger
+from vortex.handler.TupleDataObservableHandler import TupleDataObservableHandler
+
+from peek_core_user._private.server.auth_connectors.LdapCircuitBreaker import \
+    ldapCircuitBreakers
+from peek_core_user._private.server.auth_connectors.LdapConnectionPool import \
+    makeLdapConnection
+from peek_core_user._private.storage.Setting import globalSettings, \
+    LDAP_NETWORK_TIMEOUT_SECS, LDAP_OPERATION_TIMEOUT_SECS
+from peek_core_user._private.tuples.LdapServerStateTuple import LdapServerStateTuple
+
+logger = logging.getLogger(__name__)
+
+
+class LdapServerStateController:
+    """ LDAP Server State Controller
+
+    This class probes the LDAP servers that logins are skipping, once their
+    cooldown has passed, so they are used again when they come back.
+
+    It also tells the admin app when the state of the LDAP servers changes.
+
+    """
+
+    PROBE_PERIOD_SECS = 10.0
+
+    def __init__(self, dbSessionCreator):
+        self._dbSessionCreator = dbSessionCreator
+        self._adminTupleObservable: TupleDataObservableHandler = None
+        self._probeLoopingCall = LoopingCall(self._probeAndPublish)
+
+    def setup(self, adminTupleObservable: TupleDataObservableHandler):
+        self._adminTupleObservable = adminTupleObservable
+
+        d = self._probeLoopingCall.start(self.PROBE_PERIOD_SECS, now=False)
+        d.addErrback(lambda f: logger.exception(f.value))
+
+    def shutdown(self):
+        if self._probeLoopingCall.running:
+            self._probeLoopingCall.stop()
+
+        self._adminTupleObservable = None
+
+    @inlineCallbacks
+    def _probeAndPublish(self) -> Deferred:
+        try:
+            dueServers = ldapCircuitBreakers.dueForProbe()
+            if dueServers:
+                yield self._probeBlocking(dueServers)
+
+        except Exception as e:
+            # Don't stop the LoopingCall
+            logger.exception(e)
+
+        if ldapCircuitBreakers.takeChanged() and self._adminTupleObservable:
+            self._adminTupleObservable.notifyOfTupleUpdateForTuple(
+                LdapServerStateTuple.tupleType()
+            )
+
+    @deferToThreadWrapWithLogger(logger)
+    def _probeBlocking(self, dueServers) -> None:
+        ormSession = self._dbSessionCreator()
+        try:
+            settings = globalSettings(ormSession, [LDAP_NETWORK_TIMEOUT_SECS,
+                                                   LDAP_OPERATION_TIMEOUT_SECS])
+        finally:
+            ormSession.close()
+
+        for ldapSettingId, ldapUri in dueServers:
+            error = None
+            conn = None
+            try:
+                conn = makeLdapConnection(ldapUri,
+                                          settings[LDAP_NETWORK_TIMEOUT_SECS],
+                                          settings[LDAP_OPERATION_TIMEOUT_SECS])
+
+                # Read the root DSE, every LDAP server allows this
+                conn.search_st('', ldap.SCOPE_BASE, '(objectClass=*)',
+                               ['supportedLDAPVersion'], 0,
+                               settings[LDAP_OPERATION_TIMEOUT_SECS])
+
+            except ldap.LDAPError as e:
+                error = e
+
+            finally:
+                if conn:
+                    try:
+                        conn.unbind_s()
+                    except ldap.LDAPError:
+                        pass
+
+            ldapCircuitBreakers.probed(ldapSettingId, ldapUri, error)
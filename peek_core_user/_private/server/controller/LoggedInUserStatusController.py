@@ -0,0 +1,273 @@
+import logging
+from collections import deque
+from typing import Dict, List, Optional, Set
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, inlineCallbacks, DeferredLock
+from twisted.python.threadable import isInIOThread
+from vortex.DeferUtil import deferToThreadWrapWithLogger
+from vortex.TupleSelector import TupleSelector
+from vortex.handler.TupleDataObservableHandler import TupleDataObservableHandler
+
+from peek_core_device.server.DeviceApiABC import DeviceApiABC
+from peek_core_user._private.server.controller.CoalescingTupleNotifier import \
+    CoalescingTupleNotifier
+from peek_core_user._private.storage.InternalUserTuple import InternalUserTuple
+from peek_core_user._private.storage.UserLoggedIn import UserLoggedIn
+from peek_core_user._private.tuples.LoggedInUserStatusDeltaTuple import \
+    LoggedInUserStatusDeltaTuple
+from peek_core_user._private.tuples.LoggedInUserStatusTuple import \
+    LoggedInUserStatusTuple
+
+logger = logging.getLogger(__name__)
+
+
+class LoggedInUserStatusController:
+    """ Logged In User Status Controller
+
+    This class keeps the admin apps view of the logged in users in memory, keyed by
+    device token.
+
+    Logins, logouts and device online changes mark a device token as changed, the
+    changes are coalesced, then only the changed rows are reloaded and sent to the
+    admin app as a LoggedInUserStatusDeltaTuple.
+
+    `deviceChanged` can be called from any thread, the rest from the reactor thread.
+
+    """
+
+    #: If more devices than this have changed, reload the whole view
+    MAX_CHANGED_DEVICES = 500
+
+    #: Keep this many of the last deltas, for admin apps that have missed some
+    RECENT_DELTA_COUNT = 50
+
+    def __init__(self, dbSessionCreator, deviceApi: DeviceApiABC,
+                 windowSecs: float):
+        self._dbSessionCreator = dbSessionCreator
+        self._deviceApi = deviceApi
+        self._windowSecs = windowSecs
+
+        self._notifier: Optional[CoalescingTupleNotifier] = None
+
+        self._rowsByDeviceToken: Dict[str, LoggedInUserStatusTuple] = {}
+        self._loaded = False
+        self._seq = 0
+        self._latestDelta = self._makeDelta([], [])
+        self._recentDeltas = deque(maxlen=self.RECENT_DELTA_COUNT)
+
+        self._changedDeviceTokens: Set[str] = set()
+        self._allChanged = True
+
+        self._refreshLock = DeferredLock()
+
+    def setup(self, adminTupleObservable: TupleDataObservableHandler):
+        self._notifier = CoalescingTupleNotifier(
+            adminTupleObservable,
+            TupleSelector(LoggedInUserStatusDeltaTuple.tupleType(), {}),
+            self._windowSecs
+        )
+
+    def shutdown(self):
+        if self._notifier:
+            self._notifier.shutdown()
+            self._notifier = None
+
+        self._rowsByDeviceToken = {}
+
+    def deviceChanged(self, deviceToken: Optional[str] = None) -> None:
+        """ Device Changed
+
+        Mark the row for a device as changed, the admin app will be sent the
+        change at the end of the update window.
+
+        :param deviceToken: The device that changed, or None to reload all rows.
+        """
+        if not isInIOThread():
+            reactor.callFromThread(self.deviceChanged, deviceToken)
+            return
+
+        if deviceToken is None \
+                or len(self._changedDeviceTokens) >= self.MAX_CHANGED_DEVICES:
+            self._allChanged = True
+            self._changedDeviceTokens = set()
+        elif not self._allChanged:
+            self._changedDeviceTokens.add(deviceToken)
+
+        if self._notifier:
+            self._notifier.notify()
+
+    @inlineCallbacks
+    def snapshotTuple(self) -> Deferred:
+        """ Snapshot Tuple
+
+        :return: A Deferred firing with a LoggedInUserStatusDeltaTuple holding
+                    every row.
+        """
+        yield self._refresh()
+        return LoggedInUserStatusDeltaTuple(
+            seq=self._seq,
+            isSnapshot=True,
+            upserts=list(self._rowsByDeviceToken.values()),
+            removedDeviceTokens=[]
+        )
+
+    @inlineCallbacks
+    def latestDeltaTuple(self) -> Deferred:
+        """ Latest Delta Tuple
+
+        :return: A Deferred firing with the LoggedInUserStatusDeltaTuple of the last
+                    changes.
+        """
+        yield self._refresh()
+        return self._latestDelta
+
+    @inlineCallbacks
+    def deltaTuplesSince(self, seq: int) -> Deferred:
+        """ Delta Tuples Since
+
+        :param seq: The seq of the last snapshot or delta the admin app applied.
+        :return: A Deferred firing with a list of the LoggedInUserStatusDeltaTuples
+                    after seq, oldest first. This is a list of one snapshot if those
+                    deltas are no longer kept.
+        """
+        yield self._refresh()
+
+        if seq == self._seq:
+            return []
+
+        deltas = [d for d in self._recentDeltas if d.seq > seq]
+
+        if seq > self._seq or not deltas or deltas[0].seq != seq + 1:
+            snapshot = yield self.snapshotTuple()
+            return [snapshot]
+
+        return deltas
+
+    @inlineCallbacks
+    def rows(self) -> Deferred:
+        """ Rows
+
+        :return: A Deferred firing with a list of every LoggedInUserStatusTuple.
+        """
+        yield self._refresh()
+        return list(self._rowsByDeviceToken.values())
+
+    def _makeDelta(self, upserts: List[LoggedInUserStatusTuple],
+                   removedDeviceTokens: List[str]) -> LoggedInUserStatusDeltaTuple:
+        return LoggedInUserStatusDeltaTuple(
+            seq=self._seq,
+            isSnapshot=False,
+            upserts=upserts,
+            removedDeviceTokens=removedDeviceTokens
+        )
+
+    def _refresh(self) -> Deferred:
+        return self._refreshLock.run(self._refreshLocked)
+
+    @inlineCallbacks
+    def _refreshLocked(self):
+        if not self._allChanged and not self._changedDeviceTokens:
+            return
+
+        reloadAll = self._allChanged
+        deviceTokens = None if reloadAll else list(self._changedDeviceTokens)
+
+        self._allChanged = False
+        self._changedDeviceTokens = set()
+
+        try:
+            newRows = yield self._loadRows(deviceTokens)
+
+        except Exception:
+            # Try again on the next refresh
+            if reloadAll:
+                self._allChanged = True
+            else:
+                self._changedDeviceTokens.update(deviceTokens)
+            raise
+
+        if reloadAll:
+            deviceTokens = set(self._rowsByDeviceToken) | set(newRows)
+
+        upserts = []
+        removedDeviceTokens = []
+
+        for deviceToken in deviceTokens:
+            oldRow = self._rowsByDeviceToken.get(deviceToken)
+            newRow = newRows.get(deviceToken)
+
+            if newRow is None:
+                if oldRow is not None:
+                    del self._rowsByDeviceToken[deviceToken]
+                    removedDeviceTokens.append(deviceToken)
+                continue
+
+            if oldRow is None or not self._rowsEqual(oldRow, newRow):
+                self._rowsByDeviceToken[deviceToken] = newRow
+                upserts.append(newRow)
+
+        # The first load is sent as a snapshot, there is no delta to apply it to
+        if not self._loaded:
+            self._loaded = True
+            return
+
+        if upserts or removedDeviceTokens:
+            self._seq += 1
+            self._latestDelta = self._makeDelta(upserts, removedDeviceTokens)
+            self._recentDeltas.append(self._latestDelta)
+
+    @staticmethod
+    def _rowsEqual(row1: LoggedInUserStatusTuple,
+                   row2: LoggedInUserStatusTuple) -> bool:
+        for fieldName in LoggedInUserStatusTuple.tupleFieldNames():
+            if getattr(row1, fieldName) != getattr(row2, fieldName):
+                return False
+        return True
+
+    @inlineCallbacks
+    def _loadRows(self, deviceTokens: Optional[List[str]]) -> Deferred:
+        rowsByDeviceToken = yield self._loadLoggedInTuples(deviceTokens)
+
+        if not rowsByDeviceToken:
+            return rowsByDeviceToken
+
+        deviceDetails = yield self._deviceApi.deviceDetails(list(rowsByDeviceToken))
+
+        for deviceDetail in deviceDetails:
+            tuple_ = rowsByDeviceToken[deviceDetail.deviceToken]
+            tuple_.deviceIsOnline = deviceDetail.isOnline
+            tuple_.deviceLastOnline = deviceDetail.lastOnline
+            tuple_.deviceType = deviceDetail.deviceType
+            tuple_.deviceDescription = deviceDetail.description
+
+        return rowsByDeviceToken
+
+    @deferToThreadWrapWithLogger(logger)
+    def _loadLoggedInTuples(self, deviceTokens: Optional[List[str]]) -> Deferred:
+        dbSession = self._dbSessionCreator()
+        try:
+            qry = dbSession.query(UserLoggedIn.userName,
+                                  UserLoggedIn.loggedInDateTime,
+                                  UserLoggedIn.deviceToken,
+                                  UserLoggedIn.vehicle,
+                                  InternalUserTuple.userTitle) \
+                .join(InternalUserTuple,
+                      UserLoggedIn.userName == InternalUserTuple.userName)
+
+            if deviceTokens is not None:
+                qry = qry.filter(UserLoggedIn.deviceToken.in_(deviceTokens))
+
+            return {
+                u.deviceToken: LoggedInUserStatusTuple(
+                    userName=u.userName,
+                    userTitle=u.userTitle,
+                    loginDate=u.loggedInDateTime,
+                    vehicle=u.vehicle,
+                    deviceToken=u.deviceToken
+                )
+                for u in qry
+            }
+
+        finally:
+            dbSession.close()
@@ -0,0 +1,168 @@
+import logging
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock
+from time import monotonic
+from typing import List
+
+from twisted.internet.task import LoopingCall
+from vortex.handler.TupleDataObservableHandler import TupleDataObservableHandler
+
+from peek_core_user._private.tuples.LoginStageLatencyTuple import \
+    LoginStageLatencyTuple
+
+logger = logging.getLogger(__name__)
+
+
+class _RollingHistogram:
+    """ Rolling Histogram
+
+    Keeps the durations recorded within the last `windowSecs`, up to `maxSamples`.
+
+    """
+
+    def __init__(self, windowSecs: float, maxSamples: int):
+        self._windowSecs = windowSecs
+        #: deque[(recordedAt, durationSecs)]
+        self._samples = deque(maxlen=maxSamples)
+
+    def add(self, now: float, durationSecs: float) -> None:
+        self._samples.append((now, durationSecs))
+
+    def durations(self, now: float) -> List[float]:
+        cutoff = now - self._windowSecs
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+
+        return [d for _, d in self._samples]
+
+
+class LoginLatencyController:
+    """ Login Latency Controller
+
+    This controller times each stage of the login and logout process, and
+    publishes the rolling histograms to the admin app as LoginStageLatencyTuples.
+
+    `record` and `time` can be called from any thread.
+
+    """
+
+    LOGIN_TOTAL = "login.total"
+    LOGIN_QUEUE = "login.threadPoolQueue"
+    LOGIN_IN_DB = "login.loginInDb"
+    LOGIN_CHECK_PASS = "login.checkPass"
+    LOGIN_INTERNAL_AUTH = "login.internalAuth"
+    LOGIN_LDAP_AUTH = "login.ldapAuth"
+    LOGIN_SESSION_QUERY = "login.sessionQuery"
+    LOGIN_DEVICE_API = "login.deviceApi"
+    LOGIN_SESSION_WRITE = "login.sessionWrite"
+    LOGIN_HOOKS = "login.hooks"
+
+    LOGOUT_TOTAL = "logout.total"
+    LOGOUT_QUEUE = "logout.threadPoolQueue"
+    LOGOUT_DEVICE_API = "logout.deviceApi"
+    LOGOUT_HOOKS = "logout.hooks"
+    LOGOUT_IN_DB = "logout.logoutInDb"
+
+    BUCKET_UPPER_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+    WINDOW_SECS = 300
+    MAX_SAMPLES = 10000
+    PUBLISH_PERIOD_SECS = 5.0
+
+    def __init__(self):
+        self._lock = Lock()
+        self._histogramsByStage = {}
+        self._changed = False
+
+        self._adminTupleObservable: TupleDataObservableHandler = None
+        self._publishLoopingCall = LoopingCall(self._publish)
+
+    def setup(self, adminTupleObservable: TupleDataObservableHandler):
+        self._adminTupleObservable = adminTupleObservable
+
+        d = self._publishLoopingCall.start(self.PUBLISH_PERIOD_SECS, now=False)
+        d.addErrback(lambda f: logger.exception(f.value))
+
+    def shutdown(self):
+        if self._publishLoopingCall.running:
+            self._publishLoopingCall.stop()
+
+        self._adminTupleObservable = None
+
+    def record(self, stageName: str, durationSecs: float) -> None:
+        with self._lock:
+            histogram = self._histogramsByStage.get(stageName)
+            if histogram is None:
+                histogram = _RollingHistogram(self.WINDOW_SECS, self.MAX_SAMPLES)
+                self._histogramsByStage[stageName] = histogram
+
+            histogram.add(monotonic(), durationSecs)
+            self._changed = True
+
+    @contextmanager
+    def time(self, stageName: str):
+        """ Time
+
+        Record the time spent in the "with" block, EG ::
+
+                with self._latencyController.time(LoginLatencyController.LOGIN_HOOKS):
+                    yield self._fieldServiceHookApi.callLoginHooks(loginResponse)
+
+        """
+        startTime = monotonic()
+        try:
+            yield
+        finally:
+            self.record(stageName, monotonic() - startTime)
+
+    def _publish(self) -> None:
+        with self._lock:
+            changed = self._changed
+            self._changed = False
+
+        if changed and self._adminTupleObservable:
+            self._adminTupleObservable.notifyOfTupleUpdateForTuple(
+                LoginStageLatencyTuple.tupleType()
+            )
+
+    def stageLatencyTuples(self) -> List[LoginStageLatencyTuple]:
+        now = monotonic()
+
+        with self._lock:
+            durationsByStage = {
+                stageName: histogram.durations(now)
+                for stageName, histogram in self._histogramsByStage.items()
+            }
+
+        return [self._makeTuple(stageName, durations)
+                for stageName, durations in sorted(durationsByStage.items())]
+
+    def _makeTuple(self, stageName: str,
+                   durations: List[float]) -> LoginStageLatencyTuple:
+        durationsMs = sorted(d * 1000.0 for d in durations)
+
+        def percentile(percent: float) -> float:
+            if not durationsMs:
+                return 0.0
+            index = int(round(percent / 100.0 * (len(durationsMs) - 1)))
+            return round(durationsMs[index], 2)
+
+        bucketCounts = [0] * (len(self.BUCKET_UPPER_MS) + 1)
+        for durationMs in durationsMs:
+            bucketCounts[bisect_left(self.BUCKET_UPPER_MS, durationMs)] += 1
+
+        return LoginStageLatencyTuple(
+            stageName=stageName,
+            count=len(durationsMs),
+            windowSecs=self.WINDOW_SECS,
+            meanMs=(round(sum(durationsMs) / len(durationsMs), 2)
+                    if durationsMs else 0.0),
+            p50Ms=percentile(50),
+            p95Ms=percentile(95),
+            p99Ms=percentile(99),
+            maxMs=round(durationsMs[-1], 2) if durationsMs else 0.0,
+            bucketUpperMs=list(self.BUCKET_UPPER_MS),
+            bucketCounts=bucketCounts
+        )
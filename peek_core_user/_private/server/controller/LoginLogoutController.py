@@ -1,12 +1,18 @@
+import hashlib
+import hmac
 import logging
+import os
 from datetime import datetime
-from typing import List
+from time import monotonic
+from typing import Dict, List, Optional, Tuple
 
 import pytz
+from sqlalchemy import or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from twisted.cred.error import LoginFailed
 from twisted.internet import reactor
 from twisted.internet.defer import Deferred, inlineCallbacks
-from vortex.DeferUtil import deferToThreadWrapWithLogger
+from twisted.python.failure import Failure
 from vortex.TupleSelector import TupleSelector
 from vortex.handler.TupleDataObservableHandler import TupleDataObservableHandler
 
@@ -15,14 +21,26 @@ from peek_core_user._private.server.api.UserFieldHookApi import UserFieldHookApi
 from peek_core_user._private.server.api.UserInfoApi import UserInfoApi
 from peek_core_user._private.server.auth_connectors.InternalAuth import InternalAuth
 from peek_core_user._private.server.auth_connectors.LdapAuth import LdapAuth
+from peek_core_user._private.server.auth_connectors.LdapReactorAuth import \
+    LdapReactorAuth
+from peek_core_user._private.server.auth_connectors.LdapRouting import ldapUserName
+from peek_core_user._private.server.controller.DeviceDescriptionCache import \
+    DeviceDescriptionCache
+from peek_core_user._private.server.controller.LoggedInUserStatusController import \
+    LoggedInUserStatusController
+from peek_core_user._private.server.controller.LoginLatencyController import \
+    LoginLatencyController
+from peek_core_user._private.server.controller.LoginWorkQueue import LoginWorkQueue
 from peek_core_user._private.storage.Setting import \
-    globalSetting, INTERNAL_AUTH_ENABLED_FOR_FIELD, \
+    globalSettings, INTERNAL_AUTH_ENABLED_FOR_FIELD, \
     LDAP_AUTH_ENABLED, INTERNAL_AUTH_ENABLED_FOR_OFFICE
+from peek_core_user._private.storage.InternalGroupTuple import InternalGroupTuple
+from peek_core_user._private.storage.InternalUserTuple import InternalUserTuple
 from peek_core_user._private.storage.UserLoggedIn import UserLoggedIn
-from peek_core_user._private.tuples.LoggedInUserStatusTuple import \
-    LoggedInUserStatusTuple
 from peek_core_user._private.tuples.UserLoggedInTuple import UserLoggedInTuple
 from peek_core_user.server.UserDbErrors import UserIsNotLoggedInToThisDeviceError
+from peek_core_user.tuples.login.UserBulkLogoutSelectorTuple import \
+    UserBulkLogoutSelectorTuple
 from peek_core_user.tuples.login.UserLoginAction import UserLoginAction
 from peek_core_user.tuples.login.UserLoginResponseTuple import UserLoginResponseTuple
 from peek_core_user.tuples.login.UserLogoutAction import UserLogoutAction
@@ -38,20 +56,33 @@ DEVICE_ALREADY_LOGGED_ON_KEY = 'pl-user.DEVICE_ALREADY_LOGGED_ON_KEY'
 class LoginLogoutController:
 
     def __init__(self, deviceApi: DeviceApiABC,
-                 dbSessionCreator: DbSessionCreator):
+                 dbSessionCreator: DbSessionCreator,
+                 deviceDescriptionCache: DeviceDescriptionCache,
+                 latencyController: LoginLatencyController,
+                 workQueue: LoginWorkQueue):
         self._deviceApi: DeviceApiABC = deviceApi
+        self._deviceDescriptionCache = deviceDescriptionCache
+        self._latency = latencyController
+        self._workQueue = workQueue
         self._fieldServiceHookApi: UserFieldHookApi = None
         self._infoApi: UserInfoApi = None
         self._dbSessionCreator: DbSessionCreator = dbSessionCreator
         self._clientTupleObservable: TupleDataObservableHandler = None
-        self._adminTupleObservable: TupleDataObservableHandler = None
+        self._loggedInUserStatusController: LoggedInUserStatusController = None
+
+        #: The logins in progress, and the Deferreds of their duplicates, keyed by
+        # (deviceToken, userName, credential fingerprint)
+        self._inFlightLogins: Dict[Tuple[str, str, str], List[Deferred]] = {}
+
+        #: The key for the credential fingerprints, it never leaves this process
+        self._fingerprintKey = os.urandom(32)
 
     def setup(self, clientTupleObservable,
-              adminTupleObservable,
+              loggedInUserStatusController: LoggedInUserStatusController,
               hookApi: UserFieldHookApi,
               infoApi: UserInfoApi):
         self._clientTupleObservable = clientTupleObservable
-        self._adminTupleObservable = adminTupleObservable
+        self._loggedInUserStatusController = loggedInUserStatusController
         self._fieldServiceHookApi = hookApi
         self._infoApi = infoApi
 
@@ -61,7 +92,12 @@ class LoginLogoutController:
         self._infoApi = None
 
     def _checkPassBlocking(self, ormSession, userName, password,
-                           isFieldService: bool) -> List[str]:
+                           isFieldService: bool) -> Tuple[str, List[str]]:
+        """ Check Pass
+
+        :return: A tuple of the user name the login is for, and the user's groups.
+                    An LDAP login is for the user name without the domain.
+        """
         if not password:
             raise LoginFailed("Password is empty")
 
@@ -73,26 +109,36 @@ class LoginLogoutController:
         if isFieldService:
             forService = InternalAuth.FOR_FIELD
 
+        settings = globalSettings(ormSession, [INTERNAL_AUTH_ENABLED_FOR_FIELD,
+                                               INTERNAL_AUTH_ENABLED_FOR_OFFICE,
+                                               LDAP_AUTH_ENABLED])
+
         # TRY INTERNAL IF ITS ENABLED
         try:
             if forService == InternalAuth.FOR_FIELD \
-                    and globalSetting(ormSession, INTERNAL_AUTH_ENABLED_FOR_FIELD):
-                return InternalAuth().checkPassBlocking(ormSession, userName,
-                                                        password, forService)
+                    and settings[INTERNAL_AUTH_ENABLED_FOR_FIELD]:
+                with self._latency.time(LoginLatencyController.LOGIN_INTERNAL_AUTH):
+                    return userName, InternalAuth().checkPassBlocking(
+                        ormSession, userName, password, forService
+                    )
 
             if forService == InternalAuth.FOR_OFFICE \
-                    and globalSetting(ormSession, INTERNAL_AUTH_ENABLED_FOR_OFFICE):
-                return InternalAuth().checkPassBlocking(ormSession, userName,
-                                                        password, forService)
+                    and settings[INTERNAL_AUTH_ENABLED_FOR_OFFICE]:
+                with self._latency.time(LoginLatencyController.LOGIN_INTERNAL_AUTH):
+                    return userName, InternalAuth().checkPassBlocking(
+                        ormSession, userName, password, forService
+                    )
 
         except Exception as e:
             lastException = e
 
         # TRY LDAP IF ITS ENABLED
         try:
-            if globalSetting(ormSession, LDAP_AUTH_ENABLED):
-                return LdapAuth().checkPassBlocking(ormSession, userName,
-                                                    password, forService)
+            if settings[LDAP_AUTH_ENABLED]:
+                with self._latency.time(LoginLatencyController.LOGIN_LDAP_AUTH):
+                    return ldapUserName(userName), LdapAuth().checkPassBlocking(
+                        ormSession, userName, password, forService
+                    )
 
         except Exception as e:
             lastException = e
@@ -105,26 +151,39 @@ class LoginLogoutController:
     def _checkGroupBlocking(self, ormSession, groups: List[str]):
         pass
 
-    @deferToThreadWrapWithLogger(logger)
-    def _logoutInDb(self, logoutTuple: UserLogoutAction):
+    @staticmethod
+    def _workPriority(isFieldService: bool) -> int:
+        if isFieldService:
+            return LoginWorkQueue.PRIORITY_FIELD
+        return LoginWorkQueue.PRIORITY_OFFICE
+
+    def _logoutInDb(self, logoutTuple: UserLogoutAction) -> Deferred:
         """
         Returns Deferred[UserLogoutResponseTuple]
         """
+        return self._workQueue.run(self._workPriority(logoutTuple.isFieldService),
+                                   self._logoutInDbBlocking, logoutTuple, monotonic())
+
+    def _logoutInDbBlocking(self, logoutTuple: UserLogoutAction, queuedAt: float):
+        """
+        :param queuedAt: The monotonic() time this call was queued for the thread pool
+        """
+        self._latency.record(LoginLatencyController.LOGOUT_QUEUE,
+                             monotonic() - queuedAt)
+
+        table = UserLoggedIn.__table__
 
         session = self._dbSessionCreator()
         try:
-            # Check if the user is actually logged into this device.
-            qry = (
-                session.query(UserLoggedIn)
-                    .filter(UserLoggedIn.userName == logoutTuple.userName)
-                    .filter(
-                    UserLoggedIn.deviceToken == logoutTuple.deviceToken)
-            )
+            # Delete the session, if the user is actually logged into this device.
+            stmt = table.delete() \
+                .where(table.c.userName == logoutTuple.userName) \
+                .where(table.c.deviceToken == logoutTuple.deviceToken) \
+                .returning(table.c.id)
 
-            if qry.count() == 0:
+            if not session.execute(stmt).fetchall():
                 raise UserIsNotLoggedInToThisDeviceError(logoutTuple.userName)
 
-            session.delete(qry.one())
             session.commit()
 
         finally:
@@ -139,10 +198,16 @@ class LoginLogoutController:
 
         :return A deferred that fires with List[UserLogoutResponseTuple]
         """
+        with self._latency.time(LoginLatencyController.LOGOUT_TOTAL):
+            response = yield self._logout(logoutTuple)
+            return response
 
-        deviceDescription = yield self._deviceApi.deviceDescription(
-            logoutTuple.deviceToken
-        )
+    @inlineCallbacks
+    def _logout(self, logoutTuple: UserLogoutAction) -> Deferred:
+        with self._latency.time(LoginLatencyController.LOGOUT_DEVICE_API):
+            deviceDescription = yield self._deviceDescriptionCache.description(
+                logoutTuple.deviceToken
+            )
 
         response = UserLogoutResponseTuple(
             userName=logoutTuple.userName,
@@ -153,21 +218,21 @@ class LoginLogoutController:
 
         if logoutTuple.isFieldService:
             # Give the hooks a chance to fail the logout
-            yield self._fieldServiceHookApi.callLogoutHooks(response)
+            with self._latency.time(LoginLatencyController.LOGOUT_HOOKS):
+                yield self._fieldServiceHookApi.callLogoutHooks(response)
 
         # If there are no problems, proceed with the logout.
         try:
             if response.succeeded:
-                yield self._logoutInDb(logoutTuple)
+                with self._latency.time(LoginLatencyController.LOGOUT_IN_DB):
+                    yield self._logoutInDb(logoutTuple)
 
         finally:
             # Delay this, otherwise the user gets kicked off before getting
             # the nice success message
             reactor.callLater(0.05, self._sendLogoutUpdate, logoutTuple.deviceToken)
 
-        self._adminTupleObservable.notifyOfTupleUpdateForTuple(
-            LoggedInUserStatusTuple.tupleType()
-        )
+        self._loggedInUserStatusController.deviceChanged(logoutTuple.deviceToken)
 
         return response
 
@@ -177,12 +242,171 @@ class LoginLogoutController:
                           selector=dict(deviceToken=deviceToken))
         )
 
-    @deferToThreadWrapWithLogger(logger)
-    def _loginInDb(self, loginTuple: UserLoginAction):
+    def _sendLogoutUpdates(self, deviceTokens: List[str]):
+        for deviceToken in deviceTokens:
+            self._sendLogoutUpdate(deviceToken)
+
+    @inlineCallbacks
+    def bulkLogout(self, selector: UserBulkLogoutSelectorTuple,
+                   priority: int = LoginWorkQueue.PRIORITY_ADMIN) -> Deferred:
+        """ Bulk Logout
+
+        Force the logout of all the sessions matching the selector.
+
+        :param selector: The sessions to logout.
+        :param priority: The LoginWorkQueue priority of the delete.
+
+        :return A deferred that fires with List[UserLogoutResponseTuple]
+        """
+        if selector.isEmpty():
+            raise ValueError("The bulk logout selector doesn't select any sessions")
+
+        rows = yield self._workQueue.run(priority,
+                                         self._bulkLogoutInDbBlocking, selector)
+
+        if not rows:
+            return []
+
+        deviceTokens = [row.deviceToken for row in rows]
+
+        # Kick the users off the devices, there are no success messages to wait for
+        reactor.callLater(0, self._sendLogoutUpdates, deviceTokens)
+
+        for deviceToken in deviceTokens:
+            self._loggedInUserStatusController.deviceChanged(deviceToken)
+
+        deviceDetails = yield self._deviceApi.deviceDetails(deviceTokens)
+        descriptions = {d.deviceToken: d.description for d in deviceDetails}
+
+        responses = []
+        fieldResponses = []
+        for row in rows:
+            response = UserLogoutResponseTuple(
+                userName=row.userName,
+                deviceToken=row.deviceToken,
+                deviceDescription=descriptions.get(row.deviceToken),
+                acceptedWarningKeys=[],
+                succeeded=True)
+            responses.append(response)
+
+            if row.isFieldLogin:
+                fieldResponses.append(response)
+
+        if fieldResponses:
+            yield self._fieldServiceHookApi.callBulkLogoutHooks(fieldResponses)
+
+        logger.info("Bulk logout of %s sessions", len(responses))
+
+        return responses
+
+    def _bulkLogoutInDbBlocking(self, selector: UserBulkLogoutSelectorTuple):
+        """ Bulk Logout In DB
+
+        Delete the matching sessions with one statement.
+
+        :return: A list of the deleted rows, with userName, deviceToken and
+                    isFieldLogin.
+        """
+        table = UserLoggedIn.__table__
+
+        ormSession = self._dbSessionCreator()
+        try:
+            stmt = table.delete()
+
+            if selector.deviceTokens is not None:
+                stmt = stmt.where(table.c.deviceToken.in_(selector.deviceTokens))
+
+            if selector.userNames is not None:
+                stmt = stmt.where(table.c.userName.in_(selector.userNames))
+
+            if selector.vehicle is not None:
+                stmt = stmt.where(table.c.vehicle == selector.vehicle)
+
+            if selector.loggedInBefore is not None:
+                stmt = stmt.where(table.c.loggedInDateTime < selector.loggedInBefore)
+
+            if selector.groupName is not None:
+                groupUserNames = ormSession.query(InternalUserTuple.userName) \
+                    .join(InternalUserTuple.groups) \
+                    .filter(InternalGroupTuple.groupName == selector.groupName) \
+                    .subquery()
+                stmt = stmt.where(table.c.userName.in_(groupUserNames))
+
+            stmt = stmt.returning(table.c.userName,
+                                  table.c.deviceToken,
+                                  table.c.isFieldLogin)
+
+            rows = ormSession.execute(stmt).fetchall()
+            ormSession.commit()
+
+            return rows
+
+        finally:
+            ormSession.close()
+
+    @inlineCallbacks
+    def _loginInDb(self, loginTuple: UserLoginAction) -> Deferred:
         """
         Returns Deferred[UserLoginResponseTuple]
 
         """
+        checkedPass = yield self._checkPassOnReactor(loginTuple)
+
+        loginResponse = yield self._workQueue.run(
+            self._workPriority(loginTuple.isFieldService),
+            self._loginInDbBlocking, loginTuple, monotonic(), checkedPass
+        )
+        return loginResponse
+
+    @inlineCallbacks
+    def _checkPassOnReactor(self, loginTuple: UserLoginAction) -> Deferred:
+        """ Check Pass On Reactor
+
+        When the LDAP reactor client is enabled, check the password before the login
+        is queued for a thread, so no thread waits on the LDAP server.
+
+        This tries the same authentication handlers, in the same order,
+        as `_checkPassBlocking`.
+
+        :return: A Deferred that fires with a tuple of the user name the login is
+                    for and the user's groups, or None if the password is to be
+                    checked in the thread.
+        """
+        if not loginTuple.password:
+            return None
+
+        forService = InternalAuth.FOR_OFFICE
+        if loginTuple.isFieldService:
+            forService = InternalAuth.FOR_FIELD
+
+        # Only time the logins that are checked here
+        startTime = monotonic()
+        try:
+            checkedPass = yield LdapReactorAuth(
+                self._dbSessionCreator, self._workQueue
+            ).checkPass(loginTuple.userName, loginTuple.password, forService,
+                        self._workPriority(loginTuple.isFieldService))
+
+        except Exception:
+            self._latency.record(LoginLatencyController.LOGIN_CHECK_PASS,
+                                 monotonic() - startTime)
+            raise
+
+        if checkedPass is not None:
+            self._latency.record(LoginLatencyController.LOGIN_CHECK_PASS,
+                                 monotonic() - startTime)
+
+        return checkedPass
+
+    def _loginInDbBlocking(self, loginTuple: UserLoginAction, queuedAt: float,
+                           checkedPass: Optional[Tuple[str, List[str]]] = None):
+        """
+        :param queuedAt: The monotonic() time this call was queued for the thread pool
+        :param checkedPass: The user name and groups from `_checkPassOnReactor`,
+                    if the password has already been checked
+        """
+        self._latency.record(LoginLatencyController.LOGIN_QUEUE,
+                             monotonic() - queuedAt)
 
         userName = loginTuple.userName
         password = loginTuple.password
@@ -203,29 +427,48 @@ class LoginLogoutController:
         if not deviceToken:
             raise Exception("peekToken must be supplied")
 
-        thisDeviceDescription = self._deviceApi.deviceDescriptionBlocking(deviceToken)
-
         ormSession = self._dbSessionCreator()
         try:
-            groups = self._checkPassBlocking(ormSession, userName, password,
-                                             allowMultipleLogins)
+            if checkedPass is None:
+                with self._latency.time(LoginLatencyController.LOGIN_CHECK_PASS):
+                    checkedPass = self._checkPassBlocking(ormSession, userName,
+                                                          password,
+                                                          allowMultipleLogins)
+
+            # The rest of the login is for the user name that was authenticated
+            userName, groups = checkedPass
+            responseTuple.userName = userName
             self._checkGroupBlocking(ormSession, groups)
 
             responseTuple.userDetail = self._infoApi.userBlocking(userName, ormSession)
 
-            # Find any current login sessions
-            userLoggedIn = (ormSession.query(UserLoggedIn)
-                            .filter(UserLoggedIn.userName == userName)
-                            .filter(UserLoggedIn.isFieldLogin == isFieldService)
-                            .all())
+            # Find any current login sessions for this user or this device,
+            # with one query, then sort out the conflicts in memory.
+            with self._latency.time(LoginLatencyController.LOGIN_SESSION_QUERY):
+                sessionStates = (
+                    ormSession.query(UserLoggedIn)
+                        .filter(or_(UserLoggedIn.userName == userName,
+                                    UserLoggedIn.deviceToken == deviceToken))
+                        .all()
+                )
+
+            userLoggedIn = [s for s in sessionStates
+                            if s.userName == userName
+                            and s.isFieldLogin == isFieldService]
             userLoggedIn = userLoggedIn[0] if userLoggedIn else None
 
-            loggedInElsewhere = (
-                ormSession.query(UserLoggedIn)
-                    .filter(UserLoggedIn.deviceToken != deviceToken)
-                    .filter(UserLoggedIn.userName == userName)
-                    .filter(UserLoggedIn.isFieldLogin == isFieldService)
-                    .all())
+            loggedInElsewhere = [s for s in sessionStates
+                                 if s.deviceToken != deviceToken
+                                 and s.userName == userName
+                                 and s.isFieldLogin == isFieldService]
+
+            # Load the descriptions of all the devices involved, in one call
+            with self._latency.time(LoginLatencyController.LOGIN_DEVICE_API):
+                self._deviceDescriptionCache.prefetchBlocking(
+                    [deviceToken] + [s.deviceToken for s in sessionStates]
+                )
+                thisDeviceDescription = \
+                    self._deviceDescriptionCache.descriptionBlocking(deviceToken)
 
             if allowMultipleLogins and len(loggedInElsewhere) not in (0, 1):
                 raise Exception("Found more than 1 ClientDevice for"
@@ -244,9 +487,10 @@ class LoginLogoutController:
                     userLoggedIn = False
 
                 else:
-                    otherDeviceDescription = self._deviceApi.deviceDescriptionBlocking(
-                        loggedInElsewhere.deviceToken
-                    )
+                    otherDeviceDescription = \
+                        self._deviceDescriptionCache.descriptionBlocking(
+                            loggedInElsewhere.deviceToken
+                        )
 
                     # This is false if the logged in device has been removed from
                     # enrollment
@@ -268,7 +512,7 @@ class LoginLogoutController:
 
             # If we're logging into the same device, but already logged in
             if sameDevice:  # Logging into the same device
-                sameDeviceDescription = self._deviceApi.deviceDescriptionBlocking(
+                sameDeviceDescription = self._deviceDescriptionCache.descriptionBlocking(
                     userLoggedIn.deviceToken
                 )
 
@@ -277,40 +521,32 @@ class LoginLogoutController:
                 responseTuple.succeeded = True
                 return responseTuple
 
-            anotherUserOnThatDevice = (
-                ormSession.query(UserLoggedIn)
-                    .filter(UserLoggedIn.deviceToken == deviceToken)
-                    .filter(UserLoggedIn.userName != userName)
-                    .all()
-            )
+            anotherUserOnThatDevice = [s for s in sessionStates
+                                       if s.deviceToken == deviceToken
+                                       and s.userName != userName]
 
             if anotherUserOnThatDevice:
                 anotherUserOnThatDevice = anotherUserOnThatDevice[0]
-                if DEVICE_ALREADY_LOGGED_ON_KEY in acceptedWarningKeys:
-                    self._forceLogout(ormSession,
-                                      anotherUserOnThatDevice.userName,
-                                      anotherUserOnThatDevice.deviceToken)
-
-                else:
-                    responseTuple.setFailed()
-                    responseTuple.addWarning(
-                        DEVICE_ALREADY_LOGGED_ON_KEY,
-                        "User %s is currently logged into this device : %s" % (
-                            anotherUserOnThatDevice.userName,
-                            thisDeviceDescription)
-                    )
-
+                # The session write below replaces their session
+                if DEVICE_ALREADY_LOGGED_ON_KEY not in acceptedWarningKeys:
+                    self._setDeviceAlreadyLoggedOn(responseTuple,
+                                                   anotherUserOnThatDevice.userName,
+                                                   thisDeviceDescription)
                     return responseTuple
 
-            # Create the user logged in entry
+            # Create or replace the user logged in entry for this device
+            with self._latency.time(LoginLatencyController.LOGIN_SESSION_WRITE):
+                written = self._writeSessionBlocking(
+                    ormSession, userName, deviceToken, vehicle, isFieldService,
+                    replaceOtherUser=DEVICE_ALREADY_LOGGED_ON_KEY in acceptedWarningKeys
+                )
+                ormSession.commit()
 
-            newUser = UserLoggedIn(userName=userName,
-                                   loggedInDateTime=datetime.now(pytz.utc),
-                                   deviceToken=deviceToken,
-                                   vehicle=vehicle,
-                                   isFieldLogin=isFieldService)
-            ormSession.add(newUser)
-            ormSession.commit()
+            # Another user logged into this device since we looked
+            if not written:
+                self._setDeviceAlreadyLoggedOn(responseTuple, None,
+                                               thisDeviceDescription)
+                return responseTuple
 
             # Respond with a successful login
             responseTuple.deviceToken = deviceToken
@@ -322,17 +558,76 @@ class LoginLogoutController:
             ormSession.close()
 
     @inlineCallbacks
-    def login(self, loginTuple: UserLoginAction):
-        """
+    def _timedLogin(self, loginTuple: UserLoginAction):
+        with self._latency.time(LoginLatencyController.LOGIN_TOTAL):
+            loginResponse = yield self._login(loginTuple)
+            return loginResponse
+
+    def login(self, loginTuple: UserLoginAction) -> Deferred:
+        """ Login
+
+        Devices on poor connections retry their login while the first attempt is
+        still running, an identical login that is already in progress is shared
+        rather than started again.
+
         Returns Deferred[UserLoginResponseTuple]
 
         """
+        key = (loginTuple.deviceToken, loginTuple.userName,
+               self._credentialFingerprint(loginTuple))
+
+        duplicates = self._inFlightLogins.get(key)
+        if duplicates is not None:
+            logger.debug("Login for %s on %s is already in progress,"
+                         " sharing its result", loginTuple.userName,
+                         loginTuple.deviceToken)
+            d = Deferred()
+            duplicates.append(d)
+            return d
+
+        self._inFlightLogins[key] = []
+
+        d = self._timedLogin(loginTuple)
+        d.addBoth(self._loginFinished, key)
+        return d
+
+    def _loginFinished(self, result, key):
+        for d in self._inFlightLogins.pop(key):
+            if isinstance(result, Failure):
+                d.errback(result)
+            else:
+                d.callback(result)
+
+        return result
+
+    def _credentialFingerprint(self, loginTuple: UserLoginAction) -> str:
+        """ Credential Fingerprint
+
+        The fingerprint includes the other login fields, so a retry that accepts a
+        warning or changes the vehicle is a new login.
+
+        """
+        parts = [
+            loginTuple.password or '',
+            loginTuple.vehicleId or '',
+            str(bool(loginTuple.isFieldService)),
+            str(bool(loginTuple.isOfficeService)),
+        ] + sorted(loginTuple.acceptedWarningKeys or [])
+
+        return hmac.new(self._fingerprintKey,
+                        '\0'.join(parts).encode(),
+                        hashlib.sha256).hexdigest()
+
+    @inlineCallbacks
+    def _login(self, loginTuple: UserLoginAction):
         loginResponse = None
         try:
-            loginResponse = yield self._loginInDb(loginTuple)
+            with self._latency.time(LoginLatencyController.LOGIN_IN_DB):
+                loginResponse = yield self._loginInDb(loginTuple)
 
             if loginTuple.isFieldService:
-                yield self._fieldServiceHookApi.callLoginHooks(loginResponse)
+                with self._latency.time(LoginLatencyController.LOGIN_HOOKS):
+                    yield self._fieldServiceHookApi.callLoginHooks(loginResponse)
 
         # except UserAlreadyLoggedInError as e:
         #     pass
@@ -347,8 +642,10 @@ class LoginLogoutController:
 
             # Log the user out again if the hooks fail
             logoutTuple = UserLogoutAction(
-                userName=loginTuple.userName,
-                deviceToken=loginTuple.deviceToken)
+                userName=loginResponse.userName if loginResponse
+                else loginTuple.userName,
+                deviceToken=loginTuple.deviceToken,
+                isFieldService=loginTuple.isFieldService)
 
             # Force logout, we don't care if it works or not.
             try:
@@ -363,12 +660,55 @@ class LoginLogoutController:
                           selector=dict(deviceToken=loginTuple.deviceToken))
         )
 
-        self._adminTupleObservable.notifyOfTupleUpdateForTuple(
-            LoggedInUserStatusTuple.tupleType()
-        )
+        self._loggedInUserStatusController.deviceChanged(loginTuple.deviceToken)
 
         return loginResponse
 
+    @staticmethod
+    def _writeSessionBlocking(ormSession, userName: str, deviceToken: str,
+                              vehicle: str, isFieldService: bool,
+                              replaceOtherUser: bool) -> bool:
+        """ Write Session
+
+        Insert the UserLoggedIn row for this device, or update the existing one,
+        with one statement. Concurrent logins to the same device update the row
+        rather than failing on the unique deviceToken.
+
+        :param replaceOtherUser: Replace the session of another user on this device.
+        :return: False if another user's session is on this device,
+                    and replaceOtherUser is False.
+        """
+        table = UserLoggedIn.__table__
+
+        stmt = pg_insert(table).values(
+            userName=userName,
+            loggedInDateTime=datetime.now(pytz.utc),
+            deviceToken=deviceToken,
+            vehicle=vehicle,
+            isFieldLogin=isFieldService
+        )
+
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.deviceToken],
+            set_=dict(userName=stmt.excluded.userName,
+                      loggedInDateTime=stmt.excluded.loggedInDateTime,
+                      vehicle=stmt.excluded.vehicle,
+                      isFieldLogin=stmt.excluded.isFieldLogin),
+            where=None if replaceOtherUser else (table.c.userName == userName)
+        ).returning(table.c.id)
+
+        return bool(ormSession.execute(stmt).fetchall())
+
+    @staticmethod
+    def _setDeviceAlreadyLoggedOn(responseTuple: UserLoginResponseTuple,
+                                  otherUserName, deviceDescription) -> None:
+        responseTuple.setFailed()
+        responseTuple.addWarning(
+            DEVICE_ALREADY_LOGGED_ON_KEY,
+            "User %s is currently logged into this device : %s" % (
+                otherUserName or "Another user", deviceDescription)
+        )
+
     def _forceLogout(self, ormSession, userName, deviceToken):
 
         ormSession.query(UserLoggedIn) \
@@ -380,3 +720,5 @@ class LoginLogoutController:
             TupleSelector(UserLoggedInTuple.tupleType(),
                           selector=dict(deviceToken=deviceToken))
         )
+
+        self._loggedInUserStatusController.deviceChanged(deviceToken)
@@ -0,0 +1,198 @@
+import heapq
+import logging
+from itertools import count
+from time import monotonic
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, fail
+from twisted.internet.task import LoopingCall
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.failure import Failure
+from twisted.python.threadpool import ThreadPool
+from vortex.handler.TupleDataObservableHandler import TupleDataObservableHandler
+
+from peek_core_user._private.tuples.LoginWorkQueueStatusTuple import \
+    LoginWorkQueueStatusTuple
+
+logger = logging.getLogger(__name__)
+
+
+class LoginServerBusyError(Exception):
+    def __str__(self):
+        return "The server is busy processing other logins, please try again"
+
+
+class LoginWorkQueue:
+    """ Login Work Queue
+
+    This class runs the blocking login, logout and admin auth work on its own
+    thread pool, so a login storm can't starve the shared reactor thread pool.
+
+    At most `maxConcurrency` calls run at once, the rest wait in a priority queue,
+    admin work runs first, then office, then field, then background work.
+
+    Calls are rejected with LoginServerBusyError when the queue already holds
+    `maxQueueDepth` calls, or when a call has waited more than `maxQueueWaitSecs`,
+    a timer rejects them even if no running call frees up a thread.
+
+    The queue depth, running and rejected counts are published to the admin app
+    as a LoginWorkQueueStatusTuple, and logged while there is a backlog.
+
+    All methods must be called from the reactor thread.
+
+    """
+
+    PRIORITY_ADMIN = 0
+    PRIORITY_OFFICE = 1
+    PRIORITY_FIELD = 2
+    PRIORITY_BACKGROUND = 3
+
+    PUBLISH_PERIOD_SECS = 5.0
+
+    def __init__(self, maxConcurrency: int = 10,
+                 maxQueueDepth: int = 1000,
+                 maxQueueWaitSecs: float = 30.0):
+        self._maxConcurrency = maxConcurrency
+        self._maxQueueDepth = maxQueueDepth
+        self._maxQueueWaitSecs = maxQueueWaitSecs
+
+        #: heap of (priority, sequence, queuedAt, deferred, timeoutCall,
+        #:          callable, args, kwargs)
+        self._queue = []
+        self._sequence = count()
+        self._runningCount = 0
+        self._rejectedCount = 0
+
+        self._threadPool = ThreadPool(minthreads=0, maxthreads=maxConcurrency,
+                                      name="peek_core_user.LoginWorkQueue")
+        self._threadPool.start()
+
+        self._adminTupleObservable: TupleDataObservableHandler = None
+        self._publishLoopingCall = LoopingCall(self._publish)
+        self._lastPublishedStatus = None
+
+    def setup(self, adminTupleObservable: TupleDataObservableHandler):
+        self._adminTupleObservable = adminTupleObservable
+
+        d = self._publishLoopingCall.start(self.PUBLISH_PERIOD_SECS, now=False)
+        d.addErrback(lambda f: logger.exception(f.value))
+
+    def shutdown(self):
+        if self._publishLoopingCall.running:
+            self._publishLoopingCall.stop()
+
+        self._adminTupleObservable = None
+
+        while self._queue:
+            item = heapq.heappop(self._queue)
+            if item[4].active():
+                item[4].cancel()
+            item[3].errback(Failure(LoginServerBusyError()))
+
+        self._threadPool.stop()
+
+    @property
+    def queueDepth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def runningCount(self) -> int:
+        return self._runningCount
+
+    @property
+    def rejectedCount(self) -> int:
+        return self._rejectedCount
+
+    def statusTuple(self) -> LoginWorkQueueStatusTuple:
+        return LoginWorkQueueStatusTuple(queueDepth=len(self._queue),
+                                         runningCount=self._runningCount,
+                                         rejectedCount=self._rejectedCount,
+                                         maxQueueDepth=self._maxQueueDepth,
+                                         maxConcurrency=self._maxConcurrency)
+
+    def _publish(self) -> None:
+        status = (len(self._queue), self._runningCount, self._rejectedCount)
+        if status == self._lastPublishedStatus:
+            return
+
+        self._lastPublishedStatus = status
+
+        if self._queue:
+            logger.info("Login work queue depth=%s, running=%s, rejected=%s",
+                        *status)
+
+        if self._adminTupleObservable:
+            self._adminTupleObservable.notifyOfTupleUpdateForTuple(
+                LoginWorkQueueStatusTuple.tupleType()
+            )
+
+    def run(self, priority: int, callable, *args, **kwargs) -> Deferred:
+        """ Run
+
+        Queue the blocking callable to be run on the login thread pool.
+
+        :param priority: One of the PRIORITY_* constants, lower runs first.
+        :return: A Deferred that fires with the result of the callable.
+        """
+        if len(self._queue) >= self._maxQueueDepth:
+            return self._reject("the queue is full")
+
+        d = Deferred()
+        sequence = next(self._sequence)
+        timeoutCall = reactor.callLater(self._maxQueueWaitSecs,
+                                        self._timedOut, sequence)
+        heapq.heappush(self._queue, (priority, sequence, monotonic(),
+                                     d, timeoutCall, callable, args, kwargs))
+        self._runNext()
+        return d
+
+    def _timedOut(self, sequence: int) -> None:
+        for index, item in enumerate(self._queue):
+            if item[1] == sequence:
+                break
+        else:
+            return
+
+        # Take the item out of the middle of the heap, then restore the heap
+        self._queue[index] = self._queue[-1]
+        self._queue.pop()
+        heapq.heapify(self._queue)
+
+        _, _, queuedAt, d, _, _, _, _ = item
+        self._reject("it waited %.1fs" % (monotonic() - queuedAt)) \
+            .addErrback(d.errback)
+
+    def _reject(self, reason: str) -> Deferred:
+        self._rejectedCount += 1
+        logger.warning("Rejected login work, %s, depth=%s, running=%s, rejected=%s",
+                       reason, len(self._queue), self._runningCount,
+                       self._rejectedCount)
+        return fail(LoginServerBusyError())
+
+    def _runNext(self) -> None:
+        while self._queue and self._runningCount < self._maxConcurrency:
+            _, _, _, d, timeoutCall, callable, args, kwargs = \
+                heapq.heappop(self._queue)
+
+            if timeoutCall.active():
+                timeoutCall.cancel()
+
+            self._runningCount += 1
+            threadD = deferToThreadPool(reactor, self._threadPool,
+                                        self._callLogged, callable, args, kwargs)
+            threadD.addBoth(self._finished)
+            threadD.chainDeferred(d)
+
+    def _finished(self, result):
+        self._runningCount -= 1
+        self._runNext()
+        return result
+
+    @staticmethod
+    def _callLogged(callable, args, kwargs):
+        try:
+            return callable(*args, **kwargs)
+
+        except Exception as e:
+            logger.exception(e)
+            raise
@@ -1,11 +1,16 @@
 import logging
 
-import hashlib
 from sqlalchemy.orm.exc import NoResultFound
 from twisted.internet.defer import Deferred
 
+from peek_core_user._private.server.auth_connectors.LdapCredentialCache import \
+    invalidateLdapCredentialCache
+from peek_core_user._private.server.auth_connectors.PasswordHashEngine import \
+    passwordHashEngine
 from peek_core_user._private.storage.InternalUserPassword import InternalUserPassword
 from peek_core_user._private.storage.InternalUserTuple import InternalUserTuple
+from peek_core_user._private.storage.Setting import globalSetting, \
+    PASSWORD_HASH_ITERATIONS
 from peek_core_user._private.tuples.InternalUserUpdatePasswordAction import \
     InternalUserUpdatePasswordAction
 from vortex.DeferUtil import deferToThreadWrapWithLogger
@@ -20,13 +25,6 @@ class PasswordUpdateController(TupleActionProcessorDelegateABC):
     def __init__(self, ormSessionCreator):
         self.ormSessionCreator = ormSessionCreator
 
-    @staticmethod
-    def hashPass(rawPass: str):
-        m = hashlib.sha1()
-        m.update(b'peek is a secure thingie')
-        m.update(rawPass.encode())
-        return m.hexdigest()
-
     @deferToThreadWrapWithLogger(logger)
     def processTupleAction(self, tupleAction: TupleActionABC) -> Deferred:
         """ Process Tuple Action
@@ -54,8 +52,17 @@ s
                 password.userId = tupleAction.userId
                 ormSession.add(password)
 
-            password.password = self.hashPass(tupleAction.newPassword)
+            password.password = passwordHashEngine.hashBlocking(
+                tupleAction.newPassword,
+                globalSetting(ormSession, PASSWORD_HASH_ITERATIONS)
+            )
             ormSession.commit()
 
+            userName = ormSession.query(InternalUserTuple.userName) \
+                .filter(InternalUserTuple.id == tupleAction.userId) \
+                .scalar()
+            if userName:
+                invalidateLdapCredentialCache([userName])
+
         finally:
             ormSession.close()
@@ -0,0 +1,208 @@
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import pytz
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, inlineCallbacks
+from twisted.internet.task import LoopingCall, deferLater
+from vortex.DeferUtil import deferToThreadWrapWithLogger
+
+from peek_core_device.server.DeviceApiABC import DeviceApiABC
+from peek_core_user._private.server.controller.LoginLogoutController import \
+    LoginLogoutController
+from peek_core_user._private.server.controller.LoginWorkQueue import \
+    LoginWorkQueue, LoginServerBusyError
+from peek_core_user._private.storage.Setting import globalSetting, \
+    STALE_SESSION_IDLE_HOURS
+from peek_core_user._private.storage.UserLoggedIn import UserLoggedIn
+from peek_core_user.tuples.login.UserBulkLogoutSelectorTuple import \
+    UserBulkLogoutSelectorTuple
+
+logger = logging.getLogger(__name__)
+
+
+class StaleSessionReaper:
+    """ Stale Session Reaper
+
+    This class periodically logs out the sessions of devices that haven't been
+    online for longer than the "Stale Session Idle Hours" setting, and the sessions
+    of devices that are no longer enrolled.
+
+    Only sessions that logged in before the idle threshold are logged out, so a
+    device that has just logged in again keeps its session.
+
+    The work is throttled, the sessions older than the threshold are paged from
+    the database, then their device details are loaded and the stale ones deleted
+    in chunks, with a pause between each chunk. The deletes run at
+    background priority on the LoginWorkQueue and wait while logins are queued.
+
+    """
+
+    CYCLE_SECS = 15 * 60
+    DEVICE_DETAILS_CHUNK_SIZE = 500
+    DELETE_CHUNK_SIZE = 100
+    CHUNK_PAUSE_SECS = 1.0
+
+    def __init__(self, dbSessionCreator, deviceApi: DeviceApiABC,
+                 loginLogoutController: LoginLogoutController,
+                 workQueue: LoginWorkQueue):
+        self._dbSessionCreator = dbSessionCreator
+        self._deviceApi = deviceApi
+        self._loginLogoutController = loginLogoutController
+        self._workQueue = workQueue
+
+        self._loopingCall = LoopingCall(self._reap)
+
+    def start(self):
+        d = self._loopingCall.start(self.CYCLE_SECS, now=False)
+        d.addErrback(lambda f: logger.exception(f.value))
+
+    def shutdown(self):
+        if self._loopingCall.running:
+            self._loopingCall.stop()
+
+    @inlineCallbacks
+    def _reap(self) -> Deferred:
+        try:
+            yield self._reapStaleSessions()
+
+        except LoginServerBusyError:
+            logger.debug("The login work queue is busy, stale sessions will be"
+                         " reaped next cycle")
+
+        except Exception as e:
+            # Don't stop the LoopingCall
+            logger.exception(e)
+
+    @inlineCallbacks
+    def _reapStaleSessions(self) -> Deferred:
+        idleHours = yield self._loadIdleHours()
+
+        if not idleHours:
+            return
+
+        idleBefore = datetime.now(pytz.utc) - timedelta(hours=idleHours)
+
+        reapedCount = 0
+        lastId = None
+        while True:
+            # Only sessions older than the threshold can be stale
+            sessions = yield self._loadSessionPage(idleBefore, lastId)
+            if not sessions:
+                break
+
+            lastId = sessions[-1].id
+
+            staleDeviceTokens = yield self._findStale(
+                [s.deviceToken for s in sessions], idleBefore
+            )
+            yield self._pause()
+
+            for chunk in self._chunks(staleDeviceTokens, self.DELETE_CHUNK_SIZE):
+                # Don't compete with logins
+                while self._workQueue.queueDepth:
+                    yield self._pause()
+
+                responses = yield self._loginLogoutController.bulkLogout(
+                    UserBulkLogoutSelectorTuple(deviceTokens=chunk,
+                                                loggedInBefore=idleBefore),
+                    priority=LoginWorkQueue.PRIORITY_BACKGROUND
+                )
+                reapedCount += len(responses)
+                yield self._pause()
+
+        if reapedCount:
+            logger.info("Logged out %s stale sessions, idle for more than %s hours",
+                        reapedCount, idleHours)
+
+    @inlineCallbacks
+    def _findStale(self, deviceTokens: List[str], idleBefore: datetime) -> Deferred:
+        deviceDetails = yield self._deviceApi.deviceDetails(deviceTokens)
+
+        # An empty reply more likely means the device plugin isn't ready, than
+        # every device in the chunk being un-enrolled
+        if not deviceDetails:
+            logger.debug("No device details were returned for %s devices,"
+                         " they'll be checked next cycle", len(deviceTokens))
+            return []
+
+        detailsByDeviceToken = {d.deviceToken: d for d in deviceDetails}
+
+        staleDeviceTokens = []
+        missingDeviceTokens = []
+        for deviceToken in deviceTokens:
+            deviceDetail = detailsByDeviceToken.get(deviceToken)
+
+            if deviceDetail is None:
+                missingDeviceTokens.append(deviceToken)
+                continue
+
+            if deviceDetail.isOnline:
+                continue
+
+            if deviceDetail.lastOnline is None \
+                    or deviceDetail.lastOnline < idleBefore:
+                staleDeviceTokens.append(deviceToken)
+
+        if missingDeviceTokens:
+            staleDeviceTokens.extend(
+                (yield self._confirmUnenrolled(missingDeviceTokens))
+            )
+
+        return staleDeviceTokens
+
+    @inlineCallbacks
+    def _confirmUnenrolled(self, deviceTokens: List[str]) -> Deferred:
+        """ Confirm Un-enrolled
+
+        Ask for the devices that were missing from the reply again, only the
+        devices that are still missing are treated as un-enrolled.
+
+        """
+        yield self._pause()
+        deviceDetails = yield self._deviceApi.deviceDetails(deviceTokens)
+        foundDeviceTokens = set(d.deviceToken for d in deviceDetails)
+
+        return [deviceToken for deviceToken in deviceTokens
+                if deviceToken not in foundDeviceTokens]
+
+    @deferToThreadWrapWithLogger(logger)
+    def _loadIdleHours(self):
+        ormSession = self._dbSessionCreator()
+        try:
+            return globalSetting(ormSession, STALE_SESSION_IDLE_HOURS)
+
+        finally:
+            ormSession.close()
+
+    @deferToThreadWrapWithLogger(logger)
+    def _loadSessionPage(self, idleBefore: datetime, afterId: Optional[int]):
+        """ Load Session Page
+
+        :return: Up to DEVICE_DETAILS_CHUNK_SIZE of the sessions that logged in
+                    before idleBefore, in id order, after the afterId session.
+        """
+        ormSession = self._dbSessionCreator()
+        try:
+            qry = ormSession.query(UserLoggedIn.id, UserLoggedIn.deviceToken) \
+                .filter(UserLoggedIn.loggedInDateTime < idleBefore)
+
+            if afterId is not None:
+                qry = qry.filter(UserLoggedIn.id > afterId)
+
+            return qry \
+                .order_by(UserLoggedIn.id) \
+                .limit(self.DEVICE_DETAILS_CHUNK_SIZE) \
+                .all()
+
+        finally:
+            ormSession.close()
+
+    def _pause(self) -> Deferred:
+        return deferLater(reactor, self.CHUNK_PAUSE_SECS, lambda: None)
+
+    @staticmethod
+    def _chunks(items: List, size: int):
+        for index in range(0, len(items), size):
+            yield items[index:index + size]
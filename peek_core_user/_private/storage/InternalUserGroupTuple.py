@@ -39,4 +39,5 @@ class InternalUserGroupTuple(Tuple, DeclarativeBase):
 
     __table_args__ = (
         Index("idx_InternalUserGroup_map", userId, groupId, unique=True),
+        Index("idx_InternalUserGroup_groupId", groupId),
     )
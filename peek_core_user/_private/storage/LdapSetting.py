@@ -31,3 +31,12 @@ class LdapSetting(Tuple, DeclarativeBase):
     adminEnabled = Column(Boolean, nullable=False, server_default='0')
     desktopEnabled = Column(Boolean, nullable=False, server_default='0')
     mobileEnabled = Column(Boolean, nullable=False, server_default='0')
+
+    #: Copy the users and their groups from this LDAP server on a schedule
+    syncEnabled = Column(Boolean, nullable=False, server_default='0')
+
+    #: The account the directory sync binds as, logins bind as the user instead
+    syncUserName = Column(String, nullable=True)
+
+    #: Write only, the admin backend never sends this back to the admin app
+    syncPassword = Column(String, nullable=True)
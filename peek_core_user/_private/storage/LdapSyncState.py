@@ -0,0 +1,41 @@
+import logging
+
+from sqlalchemy import Column, DateTime, ForeignKey
+from sqlalchemy import Integer, String, BigInteger
+from vortex.Tuple import Tuple, addTupleType
+
+from peek_core_user._private.PluginNames import userPluginTuplePrefix
+from peek_core_user._private.storage.DeclarativeBase import DeclarativeBase
+
+logger = logging.getLogger(__name__)
+
+
+@addTupleType
+class LdapSyncState(Tuple, DeclarativeBase):
+    """ LDAP Sync State
+
+    This table stores how far the directory sync has got for each LDAP setting,
+    so the next sync only loads the users that have changed since.
+
+    It's kept apart from LdapSetting, so saving the LDAP settings in the admin app
+    doesn't overwrite it.
+
+    """
+    __tupleType__ = userPluginTuplePrefix + 'LdapSyncStateTuple'
+    __tablename__ = 'LdapSyncState'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    ldapSettingId = Column(Integer,
+                           ForeignKey('LdapSetting.id', ondelete='CASCADE'),
+                           unique=True, nullable=False)
+
+    #: The dsServiceName of the server that was synced, AD update sequence numbers
+    # are only meaningful on the server that issued them
+    serverName = Column(String, nullable=True)
+
+    #: The highestCommittedUSN of the server when the last sync started
+    highestUsn = Column(BigInteger, nullable=True)
+
+    lastSyncDate = Column(DateTime(True), nullable=True)
+    lastFullSyncDate = Column(DateTime(True), nullable=True)
@@ -1,3 +1,8 @@
+import logging
+from threading import Lock
+from time import monotonic
+from typing import Optional
+
 from peek_core_user._private.PluginNames import userPluginTuplePrefix
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.orm import relationship
@@ -27,6 +32,8 @@ from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy import event
 from sqlalchemy import literal_column
 
+logger = logging.getLogger(__name__)
+
 
 class ProxiedDictMixin(object):
     """Adds obj[key] access to a mapped class.
@@ -208,26 +215,68 @@ class PropertyKey(object):
         return self.name
 
 
-def _getSetting(ormSession, name, propertyDict, key=None, value=None):
+def _seedSetting(ormSession, name, propertyDict) -> None:
+    """ Seed Setting
+
+    Create the setting and any of its missing properties with their default values.
+
+    This is the only place settings are created, it's called once at startup so that
+    the read path never has to write.
+
+    """
     all = ormSession.query(Setting).filter(Setting.name == name).all()
 
     if all:
         setting = all[0]
-        ormSession.expire(setting)
     else:
         setting = Setting(name)
         ormSession.add(setting)
-        ormSession.commit()
 
-    needsCommit = False
+    addedNames = []
 
     for prop in list(propertyDict.values()):
         if not prop.name in setting:
             setting[prop.name] = prop.defaultValue
-            needsCommit = True
+            addedNames.append(prop.name)
+
+    ormSession.commit()
+
+    if addedNames:
+        logger.info("Seeded setting %s defaults for %s", name, ', '.join(addedNames))
+
+
+def _loadSettingValues(ormSession, name, propertyDict) -> dict:
+    """ Load Setting Values
+
+    Load the values of all the properties for a setting, with a single SELECT.
+
+    Properties that are not in the DB yet get their default value, they are not
+    written, see `_seedSetting`.
+
+    """
+    props = (
+        ormSession.query(SettingProperty)
+            .join(Setting, Setting.id == SettingProperty.settingId)
+            .filter(Setting.name == name)
+            .all()
+    )
+
+    values = {prop.name: prop.defaultValue for prop in propertyDict.values()}
+    for prop in props:
+        if prop.key in propertyDict:
+            values[prop.key] = prop.value
+
+    return values
+
+
+def _getSetting(ormSession, name, propertyDict, key=None, value=None):
+    all = ormSession.query(Setting).filter(Setting.name == name).all()
 
-    if needsCommit:
-        ormSession.commit()
+    if not all:
+        raise Exception("Setting %s has not been seeded, see seedSettings()" % name)
+
+    setting = all[0]
+    ormSession.expire(setting)
 
     if not key:
         return setting
@@ -236,6 +285,8 @@ def _getSetting(ormSession, name, propertyDict, key=None, value=None):
     assert str(key) in propertyDict, "Key %s is not defined in setting %s" % (key, name)
 
     if value is None:
+        if str(key) not in setting:
+            return propertyDict[str(key)].defaultValue
         return setting[key]
 
     setting[key] = value
@@ -245,6 +296,171 @@ def _getSetting(ormSession, name, propertyDict, key=None, value=None):
     return setting[key]
 
 
+class _SettingCache:
+    """ Setting Cache
+
+    This is a process wide snapshot of the setting values, keyed by setting name.
+
+    Reads are served from the snapshot, it's loaded from the DB on the first miss
+    and dropped whenever a setting is written, so the next read reloads it.
+
+    The invalidations only reach this process, the other processes, EG the celery
+    workers, see a change when their snapshot expires after `TTL_SECS`.
+
+    """
+
+    #: How long a loaded snapshot is used for
+    TTL_SECS = 30
+
+    def __init__(self):
+        self._lock = Lock()
+        self._valuesBySettingName = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name):
+        with self._lock:
+            entry = self._valuesBySettingName.get(name)
+            if entry is None or entry[1] < monotonic():
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return entry[0]
+
+    def generation(self) -> int:
+        """ Generation
+
+        :return: A number that changes on every invalidate, pass it to `set`.
+        """
+        with self._lock:
+            return self._generation
+
+    def set(self, name, values, generation: int) -> None:
+        """ Set
+
+        :param generation: The `generation` read before the values were loaded,
+                    the values aren't stored if there was an invalidate since.
+        """
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._valuesBySettingName[name] = (values, monotonic() + self.TTL_SECS)
+
+    def invalidate(self, name=None):
+        with self._lock:
+            self._generation += 1
+            if name is None:
+                self._valuesBySettingName.clear()
+            else:
+                self._valuesBySettingName.pop(name, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses)
+
+
+_settingCache = _SettingCache()
+
+
+class SettingSnapshot:
+    """ Setting Snapshot
+
+    An immutable set of setting values, returned from `globalSettings`.
+
+    Access the values with the PropertyKeys, EG ::
+
+            settings = globalSettings(ormSession, [LDAP_AUTH_ENABLED])
+            if settings[LDAP_AUTH_ENABLED]:
+                ...
+
+    """
+    __slots__ = ("_settingName", "_values")
+
+    def __init__(self, settingName: str, values: dict):
+        object.__setattr__(self, "_settingName", settingName)
+        object.__setattr__(self, "_values", dict(values))
+
+    def __getitem__(self, key):
+        try:
+            return self._values[str(key)]
+        except KeyError:
+            raise KeyError("Key %s was not loaded from setting %s"
+                           % (key, self._settingName))
+
+    def __contains__(self, key):
+        return str(key) in self._values
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SettingSnapshot is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("SettingSnapshot is immutable")
+
+    def __repr__(self):
+        return "SettingSnapshot(%r, %r)" % (self._settingName, self._values)
+
+
+def _getCachedSettings(ormSession, name, propertyDict, keys) -> SettingSnapshot:
+    for key in keys:
+        assert str(key) in propertyDict, \
+            "Key %s is not defined in setting %s" % (key, name)
+
+    values = _settingCache.get(name)
+    if values is None:
+        # Read before loading, so a write during the load isn't cached over
+        generation = _settingCache.generation()
+        values = _loadSettingValues(ormSession, name, propertyDict)
+        _settingCache.set(name, values, generation)
+
+    return SettingSnapshot(name, {str(key): values[str(key)] for key in keys})
+
+
+def _getCachedSettingsOnly(name, propertyDict, keys) -> Optional[SettingSnapshot]:
+    for key in keys:
+        assert str(key) in propertyDict, \
+            "Key %s is not defined in setting %s" % (key, name)
+
+    values = _settingCache.get(name)
+    if values is None:
+        return None
+
+    return SettingSnapshot(name, {str(key): values[str(key)] for key in keys})
+
+
+def _getCachedSetting(ormSession, name, propertyDict, key=None, value=None):
+    # Writes and full Setting object requests go to the DB
+    if not key or value is not None:
+        # The write is committed by _getSetting, before the cache is invalidated
+        result = _getSetting(ormSession, name, propertyDict, key=key, value=value)
+        if value is not None:
+            _settingCache.invalidate(name)
+        return result
+
+    return _getCachedSettings(ormSession, name, propertyDict, [key])[key]
+
+
+def invalidateSettingCache(name=None) -> None:
+    """ Invalidate Setting Cache
+
+    Call this after committing changes to the setting tables from outside of
+    the setting functions in this module, EG, the admin settings handler.
+
+    :param name: The name of the setting to drop, or None for all of them.
+    """
+    _settingCache.invalidate(name)
+    logger.debug("Setting cache invalidated, %s", _settingCache.stats())
+
+
+def settingCacheStats() -> dict:
+    """ Setting Cache Stats
+
+    :return: A dict with the "hits" and "misses" counts of the setting cache.
+    """
+    return _settingCache.stats()
+
+
 # =============================================================================
 # GLOBAL PROPERTIES
 # =============================================================================
@@ -253,7 +469,45 @@ globalProperties = {}
 
 
 def globalSetting(ormSession, key=None, value=None):
-    return _getSetting(ormSession, "Global", globalProperties, key=key, value=value)
+    return _getCachedSetting(ormSession, "Global", globalProperties,
+                             key=key, value=value)
+
+
+def globalSettings(ormSession, keys) -> SettingSnapshot:
+    """ Global Settings
+
+    Load multiple global setting values at once.
+
+    :param ormSession: The session to load the values with, if they aren't cached.
+    :param keys: A list of the PropertyKeys to load.
+    :return: A SettingSnapshot of the requested values.
+    """
+    return _getCachedSettings(ormSession, "Global", globalProperties, keys)
+
+
+def cachedGlobalSettings(keys) -> Optional[SettingSnapshot]:
+    """ Cached Global Settings
+
+    Read global setting values from the cache only, without a database session,
+    so they can be read on the reactor thread.
+
+    :param keys: A list of the PropertyKeys to read.
+    :return: A SettingSnapshot of the requested values, or None if the cached
+                values have expired, or haven't been loaded yet.
+    """
+    return _getCachedSettingsOnly("Global", globalProperties, keys)
+
+
+def seedSettings(ormSession) -> None:
+    """ Seed Settings
+
+    Create all the settings with their default values, if they don't exist.
+
+    This is called once from the server and worker entry hooks start methods.
+
+    """
+    _seedSetting(ormSession, "Global", globalProperties)
+    _settingCache.invalidate()
 
 
 MOBILE_LOGIN_GROUP = PropertyKey('Mobile Login Group', 'peek-mobile-login',
@@ -286,3 +540,78 @@ INTERNAL_AUTH_ENABLED_FOR_OFFICE = PropertyKey('Internal Auth Enabled For Office
 LDAP_AUTH_ENABLED = PropertyKey('LDAP Auth Enabled',
                                 False,
                                 propertyDict=globalProperties)
+
+LOGIN_MAX_CONCURRENCY = PropertyKey('Login Max Concurrency',
+                                    10,
+                                    propertyDict=globalProperties)
+
+LOGIN_MAX_QUEUE_DEPTH = PropertyKey('Login Max Queue Depth',
+                                    1000,
+                                    propertyDict=globalProperties)
+
+LOGIN_MAX_QUEUE_WAIT_SECS = PropertyKey('Login Max Queue Wait Seconds',
+                                        30,
+                                        propertyDict=globalProperties)
+
+LOGGED_IN_STATUS_UPDATE_WINDOW_SECS = PropertyKey('Logged In Status Update Window Seconds',
+                                                  2,
+                                                  propertyDict=globalProperties)
+
+STALE_SESSION_IDLE_HOURS = PropertyKey('Stale Session Idle Hours',
+                                       72,
+                                       propertyDict=globalProperties)
+
+LDAP_CREDENTIAL_CACHE_ENABLED = PropertyKey('LDAP Credential Cache Enabled',
+                                            False,
+                                            propertyDict=globalProperties)
+
+LDAP_CREDENTIAL_CACHE_TTL_SECS = PropertyKey('LDAP Credential Cache TTL Seconds',
+                                             900,
+                                             propertyDict=globalProperties)
+
+LDAP_CONNECTION_POOL_MAX_SIZE = PropertyKey('LDAP Connection Pool Max Size',
+                                            10,
+                                            propertyDict=globalProperties)
+
+LDAP_TRY_SERVERS_CONCURRENTLY = PropertyKey('LDAP Try Servers Concurrently',
+                                            False,
+                                            propertyDict=globalProperties)
+
+LDAP_NETWORK_TIMEOUT_SECS = PropertyKey('LDAP Network Timeout Seconds',
+                                        5,
+                                        propertyDict=globalProperties)
+
+LDAP_OPERATION_TIMEOUT_SECS = PropertyKey('LDAP Operation Timeout Seconds',
+                                          10,
+                                          propertyDict=globalProperties)
+
+LDAP_BREAKER_FAILURE_THRESHOLD = PropertyKey('LDAP Breaker Failure Threshold',
+                                             3,
+                                             propertyDict=globalProperties)
+
+LDAP_BREAKER_COOLDOWN_SECS = PropertyKey('LDAP Breaker Cooldown Seconds',
+                                         60,
+                                         propertyDict=globalProperties)
+
+LDAP_USE_REACTOR_CLIENT = PropertyKey('LDAP Use Reactor Client',
+                                      False,
+                                      propertyDict=globalProperties)
+
+LDAP_SYNC_PERIOD_MINS = PropertyKey('LDAP Sync Period Minutes',
+                                    60,
+                                    propertyDict=globalProperties)
+
+#: The syncs between the full syncs also load the groups that have changed, to
+#: pick up their members being added or removed. Nested group changes, and users
+#: moved out of the search folders, lag until the next full sync.
+LDAP_SYNC_FULL_PERIOD_HOURS = PropertyKey('LDAP Sync Full Period Hours',
+                                          24,
+                                          propertyDict=globalProperties)
+
+PASSWORD_HASH_ITERATIONS = PropertyKey('Password Hash Iterations',
+                                       310000,
+                                       propertyDict=globalProperties)
+
+PASSWORD_HASH_PROCESSES = PropertyKey('Password Hash Processes',
+                                      0,
+                                      propertyDict=globalProperties)
@@ -0,0 +1,172 @@
+import logging
+from typing import Dict, List
+
+from ldaptor.inmemory import ReadOnlyInMemoryLDAPEntry
+from ldaptor.interfaces import IConnectedLDAPEntry
+from ldaptor.protocols import pureldap
+from ldaptor.protocols.ldap import ldaperrors
+from ldaptor.protocols.ldap.ldapserver import LDAPServer
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, DeferredList
+from twisted.internet.protocol import ServerFactory
+from twisted.python.components import registerAdapter
+
+logger = logging.getLogger(__name__)
+
+DOMAIN = "corp.example"
+BASE_DN = "DC=corp,DC=example"
+PEOPLE_OU = "People"
+
+USER_NAME = "alice"
+PASSWORD = "alice-password"
+GROUP_NAME = "Field Staff"
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class _StandInLdapServer(LDAPServer):
+    """ Stand In LDAP Server
+
+    Binds are checked against the factory's passwords by 'user@domain', the way
+    Active Directory accepts them, the searches use ldaptor's in memory directory.
+
+    """
+
+    def connectionMade(self):
+        LDAPServer.connectionMade(self)
+        self.factory.protocols.append(self)
+
+    def connectionLost(self, reason):
+        LDAPServer.connectionLost(self, reason)
+        self.factory.protocols.remove(self)
+        self.factory.lostDeferreds.pop(self).callback(None)
+
+    def handle_LDAPBindRequest(self, request, controls, reply):
+        self.factory.bindCount += 1
+
+        if self.factory.hang:
+            return Deferred()
+
+        who = _text(request.dn)
+
+        # An anonymous bind
+        if not who:
+            return pureldap.LDAPBindResponse(resultCode=0)
+
+        if self.factory.passwordsByUpn.get(who.lower()) != _text(request.auth):
+            return pureldap.LDAPBindResponse(
+                resultCode=ldaperrors.LDAPInvalidCredentials.resultCode
+            )
+
+        return pureldap.LDAPBindResponse(resultCode=0)
+
+    def handle_LDAPSearchRequest(self, request, controls, reply):
+        self.factory.searchCount += 1
+
+        if self.factory.hang:
+            return Deferred()
+
+        return LDAPServer.handle_LDAPSearchRequest(self, request, controls, reply)
+
+
+class LdapStandInServer(ServerFactory):
+    """ LDAP Stand In Server
+
+    An in process LDAP server for the tests, with one user in one OU ::
+
+            server = LdapStandInServer()
+            server.start()
+            ... connect to server.ldapUri ...
+            yield server.stop()
+
+    Set `hang` to True to make it stop answering binds and searches.
+
+    """
+    protocol = _StandInLdapServer
+
+    def __init__(self):
+        self.passwordsByUpn: Dict[str, str] = {
+            ("%s@%s" % (USER_NAME, DOMAIN)).lower(): PASSWORD
+        }
+        self.hang = False
+
+        self.bindCount = 0
+        self.searchCount = 0
+
+        self.protocols: List[_StandInLdapServer] = []
+        self.lostDeferreds: Dict[_StandInLdapServer, Deferred] = {}
+
+        self.root = self._makeDirectory()
+        self._port = None
+
+    def buildProtocol(self, addr):
+        proto = ServerFactory.buildProtocol(self, addr)
+        self.lostDeferreds[proto] = Deferred()
+        return proto
+
+    @property
+    def ldapUri(self) -> str:
+        return "ldap://127.0.0.1:%s" % self._port.getHost().port
+
+    def start(self) -> None:
+        self._port = reactor.listenTCP(0, self, interface="127.0.0.1")
+
+    def stop(self) -> Deferred:
+        """ Stop
+
+        :return: A Deferred that fires when the port and every connection is closed.
+        """
+        deferreds = list(self.lostDeferreds.values())
+
+        for proto in list(self.protocols):
+            proto.transport.abortConnection()
+
+        deferreds.append(self._port.stopListening())
+        return DeferredList(deferreds)
+
+    @staticmethod
+    def _makeDirectory() -> ReadOnlyInMemoryLDAPEntry:
+        root = ReadOnlyInMemoryLDAPEntry(
+            dn=BASE_DN.encode(),
+            attributes={b'objectClass': [b'top', b'domain']}
+        )
+
+        people = root.addChild(
+            rdn=("OU=%s" % PEOPLE_OU).encode(),
+            attributes={b'objectClass': [b'top', b'organizationalUnit']}
+        )
+
+        people.addChild(
+            rdn=("CN=%s" % USER_NAME).encode(),
+            attributes={
+                b'objectClass': [b'top', b'person', b'user'],
+                b'objectCategory': [b'person'],
+                b'sAMAccountName': [USER_NAME.encode()],
+                b'displayName': [b'Alice Example'],
+                b'userPrincipalName': [("%s@%s" % (USER_NAME, DOMAIN)).encode()],
+                b'distinguishedName': [
+                    ("CN=%s,OU=%s,%s" % (USER_NAME, PEOPLE_OU, BASE_DN)).encode()
+                ],
+                b'memberOf': [
+                    ("CN=%s,OU=Groups,%s" % (GROUP_NAME, BASE_DN)).encode()
+                ],
+            }
+        )
+
+        return root
+
+
+registerAdapter(lambda factory: factory.root, LdapStandInServer, IConnectedLDAPEntry)
+
+
+def closedLdapUri() -> str:
+    """ Closed LDAP URI
+
+    :return: An LDAP URI on a local port that nothing is listening on.
+    """
+    port = reactor.listenTCP(0, ServerFactory(), interface="127.0.0.1")
+    portNum = port.getHost().port
+    port.stopListening()
+    return "ldap://127.0.0.1:%s" % portNum
@@ -0,0 +1,145 @@
+from twisted.cred.error import LoginFailed
+from twisted.internet.defer import inlineCallbacks
+from twisted.trial import unittest
+
+from peek_core_user._private.server.auth_connectors.InternalAuth import InternalAuth
+from peek_core_user._private.server.auth_connectors.LdapCircuitBreaker import \
+    ldapCircuitBreakers
+from peek_core_user._private.server.auth_connectors.LdapReactorAuth import \
+    LdapReactorAuth
+from peek_core_user._private.server.auth_connectors.LdapReactorClient import \
+    closeLdapReactorConnectionPools, reactorClientSupported
+from peek_core_user._private.server.auth_connectors.LdapSearchPlan import \
+    forgetLdapSearchPlans
+from peek_core_user._private.server.controller.LoginWorkQueue import LoginWorkQueue
+from peek_core_user._private.storage.LdapSetting import LdapSetting
+from peek_core_user._private.storage.Setting import SettingSnapshot, \
+    invalidateSettingCache, \
+    LDAP_CONNECTION_POOL_MAX_SIZE, LDAP_NETWORK_TIMEOUT_SECS, \
+    LDAP_OPERATION_TIMEOUT_SECS, LDAP_BREAKER_FAILURE_THRESHOLD, \
+    LDAP_BREAKER_COOLDOWN_SECS, LDAP_TRY_SERVERS_CONCURRENTLY
+from peek_core_user._private.tests.LdapStandInServer import LdapStandInServer, \
+    closedLdapUri, DOMAIN, GROUP_NAME, PASSWORD, PEOPLE_OU, USER_NAME
+
+
+def _makeLdapSetting(ldapSettingId: int, ldapUri: str) -> LdapSetting:
+    return LdapSetting(id=ldapSettingId,
+                       ldapTitle="Stand In %s" % ldapSettingId,
+                       ldapDomain=DOMAIN,
+                       ldapUri=ldapUri,
+                       ldapOUFolders=PEOPLE_OU,
+                       ldapCNFolders=None,
+                       ldapGroups=None,
+                       adminEnabled=True,
+                       desktopEnabled=True,
+                       mobileEnabled=True)
+
+
+def _makeSettings() -> SettingSnapshot:
+    return SettingSnapshot("Global", {
+        str(LDAP_CONNECTION_POOL_MAX_SIZE): 2,
+        str(LDAP_NETWORK_TIMEOUT_SECS): 2,
+        str(LDAP_OPERATION_TIMEOUT_SECS): 1,
+        str(LDAP_BREAKER_FAILURE_THRESHOLD): 5,
+        str(LDAP_BREAKER_COOLDOWN_SECS): 30,
+        str(LDAP_TRY_SERVERS_CONCURRENTLY): True,
+    })
+
+
+class LdapReactorAuthTest(unittest.TestCase):
+    """ LDAP Reactor Auth Test
+
+    These tests drive the LDAP part of the login, the database parts,
+    `_prepareBlocking` and `_finishBlocking`, aren't used.
+
+    """
+    if not reactorClientSupported():
+        skip = "python-ldap doesn't support OPT_CONNECT_ASYNC"
+
+    def setUp(self):
+        self.server = LdapStandInServer()
+        self.server.start()
+
+        self.goodSetting = _makeLdapSetting(1, self.server.ldapUri)
+        self.deadSetting = _makeLdapSetting(2, closedLdapUri())
+
+        self.settings = _makeSettings()
+        self.auth = LdapReactorAuth(dbSessionCreator=None, workQueue=None)
+
+    def tearDown(self):
+        closeLdapReactorConnectionPools()
+        forgetLdapSearchPlans()
+        ldapCircuitBreakers.forget()
+        return self.server.stop()
+
+    @inlineCallbacks
+    def testCheckPassWithoutCachedSettingsIsLeftToTheThread(self):
+        # There is no work queue, so this fails if any work is queued
+        invalidateSettingCache()
+        result = yield self.auth.checkPass(USER_NAME, PASSWORD,
+                                           InternalAuth.FOR_OFFICE,
+                                           LoginWorkQueue.PRIORITY_OFFICE)
+
+        self.assertIsNone(result)
+
+    @inlineCallbacks
+    def testLdapLoginSucceeds(self):
+        result = yield self.auth._tryLdapAsync(USER_NAME, PASSWORD,
+                                               self.goodSetting, self.settings)
+
+        self.assertEqual(result.ldapSettingId, self.goodSetting.id)
+        self.assertEqual(list(result.groups), [GROUP_NAME])
+        self.assertEqual(result.userTitle, "Alice Example")
+
+    @inlineCallbacks
+    def testLdapLoginWithWrongPasswordFails(self):
+        yield self.assertFailure(
+            self.auth._tryLdapAsync(USER_NAME, "wrong-password",
+                                    self.goodSetting, self.settings),
+            LoginFailed
+        )
+
+        # A wrong password doesn't count against the server
+        self.assertTrue(ldapCircuitBreakers.isAvailable(self.goodSetting))
+
+    @inlineCallbacks
+    def testLdapLoginOfUnknownUserFails(self):
+        self.server.passwordsByUpn["bob@%s" % DOMAIN] = "bob-password"
+
+        # The bind works, but bob isn't in the searched OU
+        yield self.assertFailure(
+            self.auth._tryLdapAsync("bob", "bob-password",
+                                    self.goodSetting, self.settings),
+            LoginFailed
+        )
+
+    @inlineCallbacks
+    def testConcurrentLoginUsesWorkingServer(self):
+        result, firstException = yield self.auth._tryConcurrentlyAsync(
+            USER_NAME, PASSWORD, [self.deadSetting, self.goodSetting],
+            self.settings
+        )
+
+        self.assertIsNone(firstException)
+        self.assertEqual(result.ldapSettingId, self.goodSetting.id)
+
+    @inlineCallbacks
+    def testConcurrentLoginReportsFirstFailure(self):
+        result, firstException = yield self.auth._tryConcurrentlyAsync(
+            USER_NAME, "wrong-password", [self.goodSetting, self.deadSetting],
+            self.settings
+        )
+
+        self.assertIsNone(result)
+        self.assertIsInstance(firstException, LoginFailed)
+        self.assertIn("incorrect", str(firstException))
+
+    @inlineCallbacks
+    def testSequentialLoginSkipsDeadServer(self):
+        result, firstException = yield self.auth._trySequentiallyAsync(
+            USER_NAME, PASSWORD, [self.deadSetting, self.goodSetting],
+            self.settings
+        )
+
+        self.assertIsNone(firstException)
+        self.assertEqual(result.ldapSettingId, self.goodSetting.id)
@@ -0,0 +1,130 @@
+import ldap
+from twisted.internet.defer import inlineCallbacks
+from twisted.trial import unittest
+
+from peek_core_user._private.server.auth_connectors.LdapReactorClient import \
+    LdapReactorConnection, LdapReactorConnectionPool, reactorClientSupported
+from peek_core_user._private.tests.LdapStandInServer import LdapStandInServer, \
+    BASE_DN, DOMAIN, PASSWORD, PEOPLE_OU, USER_NAME
+
+USER_UPN = "%s@%s" % (USER_NAME, DOMAIN)
+PEOPLE_BASE = "OU=%s,%s" % (PEOPLE_OU, BASE_DN)
+USER_FILTER = "(sAMAccountName=%s)" % USER_NAME
+
+
+class LdapReactorConnectionTest(unittest.TestCase):
+    if not reactorClientSupported():
+        skip = "python-ldap doesn't support OPT_CONNECT_ASYNC"
+
+    def setUp(self):
+        self.server = LdapStandInServer()
+        self.server.start()
+        self.conn = LdapReactorConnection(self.server.ldapUri, 2, 1)
+
+    def tearDown(self):
+        self.conn.close()
+        return self.server.stop()
+
+    @inlineCallbacks
+    def testBindSucceeds(self):
+        yield self.conn.bind(USER_UPN, PASSWORD)
+        self.assertFalse(self.conn.broken)
+
+    @inlineCallbacks
+    def testBindWithWrongPasswordFails(self):
+        yield self.assertFailure(self.conn.bind(USER_UPN, "wrong-password"),
+                                 ldap.INVALID_CREDENTIALS)
+
+        # The server answered, the connection can still be used
+        self.assertFalse(self.conn.broken)
+
+    @inlineCallbacks
+    def testSearchFindsUser(self):
+        yield self.conn.bind(USER_UPN, PASSWORD)
+        results = yield self.conn.search(PEOPLE_BASE, ldap.SCOPE_SUBTREE,
+                                         USER_FILTER, ['displayName', 'memberOf'])
+
+        self.assertEqual(len(results), 1)
+        dn, attrs = results[0]
+        self.assertEqual(attrs['displayName'], [b'Alice Example'])
+
+    @inlineCallbacks
+    def testSearchTimesOut(self):
+        yield self.conn.bind(USER_UPN, PASSWORD)
+        self.server.hang = True
+
+        yield self.assertFailure(
+            self.conn.search(PEOPLE_BASE, ldap.SCOPE_SUBTREE, USER_FILTER,
+                             ['displayName']),
+            ldap.TIMEOUT
+        )
+
+        # A connection with an abandoned operation isn't reused
+        self.assertTrue(self.conn.broken)
+
+    @inlineCallbacks
+    def testCloseFailsPendingOperations(self):
+        yield self.conn.bind(USER_UPN, PASSWORD)
+        self.server.hang = True
+
+        d = self.conn.search(PEOPLE_BASE, ldap.SCOPE_SUBTREE, USER_FILTER,
+                             ['displayName'])
+        self.conn.close()
+
+        yield self.assertFailure(d, ldap.SERVER_DOWN)
+
+
+class LdapReactorConnectionPoolTest(unittest.TestCase):
+    if not reactorClientSupported():
+        skip = "python-ldap doesn't support OPT_CONNECT_ASYNC"
+
+    def setUp(self):
+        self.server = LdapStandInServer()
+        self.server.start()
+        self.pool = LdapReactorConnectionPool(self.server.ldapUri, 2, 2, 1)
+
+    def tearDown(self):
+        self.pool.close()
+        return self.server.stop()
+
+    @inlineCallbacks
+    def testCheckinReturnsConnectionWithoutBinding(self):
+        conn = yield self.pool.checkout()
+        yield conn.bind(USER_UPN, PASSWORD)
+        bindCount = self.server.bindCount
+
+        self.pool.checkin(conn)
+
+        # The connection isn't reset with an anonymous bind, the next login's
+        # bind replaces the identity
+        self.assertEqual(self.server.bindCount, bindCount)
+
+        reusedConn = yield self.pool.checkout()
+        self.assertIs(reusedConn, conn)
+        self.pool.checkin(reusedConn)
+
+    @inlineCallbacks
+    def testCheckinDropsBrokenConnection(self):
+        conn = yield self.pool.checkout()
+        yield conn.bind(USER_UPN, PASSWORD)
+
+        self.server.hang = True
+        yield self.assertFailure(
+            conn.search(PEOPLE_BASE, ldap.SCOPE_SUBTREE, USER_FILTER,
+                        ['displayName']),
+            ldap.TIMEOUT
+        )
+        self.server.hang = False
+
+        self.pool.checkin(conn)
+
+        newConn = yield self.pool.checkout()
+        self.assertIsNot(newConn, conn)
+        self.pool.checkin(newConn)
+
+    @inlineCallbacks
+    def testCheckinReleasesSlot(self):
+        # The pool has two slots, checking out more than two needs the checkins
+        for _ in range(5):
+            conn = yield self.pool.checkout()
+            self.pool.checkin(conn)
@@ -0,0 +1,43 @@
+from threading import Event
+
+from twisted.internet.defer import inlineCallbacks
+from twisted.trial import unittest
+
+from peek_core_user._private.server.controller.LoginWorkQueue import \
+    LoginWorkQueue, LoginServerBusyError
+
+
+class LoginWorkQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.queue = LoginWorkQueue(maxConcurrency=1, maxQueueDepth=10,
+                                    maxQueueWaitSecs=0.2)
+        self.release = Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.queue.shutdown()
+
+    @inlineCallbacks
+    def testQueuedCallIsRejectedWhileTheThreadIsHung(self):
+        hungD = self.queue.run(LoginWorkQueue.PRIORITY_OFFICE,
+                               self.release.wait, 10)
+
+        # The only thread never finishes, the timer still rejects this call
+        yield self.assertFailure(
+            self.queue.run(LoginWorkQueue.PRIORITY_OFFICE, lambda: None),
+            LoginServerBusyError
+        )
+
+        self.assertEqual(self.queue.queueDepth, 0)
+        self.assertEqual(self.queue.rejectedCount, 1)
+
+        self.release.set()
+        yield hungD
+
+    @inlineCallbacks
+    def testDispatchedCallIsNotRejected(self):
+        result = yield self.queue.run(LoginWorkQueue.PRIORITY_OFFICE,
+                                      lambda: "done")
+
+        self.assertEqual(result, "done")
+        self.assertEqual(self.queue.rejectedCount, 0)
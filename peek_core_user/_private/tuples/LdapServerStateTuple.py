@@ -0,0 +1,41 @@
+import logging
+from datetime import datetime
+
+from vortex.Tuple import addTupleType, Tuple, TupleField
+
+from peek_core_user._private.PluginNames import userPluginTuplePrefix
+
+logger = logging.getLogger(__name__)
+
+
+@addTupleType
+class LdapServerStateTuple(Tuple):
+    """ LDAP Server State Tuple
+
+      This tuple is used by the "LDAP Servers" admin screen, it shows the circuit
+      breaker state of each LDAP server.
+
+    """
+    __tupleType__ = userPluginTuplePrefix + "LdapServerStateTuple"
+
+    STATE_CLOSED = "closed"
+    STATE_OPEN = "open"
+
+    ldapSettingId: int = TupleField()
+    ldapTitle: str = TupleField()
+    ldapUri: str = TupleField()
+
+    #:  "closed" when logins use the server, "open" when they skip it
+    state: str = TupleField()
+
+    #:  The number of logins in a row that failed to reach the server
+    consecutiveFailures: int = TupleField()
+
+    #:  When the server was last skipped
+    openedDate: datetime = TupleField()
+
+    #:  The last error from the server
+    lastError: str = TupleField()
+
+    #:  When the background probe last checked the server
+    lastProbeDate: datetime = TupleField()
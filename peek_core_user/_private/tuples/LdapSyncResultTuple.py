@@ -0,0 +1,27 @@
+import logging
+from typing import List
+
+from peek_core_user._private.PluginNames import userPluginTuplePrefix
+from vortex.Tuple import addTupleType, Tuple, TupleField
+
+logger = logging.getLogger(__name__)
+
+
+@addTupleType
+class LdapSyncResultTuple(Tuple):
+    __tupleType__ = userPluginTuplePrefix + "LdapSyncResultTuple"
+
+    usersUpserted: int = TupleField()
+    groupsAdded: int = TupleField()
+    membershipsAdded: int = TupleField()
+    membershipsRemoved: int = TupleField()
+
+    #: The titles of the LDAP settings that had a full sync, rather than incremental
+    fullSyncTitles: List[str] = TupleField()
+
+    errors: List[str] = TupleField()
+
+    @property
+    def hasChanges(self) -> bool:
+        return bool(self.usersUpserted or self.groupsAdded
+                    or self.membershipsAdded or self.membershipsRemoved)
@@ -0,0 +1,41 @@
+import logging
+from typing import List
+
+from vortex.Tuple import addTupleType, Tuple, TupleField
+
+from peek_core_user._private.PluginNames import userPluginTuplePrefix
+from peek_core_user._private.tuples.LoggedInUserStatusTuple import \
+    LoggedInUserStatusTuple
+
+logger = logging.getLogger(__name__)
+
+
+@addTupleType
+class LoggedInUserStatusDeltaTuple(Tuple):
+    """ Logged In User Status Delta Tuple
+
+      This tuple is used by the "Managed LoggedIn User" admin screen, it contains
+      the changes to the logged in users, keyed by device token.
+
+      Subscribe with the selector {"snapshot": True} to get all the rows once,
+      then with the selector {} to get the changes.
+
+      The deltas are numbered, a delta should be applied to a snapshot or delta with
+      a seq one less than it. If a delta is missed, poll with the selector
+      {"sinceSeq": seq}, this returns the missed deltas, or a snapshot if the
+      server no longer has them.
+
+    """
+    __tupleType__ = userPluginTuplePrefix + "LoggedInUserStatusDeltaTuple"
+
+    #:  The sequence number of this delta, or of the view this snapshot was taken from
+    seq: int = TupleField()
+
+    #:  Is this a full snapshot of the view, rather than changes
+    isSnapshot: bool = TupleField()
+
+    #:  The rows that have been added or changed
+    upserts: List[LoggedInUserStatusTuple] = TupleField()
+
+    #:  The device tokens of the rows that have been removed
+    removedDeviceTokens: List[str] = TupleField()
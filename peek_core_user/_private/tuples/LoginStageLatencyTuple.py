@@ -0,0 +1,40 @@
+import logging
+from typing import List
+
+from vortex.Tuple import addTupleType, Tuple, TupleField
+
+from peek_core_user._private.PluginNames import userPluginTuplePrefix
+
+logger = logging.getLogger(__name__)
+
+
+@addTupleType
+class LoginStageLatencyTuple(Tuple):
+    """ Login Stage Latency Tuple
+
+      This tuple is sent to the admin app, it contains the rolling latency
+      histogram for one stage of the login or logout process.
+
+    """
+    __tupleType__ = userPluginTuplePrefix + "LoginStageLatencyTuple"
+
+    #:  The name of the stage, EG 'login.checkPass'
+    stageName: str = TupleField()
+
+    #:  The number of samples in the window
+    count: int = TupleField()
+
+    #:  The length of the rolling window, in seconds
+    windowSecs: int = TupleField()
+
+    meanMs: float = TupleField()
+    p50Ms: float = TupleField()
+    p95Ms: float = TupleField()
+    p99Ms: float = TupleField()
+    maxMs: float = TupleField()
+
+    #:  The upper bounds of the histogram buckets, the last bucket has no bound
+    bucketUpperMs: List[float] = TupleField()
+
+    #:  The number of samples in each histogram bucket
+    bucketCounts: List[int] = TupleField()
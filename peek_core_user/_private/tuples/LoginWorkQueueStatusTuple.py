@@ -0,0 +1,31 @@
+import logging
+
+from vortex.Tuple import addTupleType, Tuple, TupleField
+
+from peek_core_user._private.PluginNames import userPluginTuplePrefix
+
+logger = logging.getLogger(__name__)
+
+
+@addTupleType
+class LoginWorkQueueStatusTuple(Tuple):
+    """ Login Work Queue Status Tuple
+
+      This tuple is sent to the admin app, it contains the current state of the
+      LoginWorkQueue, the thread pool the logins, logouts and admin auth run on.
+
+    """
+    __tupleType__ = userPluginTuplePrefix + "LoginWorkQueueStatusTuple"
+
+    #:  The number of calls waiting for a thread
+    queueDepth: int = TupleField()
+
+    #:  The number of calls running in the threads
+    runningCount: int = TupleField()
+
+    #:  The number of calls rejected since the server started
+    rejectedCount: int = TupleField()
+
+    #:  The configured limits, LOGIN_MAX_QUEUE_DEPTH and LOGIN_MAX_CONCURRENCY
+    maxQueueDepth: int = TupleField()
+    maxConcurrency: int = TupleField()
@@ -1,12 +1,14 @@
 import logging
 
+from peek_plugin_base.worker import CeleryDbConn
 from peek_plugin_base.worker.PluginWorkerEntryHookABC import PluginWorkerEntryHookABC
 from peek_core_user._private.storage.DeclarativeBase import loadStorageTuples
+from peek_core_user._private.storage.Setting import seedSettings
 from peek_core_user._private.tuples import loadPrivateTuples
 from peek_core_user.tuples import loadPublicTuples
 
 from peek_core_user._private.worker.tasks import UserImportInternalGroupTask, \
-    UserImportInternalUserTask
+    UserImportInternalUserTask, LdapDirectorySyncTask
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +22,13 @@ class WorkerEntryHook(PluginWorkerEntryHookABC):
         logger.debug("loaded")
 
     def start(self):
+        # Create the default settings, so the settings reads never have to write
+        dbSession = CeleryDbConn.getDbSession()
+        try:
+            seedSettings(dbSession)
+        finally:
+            dbSession.close()
+
         logger.debug("started")
 
     def stop(self):
@@ -31,5 +40,6 @@ class WorkerEntryHook(PluginWorkerEntryHookABC):
     @property
     def celeryAppIncludes(self):
         return [UserImportInternalGroupTask.__name__,
-                UserImportInternalUserTask.__name__]
+                UserImportInternalUserTask.__name__,
+                LdapDirectorySyncTask.__name__]
 
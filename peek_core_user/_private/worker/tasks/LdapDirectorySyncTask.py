@@ -0,0 +1,448 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+import ldap
+import pytz
+from ldap.controls import SimplePagedResultsControl
+from ldap.filter import escape_filter_chars
+from sqlalchemy import or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from txcelery.defer import DeferrableTask
+
+from peek_plugin_base.worker import CeleryDbConn
+from peek_core_user._private.server.auth_connectors.LdapConnectionPool import \
+    makeLdapConnection
+from peek_core_user._private.server.auth_connectors.LdapGroupWriter import \
+    ldapImportHash, writeLdapGroupsBlocking
+from peek_core_user._private.server.auth_connectors.LdapSearchPlan import \
+    ldapSearchPlan, LdapSearchPlan
+from peek_core_user._private.storage.InternalGroupTuple import InternalGroupTuple
+from peek_core_user._private.storage.InternalUserTuple import InternalUserTuple
+from peek_core_user._private.storage.LdapSetting import LdapSetting
+from peek_core_user._private.storage.LdapSyncState import LdapSyncState
+from peek_core_user._private.storage.Setting import globalSettings, \
+    LDAP_NETWORK_TIMEOUT_SECS, LDAP_OPERATION_TIMEOUT_SECS, \
+    LDAP_SYNC_FULL_PERIOD_HOURS, SettingSnapshot
+from peek_core_user._private.tuples.LdapSyncResultTuple import LdapSyncResultTuple
+from peek_plugin_base.worker.CeleryApp import celeryApp
+
+logger = logging.getLogger(__name__)
+
+#: The users the sync loads, the same users the login searches for
+USERS_FILTER = "(&(objectCategory=person)(objectClass=user))"
+
+#: The groups the incremental sync checks for membership changes
+GROUPS_FILTER = "(objectClass=group)"
+
+SYNC_ATTRIBUTES = LdapSearchPlan.ATTRIBUTES + ['sAMAccountName']
+
+GROUP_ATTRIBUTES = ['distinguishedName']
+
+PAGE_SIZE = 500
+
+#: The most user names searched for with one filter
+USER_NAME_FILTER_SIZE = 100
+
+#: Overlap the incremental syncs that use whenChanged, to allow for clock skew
+WHEN_CHANGED_OVERLAP = timedelta(minutes=5)
+
+
+@DeferrableTask
+@celeryApp.task(bind=True)
+def syncLdapDirectory(self) -> LdapSyncResultTuple:
+    """ Sync LDAP Directory
+
+    Copy the users, and the groups they are a member of, from each LDAP setting
+    with sync enabled into the internal directory.
+
+    A full sync is done every "LDAP Sync Full Period Hours", the syncs between
+    only load the users that have changed, using uSNChanged on Active Directory
+    and whenChanged otherwise.
+
+    Adding or removing a member changes the group, not the user, memberOf is a
+    back link. So the syncs between also load the groups that have changed, and
+    sync their members, and the users that were their members.
+
+    :param self: A celery reference to this task
+    :returns: The counts of what was synced.
+    """
+    startTime = datetime.now(pytz.utc)
+
+    result = LdapSyncResultTuple(usersUpserted=0,
+                                 groupsAdded=0,
+                                 membershipsAdded=0,
+                                 membershipsRemoved=0,
+                                 fullSyncTitles=[],
+                                 errors=[])
+
+    session = CeleryDbConn.getDbSession()
+    try:
+        settings = globalSettings(session, [LDAP_NETWORK_TIMEOUT_SECS,
+                                            LDAP_OPERATION_TIMEOUT_SECS,
+                                            LDAP_SYNC_FULL_PERIOD_HOURS])
+
+        ldapSettings = session.query(LdapSetting) \
+            .filter(LdapSetting.syncEnabled == True) \
+            .all()
+
+        for ldapSetting in ldapSettings:
+            try:
+                _syncLdapSetting(session, ldapSetting, settings, startTime, result)
+
+            except Exception as e:
+                session.rollback()
+                logger.error("LDAP sync of %s failed", ldapSetting.ldapTitle)
+                logger.exception(e)
+                result.errors.append("%s : %s" % (ldapSetting.ldapTitle, e))
+
+        logger.info("LDAP sync upserted %s users, added %s groups,"
+                    " added %s and removed %s memberships, in %s",
+                    result.usersUpserted, result.groupsAdded,
+                    result.membershipsAdded, result.membershipsRemoved,
+                    (datetime.now(pytz.utc) - startTime))
+
+        return result
+
+    finally:
+        session.close()
+
+
+def _syncLdapSetting(session, ldapSetting: LdapSetting, settings: SettingSnapshot,
+                     startTime: datetime, result: LdapSyncResultTuple) -> None:
+    plan = ldapSearchPlan(ldapSetting)
+    timeoutSecs = settings[LDAP_OPERATION_TIMEOUT_SECS]
+
+    syncState = session.query(LdapSyncState) \
+        .filter(LdapSyncState.ldapSettingId == ldapSetting.id) \
+        .one_or_none()
+
+    if not syncState:
+        syncState = LdapSyncState(ldapSettingId=ldapSetting.id)
+        session.add(syncState)
+
+    conn = makeLdapConnection(ldapSetting.ldapUri,
+                              settings[LDAP_NETWORK_TIMEOUT_SECS], timeoutSecs)
+    try:
+        conn.simple_bind_s(_syncBindName(ldapSetting), ldapSetting.syncPassword or '')
+
+        # Read where the server is up to before searching, so the changes made
+        # during this sync are loaded again by the next one
+        serverName, highestUsn = _readRootDse(conn, timeoutSecs)
+
+        changedFilter = _changedFilter(syncState, serverName, highestUsn,
+                                       settings[LDAP_SYNC_FULL_PERIOD_HOURS],
+                                       startTime)
+        ldapFilter = "(&%s%s)" % (USERS_FILTER, changedFilter or '')
+
+        syncedUserNames = set()
+        _syncUsers(conn, session, ldapSetting, plan, ldapFilter, timeoutSecs,
+                   syncedUserNames, result)
+
+        if changedFilter is not None:
+            _syncChangedGroups(conn, session, ldapSetting, plan, changedFilter,
+                               timeoutSecs, syncedUserNames, result)
+
+    finally:
+        try:
+            conn.unbind_s()
+        except ldap.LDAPError:
+            pass
+
+    syncState.serverName = serverName
+    syncState.highestUsn = highestUsn
+    syncState.lastSyncDate = startTime
+
+    if changedFilter is None:
+        syncState.lastFullSyncDate = startTime
+        result.fullSyncTitles.append(ldapSetting.ldapTitle)
+
+    session.commit()
+
+
+def _syncUsers(conn, session, ldapSetting: LdapSetting, plan: LdapSearchPlan,
+               ldapFilter: str, timeoutSecs: float, syncedUserNames: Set[str],
+               result: LdapSyncResultTuple) -> None:
+    """ Sync Users
+
+    Sync the users that match the filter in the search bases, the users already
+    in syncedUserNames are skipped, the synced users are added to it.
+
+    """
+    for ldapBase in plan.searchBases:
+        try:
+            for entries in _pagedSearch(conn, ldapBase, ldapFilter, timeoutSecs):
+                entries = [(dn, attrs) for dn, attrs in entries
+                           if _first(attrs, 'sAMAccountName') not in syncedUserNames]
+
+                _writeUsers(session, ldapSetting, plan, entries, result)
+                session.commit()
+
+                syncedUserNames.update(_first(attrs, 'sAMAccountName')
+                                       for _, attrs in entries)
+
+        except ldap.NO_SUCH_OBJECT:
+            logger.warning("CN or OU doesn't exist : %s", ldapBase)
+
+
+def _syncChangedGroups(conn, session, ldapSetting: LdapSetting,
+                       plan: LdapSearchPlan, changedFilter: str, timeoutSecs: float,
+                       syncedUserNames: Set[str], result: LdapSyncResultTuple) -> None:
+    """ Sync Changed Groups
+
+    Sync the members of the groups that have changed, and the users that were
+    their members, the removed members no longer have the group in memberOf.
+
+    """
+    importHash = ldapImportHash(ldapSetting)
+    groupFilter = "(&%s%s)" % (GROUPS_FILTER, changedFilter)
+
+    groupDns = []
+    for entries in _pagedSearch(conn, plan.domainBase, groupFilter, timeoutSecs,
+                                GROUP_ATTRIBUTES):
+        groupDns.extend(dn for dn, _ in entries)
+
+    for groupDn in groupDns:
+        memberFilter = "(&%s(memberOf=%s))" % (USERS_FILTER,
+                                               escape_filter_chars(groupDn))
+        _syncUsers(conn, session, ldapSetting, plan, memberFilter, timeoutSecs,
+                   syncedUserNames, result)
+
+        groupName = plan.groupNames([groupDn.encode()])[0]
+        formerUserNames = sorted(
+            _ldapGroupMemberNames(session, groupName, importHash) - syncedUserNames
+        )
+
+        for index in range(0, len(formerUserNames), USER_NAME_FILTER_SIZE):
+            userNames = formerUserNames[index:index + USER_NAME_FILTER_SIZE]
+            nameFilter = "(&%s(|%s))" % (
+                USERS_FILTER,
+                ''.join('(sAMAccountName=%s)' % escape_filter_chars(userName)
+                        for userName in userNames)
+            )
+            _syncUsers(conn, session, ldapSetting, plan, nameFilter, timeoutSecs,
+                       syncedUserNames, result)
+
+
+def _ldapGroupMemberNames(session, groupName: str, importHash: str) -> Set[str]:
+    """ LDAP Group Member Names
+
+    :return: The user names of the members of the group, if the LDAP setting
+                owns the group.
+    """
+    rows = session.query(InternalUserTuple.userName) \
+        .join(InternalUserTuple.groups) \
+        .filter(InternalGroupTuple.groupName == groupName) \
+        .filter(InternalGroupTuple.importHash == importHash) \
+        .all()
+
+    return set(row.userName for row in rows)
+
+
+def _syncBindName(ldapSetting: LdapSetting) -> str:
+    syncUserName = ldapSetting.syncUserName or ''
+
+    # A DN, 'user@domain' or 'DOMAIN\user' are used as they are
+    if '=' in syncUserName or '@' in syncUserName or '\\' in syncUserName:
+        return syncUserName
+
+    return '%s@%s' % (syncUserName, ldapSetting.ldapDomain)
+
+
+def _readRootDse(conn, timeoutSecs: float) -> Tuple[Optional[str], Optional[int]]:
+    """ Read Root DSE
+
+    :return: A tuple of the dsServiceName and the highestCommittedUSN, these are
+                None when the server isn't Active Directory.
+    """
+    results = conn.search_st('', ldap.SCOPE_BASE, '(objectClass=*)',
+                             ['dsServiceName', 'highestCommittedUSN'], 0, timeoutSecs)
+    if not results:
+        return None, None
+
+    rootDse = results[0][1]
+
+    serverName = None
+    if rootDse.get('dsServiceName'):
+        serverName = rootDse['dsServiceName'][0].decode()
+
+    highestUsn = None
+    if rootDse.get('highestCommittedUSN'):
+        highestUsn = int(rootDse['highestCommittedUSN'][0])
+
+    return serverName, highestUsn
+
+
+def _changedFilter(syncState: LdapSyncState, serverName: Optional[str],
+                   highestUsn: Optional[int], fullPeriodHours: float,
+                   startTime: datetime) -> Optional[str]:
+    """ Changed Filter
+
+    :return: The LDAP filter for the users changed since the last sync, or None
+                if a full sync is due.
+    """
+    if not syncState.lastFullSyncDate or not syncState.lastSyncDate:
+        return None
+
+    if syncState.lastFullSyncDate < startTime - timedelta(hours=fullPeriodHours):
+        return None
+
+    # The update sequence numbers only apply to the server that issued them,
+    # EG, the URI could be a load balancer in front of several domain controllers
+    if highestUsn is not None \
+            and syncState.highestUsn is not None \
+            and serverName == syncState.serverName:
+        return "(uSNChanged>=%s)" % (syncState.highestUsn + 1)
+
+    changedSince = syncState.lastSyncDate - WHEN_CHANGED_OVERLAP
+    return "(whenChanged>=%s)" % changedSince.astimezone(pytz.utc) \
+        .strftime('%Y%m%d%H%M%S.0Z')
+
+
+def _pagedSearch(conn, ldapBase: str, ldapFilter: str, timeoutSecs: float,
+                 attributes: List[str] = SYNC_ATTRIBUTES):
+    """ Paged Search
+
+    Search with the paged results control, so the server never has to send, and
+    we never have to hold, the whole directory in one response.
+
+    :return: A generator of the pages, each page is a list of (dn, attributes).
+    """
+    pageControl = SimplePagedResultsControl(True, size=PAGE_SIZE, cookie='')
+
+    while True:
+        msgid = conn.search_ext(ldapBase, ldap.SCOPE_SUBTREE, ldapFilter,
+                                attributes, serverctrls=[pageControl],
+                                timeout=timeoutSecs)
+        _, entries, _, serverControls = conn.result3(msgid, timeout=timeoutSecs)
+
+        # Referrals have no dn
+        yield [(dn, attrs) for dn, attrs in entries if dn]
+
+        cookies = [c.cookie for c in serverControls
+                   if c.controlType == SimplePagedResultsControl.controlType]
+
+        if not cookies or not cookies[0]:
+            return
+
+        pageControl.cookie = cookies[0]
+
+
+def _first(attrs: dict, name: str) -> Optional[str]:
+    values = attrs.get(name)
+    return values[0].decode() if values else None
+
+
+def _writeUsers(session, ldapSetting: LdapSetting, plan: LdapSearchPlan,
+                entries: List[Tuple[str, dict]], result: LdapSyncResultTuple) -> None:
+    importHash = ldapImportHash(ldapSetting)
+
+    userRows = {}
+    groupNamesByUserName = {}
+    unauthorisedUserNames = []
+
+    for dn, attrs in entries:
+        userName = _first(attrs, 'sAMAccountName')
+        if not userName:
+            continue
+
+        groupNames = plan.groupNames(attrs.get('memberOf', []))
+
+        # Don't sync the users that aren't allowed to login
+        if not plan.isAuthorised(groupNames):
+            unauthorisedUserNames.append(userName)
+            continue
+
+        userTitle = _first(attrs, 'displayName') or userName
+
+        userRows[userName] = dict(
+            userName=userName,
+            userTitle="%s (%s)" % (userTitle, ldapSetting.ldapTitle),
+            userUuid=_first(attrs, 'distinguishedName') or dn,
+            email=_first(attrs, 'userPrincipalName'),
+            importHash=importHash
+        )
+        groupNamesByUserName[userName] = set(groupNames)
+
+    groupNamesByUserId = {}
+
+    if userRows:
+        userIdsByName = _upsertUsers(session, list(userRows.values()), importHash,
+                                     result)
+        groupNamesByUserId.update({userId: groupNamesByUserName[userName]
+                                   for userName, userId in userIdsByName.items()})
+
+    # The users that are no longer allowed to login lose their LDAP groups
+    if unauthorisedUserNames:
+        groupNamesByUserId.update({
+            row.id: set()
+            for row in session.query(InternalUserTuple.id)
+                .filter(InternalUserTuple.userName.in_(unauthorisedUserNames))
+                .filter(or_(InternalUserTuple.importHash.is_(None),
+                            InternalUserTuple.importHash == importHash))
+        })
+
+    if not groupNamesByUserId:
+        return
+
+    writeResult = writeLdapGroupsBlocking(session, groupNamesByUserId, importHash)
+
+    result.groupsAdded += writeResult.groupsAdded
+    result.membershipsAdded += writeResult.membershipsAdded
+    result.membershipsRemoved += writeResult.membershipsRemoved
+
+
+def _upsertUsers(session, userRows: List[dict], importHash: str,
+                 result: LdapSyncResultTuple) -> Dict[str, int]:
+    """ Upsert Users
+
+    Insert or update the users with one statement. If that fails on one of the
+    unique constraints, EG two users with the same display name, the users are
+    upserted one at a time, and the failures are reported.
+
+    :return: The ids of the upserted users, by user name.
+    """
+    try:
+        with session.begin_nested():
+            userIdsByName = _upsertUsersStatement(session, userRows, importHash)
+
+        result.usersUpserted += len(userIdsByName)
+        return userIdsByName
+
+    except IntegrityError:
+        pass
+
+    userIdsByName = {}
+    for userRow in userRows:
+        try:
+            with session.begin_nested():
+                userIdsByName.update(
+                    _upsertUsersStatement(session, [userRow], importHash)
+                )
+
+        except IntegrityError as e:
+            result.errors.append("%s : %s" % (userRow['userName'], e))
+
+    result.usersUpserted += len(userIdsByName)
+    return userIdsByName
+
+
+def _upsertUsersStatement(session, userRows: List[dict],
+                          importHash: str) -> Dict[str, int]:
+    table = InternalUserTuple.__table__
+
+    stmt = pg_insert(table).values(userRows)
+
+    # Don't take over the users that an import owns, the users created by a login
+    # have no import hash, the sync takes those over.
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.userName],
+        set_=dict(userTitle=stmt.excluded.userTitle,
+                  userUuid=stmt.excluded.userUuid,
+                  email=stmt.excluded.email,
+                  importHash=stmt.excluded.importHash),
+        where=or_(table.c.importHash.is_(None), table.c.importHash == importHash)
+    ).returning(table.c.id, table.c.userName)
+
+    return {row.userName: row.id for row in session.execute(stmt)}
@@ -1,5 +1,4 @@
 import logging
-import uuid
 from datetime import datetime
 from typing import List
 
@@ -9,10 +8,14 @@ from sqlalchemy.orm import subqueryload
 from txcelery.defer import DeferrableTask
 
 from peek_plugin_base.worker import CeleryDbConn
-from peek_core_user._private.server.controller.PasswordUpdateController import \
-    PasswordUpdateController
+from peek_core_user._private.server.auth_connectors.PasswordHash import \
+    hashPassword, needsRehash, verifyPassword
 from peek_core_user._private.storage.InternalGroupTuple import InternalGroupTuple
+from peek_core_user._private.storage.InternalUserPassword import \
+    InternalUserPassword
 from peek_core_user._private.storage.InternalUserTuple import InternalUserTuple
+from peek_core_user._private.storage.Setting import globalSetting, \
+    PASSWORD_HASH_ITERATIONS
 from peek_core_user._private.tuples.InternalUserImportResultTuple import \
     InternalUserImportResultTuple
 from peek_plugin_base.worker.CeleryApp import celeryApp
@@ -73,14 +76,18 @@ def importInternalUsers(self, importHash: str,
             session.query(InternalGroupTuple).all()
         }
 
+        hashIterations = globalSetting(session, PASSWORD_HASH_ITERATIONS)
+
         for importUser in importUsers:
             try:
                 existingUser = existingUsersByName.pop(importUser.userName, None)
                 if existingUser:
-                    _updateUser(existingUser, groupsByName, importUser, same, updates)
+                    _updateUser(session, existingUser, groupsByName, importUser,
+                                hashIterations, same, updates)
 
                 else:
-                    _insertUser(session, groupsByName, importUser, importHash, inserts)
+                    _insertUser(session, groupsByName, importUser, importHash,
+                                hashIterations, inserts)
 
                 session.commit()
 
@@ -115,25 +122,38 @@ def importInternalUsers(self, importHash: str,
         session.close()
 
 
-def _insertUser(session, groupsByName, importUser, importHash, inserts):
+def _insertUser(session, groupsByName, importUser, importHash, hashIterations,
+                inserts):
 
     newUser = InternalUserTuple()
     newUser.importHash = importHash
 
-    for fieldName in ImportInternalUserTuple.tupleFieldNames():
+    excludeFieldNames = ("groupKeys", "password")
+
+    copyFields = filter(lambda f: f not in excludeFieldNames,
+                        ImportInternalUserTuple.tupleFieldNames())
+
+    for fieldName in copyFields:
         setattr(newUser, fieldName, getattr(importUser, fieldName))
 
     if importUser.groupKeys is not None:
         for groupKey in importUser.groupKeys:
             newUser.groups.append(groupsByName[groupKey])
 
-    newUser.password = PasswordUpdateController.hashPass(str(uuid.uuid4()))
+    # The password is an optional field, without one the user can't login
+    # until they're given one
+    if importUser.password is not None:
+        session.add(InternalUserPassword(
+            user=newUser,
+            password=hashPassword(importUser.password, hashIterations)
+        ))
 
     session.add(newUser)
     inserts.append(newUser)
 
 
-def _updateUser(existingUser, groupsByName, importUser, same, updates):
+def _updateUser(session, existingUser, groupsByName, importUser, hashIterations,
+                same, updates):
 
     excludeFieldNames = ("groupKeys", "password")
 
@@ -149,8 +169,9 @@ def _updateUser(existingUser, groupsByName, importUser, same, updates):
 
     # The password is an optional field
     if importUser.password is not None:
-        existingUser.password = PasswordUpdateController.hashPass(importUser.password)
-        updated = True
+        if _updatePassword(session, existingUser, importUser.password,
+                           hashIterations):
+            updated = True
 
     # If there are NONE groups, then don't make any changes
     if importUser.groupKeys is not None:
@@ -171,3 +192,27 @@ def _updateUser(existingUser, groupsByName, importUser, same, updates):
         updates.append(existingUser)
     else:
         same.append(existingUser)
+
+
+def _updatePassword(session, existingUser, rawPass, hashIterations) -> bool:
+    """ Update Password
+
+    :return: True if the stored hash was changed.
+    """
+    passObj = session.query(InternalUserPassword) \
+        .filter(InternalUserPassword.userId == existingUser.id) \
+        .one_or_none()
+
+    # Most imports send the same passwords again, checking the stored hash
+    # costs one PBKDF2, hashing it again would cost the same and change the salt.
+    if passObj and passObj.password \
+            and not needsRehash(passObj.password, hashIterations) \
+            and verifyPassword(rawPass, passObj.password):
+        return False
+
+    if not passObj:
+        passObj = InternalUserPassword(userId=existingUser.id)
+        session.add(passObj)
+
+    passObj.password = hashPassword(rawPass, hashIterations)
+    return True
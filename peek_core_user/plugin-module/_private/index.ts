@@ -1,4 +1,8 @@
+export {LdapServerStateTuple} from "./tuples/LdapServerStateTuple";
 export {LoggedInUserStatusTuple} from "./tuples/LoggedInUserStatusTuple";
+export {LoggedInUserStatusDeltaTuple} from "./tuples/LoggedInUserStatusDeltaTuple";
+export {LoginStageLatencyTuple} from "./tuples/LoginStageLatencyTuple";
+export {LoginWorkQueueStatusTuple} from "./tuples/LoginWorkQueueStatusTuple";
 
 export * from "./PluginNames";
 export {UserLoggedInTuple} from "./tuples/UserLoggedInTuple";
\ No newline at end of file
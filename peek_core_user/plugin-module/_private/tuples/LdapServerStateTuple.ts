@@ -0,0 +1,38 @@
+import {Tuple} from "@synerty/vortexjs";
+import {userTuplePrefix} from "../PluginNames";
+
+export class LdapServerStateTuple extends Tuple {
+    public static readonly tupleName = userTuplePrefix + "LdapServerStateTuple";
+
+    static readonly STATE_CLOSED = "closed";
+    static readonly STATE_OPEN = "open";
+
+    constructor() {
+        super(LdapServerStateTuple.tupleName); // Matches server side
+    }
+
+    ldapSettingId: number;
+    ldapTitle: string;
+    ldapUri: string;
+
+    //  "closed" when logins use the server, "open" when they skip it
+    state: string;
+
+    //  The number of logins in a row that failed to reach the server
+    consecutiveFailures: number;
+
+    //  When the server was last skipped
+    openedDate: Date | null;
+
+    //  The last error from the server
+    lastError: string | null;
+
+    //  When the background probe last checked the server
+    lastProbeDate: Date | null;
+
+    get isOpen(): boolean {
+        return this.state === LdapServerStateTuple.STATE_OPEN;
+    }
+
+
+}
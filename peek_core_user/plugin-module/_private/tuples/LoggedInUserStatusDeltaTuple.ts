@@ -0,0 +1,25 @@
+import {Tuple} from "@synerty/vortexjs";
+import {userTuplePrefix} from "../PluginNames";
+import {LoggedInUserStatusTuple} from "./LoggedInUserStatusTuple";
+
+export class LoggedInUserStatusDeltaTuple extends Tuple {
+    public static readonly tupleName = userTuplePrefix + "LoggedInUserStatusDeltaTuple";
+
+    constructor() {
+        super(LoggedInUserStatusDeltaTuple.tupleName); // Matches server side
+    }
+
+    //  The sequence number of this delta, or of the view this snapshot was taken from
+    seq: number;
+
+    //  Is this a full snapshot of the view, rather than changes
+    isSnapshot: boolean;
+
+    //  The rows that have been added or changed
+    upserts: LoggedInUserStatusTuple[];
+
+    //  The device tokens of the rows that have been removed
+    removedDeviceTokens: string[];
+
+
+}
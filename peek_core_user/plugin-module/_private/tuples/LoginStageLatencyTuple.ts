@@ -0,0 +1,33 @@
+import {Tuple} from "@synerty/vortexjs";
+import {userTuplePrefix} from "../PluginNames";
+
+export class LoginStageLatencyTuple extends Tuple {
+    public static readonly tupleName = userTuplePrefix + "LoginStageLatencyTuple";
+
+    constructor() {
+        super(LoginStageLatencyTuple.tupleName); // Matches server side
+    }
+
+    //  The name of the stage, EG 'login.checkPass'
+    stageName: string;
+
+    //  The number of samples in the window
+    count: number;
+
+    //  The length of the rolling window, in seconds
+    windowSecs: number;
+
+    meanMs: number;
+    p50Ms: number;
+    p95Ms: number;
+    p99Ms: number;
+    maxMs: number;
+
+    //  The upper bounds of the histogram buckets, the last bucket has no bound
+    bucketUpperMs: number[];
+
+    //  The number of samples in each histogram bucket
+    bucketCounts: number[];
+
+
+}
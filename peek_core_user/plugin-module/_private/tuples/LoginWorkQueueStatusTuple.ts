@@ -0,0 +1,25 @@
+import {Tuple} from "@synerty/vortexjs";
+import {userTuplePrefix} from "../PluginNames";
+
+export class LoginWorkQueueStatusTuple extends Tuple {
+    public static readonly tupleName = userTuplePrefix + "LoginWorkQueueStatusTuple";
+
+    constructor() {
+        super(LoginWorkQueueStatusTuple.tupleName); // Matches server side
+    }
+
+    //  The number of calls waiting for a thread
+    queueDepth: number;
+
+    //  The number of calls running in the threads
+    runningCount: number;
+
+    //  The number of calls rejected since the server started
+    rejectedCount: number;
+
+    //  The configured limits, LOGIN_MAX_QUEUE_DEPTH and LOGIN_MAX_CONCURRENCY
+    maxQueueDepth: number;
+    maxConcurrency: number;
+
+
+}
@@ -1,4 +1,4 @@
-from typing import Callable
+from typing import Callable, List, Optional
 
 from abc import ABCMeta, abstractmethod
 from rx.subjects import Subject
@@ -11,6 +11,8 @@ UserPostLoginHookCallable = Callable[[UserLoginResponseTuple], Deferred]
 
 UserPostLogoutHookCallable = Callable[[UserLogoutResponseTuple], Deferred]
 
+UserPostBulkLogoutHookCallable = Callable[[List[UserLogoutResponseTuple]], Deferred]
+
 
 class UserFieldHookApiABC(metaclass=ABCMeta):
     @abstractmethod
@@ -30,11 +32,17 @@ class UserFieldHookApiABC(metaclass=ABCMeta):
         """
 
     @abstractmethod
-    def addPostLoginHook(self, callable: UserPostLoginHookCallable) -> None:
+    def addPostLoginHook(self, callable: UserPostLoginHookCallable,
+                         independent: bool = False,
+                         timeoutSecs: Optional[float] = None) -> None:
         """ Add Post Login Hook
 
         :param callable: This callable will be called just after the user has
         authenticated
+        :param independent: If True, this hook doesn't depend on the other hooks,
+        it will be run at the same time as them.
+        :param timeoutSecs: The login fails if this hook takes longer than this,
+        None for no timeout.
         """
 
     @abstractmethod
@@ -45,11 +53,17 @@ class UserFieldHookApiABC(metaclass=ABCMeta):
         """
 
     @abstractmethod
-    def addPostLogoutHook(self, callable: UserPostLogoutHookCallable) -> None:
+    def addPostLogoutHook(self, callable: UserPostLogoutHookCallable,
+                          independent: bool = False,
+                          timeoutSecs: Optional[float] = None) -> None:
         """ Add Post Logout Hook
 
         :param callable: This callable will be called just after the user has
         logged out
+        :param independent: If True, this hook doesn't depend on the other hooks,
+        it will be run at the same time as them.
+        :param timeoutSecs: The logout fails if this hook takes longer than this,
+        None for no timeout.
         """
 
     @abstractmethod
@@ -58,3 +72,34 @@ class UserFieldHookApiABC(metaclass=ABCMeta):
 
         :param callable: This callable to remove from the hooks
         """
+
+    @abstractmethod
+    def addPostBulkLogoutHook(self, callable: UserPostBulkLogoutHookCallable,
+                              postLogoutHook: Optional[
+                                  UserPostLogoutHookCallable] = None,
+                              independent: bool = False,
+                              timeoutSecs: Optional[float] = None) -> None:
+        """ Add Post Bulk Logout Hook
+
+        Bulk logouts call this hook once with all of the logouts.
+
+        The post logout hooks are called for each logout of a bulk logout, unless
+        they are replaced by a bulk logout hook.
+
+        :param callable: This callable will be called with the list of
+        UserLogoutResponseTuple, just after the users have been logged out
+        :param postLogoutHook: The post logout hook this replaces, it won't be
+        called for bulk logouts.
+        :param independent: If True, this hook doesn't depend on the other hooks,
+        it will be run at the same time as them.
+        :param timeoutSecs: The hook is logged as failed if it takes longer than
+        this, None for no timeout.
+        """
+
+    @abstractmethod
+    def removePostBulkLogoutHook(self,
+                                 callable: UserPostBulkLogoutHookCallable) -> None:
+        """ Remove Post Bulk Logout Hook
+
+        :param callable: This callable to remove from the hooks
+        """
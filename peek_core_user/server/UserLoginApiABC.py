@@ -1,8 +1,10 @@
-from typing import Callable
+from typing import Callable, List
 
 from abc import ABCMeta, abstractmethod
 from twisted.internet.defer import Deferred
 
+from peek_core_user.tuples.login.UserBulkLogoutSelectorTuple import \
+    UserBulkLogoutSelectorTuple
 from peek_core_user.tuples.login.UserLoginAction import UserLoginAction
 from peek_core_user.tuples.login.UserLoginResponseTuple import UserLoginResponseTuple
 from peek_core_user.tuples.login.UserLogoutAction import UserLogoutAction
@@ -22,6 +24,21 @@ class UserLoginApiABC(metaclass=ABCMeta):
         :param logoutTuple
         """
 
+    @abstractmethod
+    def bulkLogout(self,
+                   selector: UserBulkLogoutSelectorTuple
+                   ) -> Deferred:  # [List[UserLogoutResponseTuple]]:
+        """ Bulk Logout
+
+        Force the logout of all the sessions matching the selector, EG, at the end
+        of a shift. The logout hooks are called after the sessions are removed,
+        they can't stop this logout.
+
+        :param selector: The sessions to logout
+        :return: A deferred that fires with a UserLogoutResponseTuple for each
+                    session logged out.
+        """
+
     @abstractmethod
     def login(self, loginTuple: UserLoginAction) -> Deferred:  # [UserLoginResponseTuple]:
         """ Login
@@ -0,0 +1,40 @@
+from datetime import datetime
+from typing import List
+
+from peek_core_user._private.PluginNames import userPluginTuplePrefix
+from vortex.Tuple import addTupleType, Tuple, TupleField
+
+
+@addTupleType
+class UserBulkLogoutSelectorTuple(Tuple):
+    """ User Bulk Logout Selector Tuple
+
+    This tuple selects the sessions to logout with UserLoginApiABC.bulkLogout
+
+    Set one or more of the fields, a session must match all of the set fields
+    to be logged out. At least one field must be set.
+
+    """
+    __tupleType__ = userPluginTuplePrefix + "UserBulkLogoutSelectorTuple"
+
+    #: Logout the sessions on these devices
+    deviceTokens: List[str] = TupleField()
+
+    #: Logout the sessions of these users
+    userNames: List[str] = TupleField()
+
+    #: Logout the sessions of the users in this group
+    groupName: str = TupleField()
+
+    #: Logout the sessions logged in with this vehicle
+    vehicle: str = TupleField()
+
+    #: Logout the sessions that logged in before this date
+    loggedInBefore: datetime = TupleField()
+
+    def isEmpty(self) -> bool:
+        return (self.deviceTokens is None
+                and self.userNames is None
+                and self.groupName is None
+                and self.vehicle is None
+                and self.loggedInBefore is None)
@@ -25,6 +25,11 @@ dependencies = [
     'python-ldap'
 ]
 
+# The tests run with "trial peek_core_user._private.tests"
+testDependencies = [
+    'ldaptor'
+]
+
 
 def find_package_files():
     paths = []
@@ -51,6 +56,7 @@ setup(
     packages=find_packages(exclude=["*.tests", "*.tests.*", "tests.*", "tests"]),
     package_data={'': package_files},
     install_requires=dependencies,
+    extras_require={'test': testDependencies},
     zip_safe=False, version=package_version,
     description='Peek Plugin - UserDb - This is the No Operation test/example plugin',
     author='Synerty',